@@ -0,0 +1,137 @@
+"""
+Offline evaluation of the local intent router (src/agent/intent_router.py).
+
+Replays the user messages of archived ticket transcripts (data/archives/**/transcript.*)
+or of the `messages` table through IntentRouter and reports how many would have been
+answered locally, i.e. how many AgentBrain.think calls the router avoids.
+
+With --labels (a JSONL file of {"text": ..., "intent": ...}), also reports per-intent
+precision/recall, to check that nothing substantive gets short-circuited.
+
+Usage:
+    python scripts/eval_intent_router.py
+    python scripts/eval_intent_router.py --from-db --model
+    python scripts/eval_intent_router.py --labels data/intent_labels.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src import db
+from src.agent.intent_router import IntentRouter, NaiveBayesIntentModel, SUBSTANTIVE
+from src.transcript import find_archives, open_transcript
+
+ARCHIVE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'archives')
+# The assistant's proposal replies start with this (see TICKET_ASSISTANT_PROMPT)
+PROPOSAL_MARKER = "did we capture it all correctly"
+
+def transcript_turns(path, bot_author_id=None):
+    """
+    Yields (text, attachments, draft_pending) for each user message of a transcript
+    (its file or archive directory). The bot is the author of the first message (the
+    ticket greeting) unless given.
+    """
+    bot_id = bot_author_id
+    draft_pending = False
+    with open_transcript(path) as transcript:
+        for msg in transcript:
+            bot_id = bot_id or msg.get("author_id")
+            content = msg.get("content") or ""
+            if msg.get("author_id") == bot_id:
+                if PROPOSAL_MARKER in content.lower():
+                    draft_pending = True
+                continue
+            yield content, len(msg.get("attachments") or []), draft_pending
+
+def db_turns():
+    """Yields (text, attachments, draft_pending) for user messages in the messages table."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT conversation_id, role, content FROM messages ORDER BY conversation_id, id")
+    rows = cursor.fetchall()
+    conn.close()
+
+    conversation, draft_pending = None, False
+    for row in rows:
+        if row['conversation_id'] != conversation:
+            conversation, draft_pending = row['conversation_id'], False
+        if row['role'] != 'user':
+            draft_pending = draft_pending or PROPOSAL_MARKER in row['content'].lower()
+            continue
+        attachments = row['content'].count("<Attachment:")
+        text = "" if row['content'].startswith("[System Note: User uploaded files]") else row['content']
+        yield text, attachments, draft_pending
+
+def evaluate(router, turns):
+    intents = Counter()
+    handled = Counter()
+    total = 0
+    for text, attachments, draft_pending in turns:
+        total += 1
+        route = router.route(text, attachments, draft_pending=draft_pending)
+        intents[route.intent] += 1
+        if route.reply:
+            handled[route.intent] += 1
+    return total, intents, handled
+
+def evaluate_labels(router, path):
+    """Per-intent precision/recall of router.classify against labelled examples."""
+    confusion = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            example = json.loads(line)
+            predicted = router.classify(example["text"], example.get("attachments", 0))[0]
+            confusion[(example["intent"], predicted)] += 1
+
+    labels = sorted({label for pair in confusion for label in pair})
+    print(f"\n{'Intent':<14} {'Precision':>10} {'Recall':>8} {'Support':>8}")
+    for label in labels:
+        tp = confusion[(label, label)]
+        predicted = sum(n for (_, p), n in confusion.items() if p == label)
+        actual = sum(n for (a, _), n in confusion.items() if a == label)
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        print(f"{label:<14} {precision:>10.1%} {recall:>8.1%} {actual:>8}")
+    wrongly_local = sum(n for (a, p), n in confusion.items() if a == SUBSTANTIVE and p != SUBSTANTIVE)
+    print(f"\nSubstantive messages short-circuited: {wrongly_local}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many LLM calls the local intent router avoids.")
+    parser.add_argument("--archives", default=ARCHIVE_ROOT, help="Root of archived transcripts")
+    parser.add_argument("--from-db", action="store_true", help="Replay the messages table instead of archives")
+    parser.add_argument("--bot-author-id", type=int, help="Author id of the bot in transcripts")
+    parser.add_argument("--model", action="store_true", help="Also use the Naive Bayes model trained from the messages table")
+    parser.add_argument("--labels", help="JSONL file of labelled examples for precision/recall")
+    args = parser.parse_args()
+
+    router = IntentRouter(enabled=True)
+    if args.model:
+        router.model = NaiveBayesIntentModel.from_messages(db.get_user_message_texts())
+        print(f"Model: {'trained' if router.model else 'not enough data, rules only'}")
+
+    if args.from_db:
+        turns = db_turns()
+        source = "messages table"
+    else:
+        paths = find_archives(args.archives)
+        turns = (turn for path in paths for turn in transcript_turns(path, args.bot_author_id))
+        source = f"{len(paths)} transcripts"
+
+    total, intents, handled = evaluate(router, turns)
+    avoided = sum(handled.values())
+    print(f"Source: {source}")
+    print(f"User messages: {total}")
+    print(f"Answered locally (LLM calls avoided): {avoided} ({avoided / total:.1%})" if total else "No messages found.")
+    for intent, count in intents.most_common():
+        print(f"  {intent:<12} {count:>6} classified, {handled[intent]:>6} answered locally")
+
+    if args.labels:
+        evaluate_labels(router, args.labels)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Deletes archived attachments no transcript references any more (src/blob_store.py).
+
+--migrate first moves the attachments of archives written before the blob store into
+it (rewriting their transcripts) and rebuilds every transcript's references.
+
+Usage:
+    python scripts/gc_blobs.py [--migrate] [--grace-hours 24] [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src import db
+from src.archive_index import ARCHIVE_ROOT
+from src.blob_store import BLOB_GC_GRACE_S, store
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced archive attachments.")
+    parser.add_argument("--archives", default=ARCHIVE_ROOT, help="Root of archived transcripts")
+    parser.add_argument("--migrate", action="store_true", help="Move pre-store attachments into the store first")
+    parser.add_argument("--grace-hours", type=float, default=BLOB_GC_GRACE_S / 3600, help="Keep unreferenced blobs younger than this")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted without deleting")
+    args = parser.parse_args()
+
+    db.init_db()
+    if args.migrate and not args.dry_run:
+        moved, skipped = store.migrate_archives(args.archives)
+        print(f"📦 Moved {moved} attachments into the blob store ({skipped} transcripts skipped)")
+    removed, freed = store.gc(grace=args.grace_hours * 3600, dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"✅ {verb} {removed} blobs ({freed / 1024 / 1024:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Rebuilds the ticket search index (tickets_fts) and indexes all archived transcripts.
+
+Usage:
+    python scripts/reindex_archives.py [--archives data/archives]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src import db
+from src.archive_index import ARCHIVE_ROOT, reindex_archives
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the full-text ticket search index.")
+    parser.add_argument("--archives", default=ARCHIVE_ROOT, help="Root of archived transcripts")
+    args = parser.parse_args()
+
+    db.init_db()
+    db.rebuild_ticket_search_index()
+    indexed, skipped = reindex_archives(args.archives)
+    print(f"✅ Indexed {indexed} transcripts ({skipped} skipped)")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
+import logging
 import os
-import json
-import asyncio
 import time
+from collections import OrderedDict
 import google.generativeai as genai
 from dotenv import load_dotenv
+from src.agent.prompts import PromptBuilder
+from src.agent.memory_store import MemoryStore
+from src.agent.llm_client import llm
+from src.agent.usage_recorder import estimate_cost
+from src.agent.output_parser import OutputStreamParser, parse_model_output, validate_output
+from src.agent.response_cache import ResponseCache
+
+logger = logging.getLogger("AGENT_BRAIN")
 
 # Load environment variables
 # robustly find .env relative to this script (src/agent/brain.py -> ../../.env)
@@ -28,6 +36,11 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 class AgentBrain:
     def __init__(self):
         self.model = None
+        self.model_name = 'gemini-2.0-flash'
+        self.memory = MemoryStore()
+        self.prompts = PromptBuilder(memory_provider=self.memory.pinned)
+        self._models = OrderedDict() # prefix digest -> GenerativeModel bound to that system instruction
+        self.response_cache = ResponseCache()
         
         if not GOOGLE_API_KEY:
             print("⚠️ Warning: GOOGLE_API_KEY not found. AgentBrain features disabled.")
@@ -36,7 +49,7 @@ class AgentBrain:
         # Attempt to verify key with a lightweight call
         try:
             genai.configure(api_key=GOOGLE_API_KEY)
-            test_model = genai.GenerativeModel('gemini-2.0-flash')
+            test_model = genai.GenerativeModel(self.model_name)
             # Dry run a simple generation to test auth (count_tokens is fast)
             test_model.count_tokens("test")
             self.model = test_model
@@ -47,619 +60,137 @@ class AgentBrain:
             self.model = None
 
     def load_memory(self):
-        memory_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config', 'memory.json')
-        if os.path.exists(memory_path):
-            with open(memory_path, 'r') as f:
-                return f.read()
-        return "{}"
+        # Pinned facts as of the last MemoryStore refresh
+        return self.memory.pinned()[0]
+
+    def _model_for(self, system_instruction, digest):
+        """Returns a model bound to this system instruction, reusing it while the prefix is unchanged."""
+        model = self._models.get(digest)
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            self._models[digest] = model
+            if len(self._models) > 8:
+                self._models.popitem(last=False)
+        else:
+            self._models.move_to_end(digest)
+        return model
 
     def save_memory(self, content):
-        """Saves content to the long-term memory file, merging with existing data."""
-        try:
-            memory_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config', 'memory.json')
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(memory_path), exist_ok=True)
-            
-            # Load existing memory
-            current_memory = {}
-            if os.path.exists(memory_path):
-                with open(memory_path, 'r') as f:
-                    try:
-                        current_memory = json.load(f)
-                    except json.JSONDecodeError:
-                        print("⚠️ Warning: memory.json was not valid JSON, starting fresh.")
-                        current_memory = {}
+        """Saves content (a dict of facts or a text note) to the long-term memory store."""
+        return self.memory.save(content)
 
-            # Merge new content
-            if isinstance(content, dict):
-                current_memory.update(content)
-            else:
-                if "notes" not in current_memory:
-                    current_memory["notes"] = []
-                if isinstance(current_memory["notes"], list):
-                    current_memory["notes"].append(str(content))
-                else:
-                    current_memory["notes"] = [str(current_memory["notes"]), str(content)]
-            
-            with open(memory_path, 'w') as f:
-                json.dump(current_memory, f, indent=2)
-                
-            print(f"DEBUG: Memory saved successfully to {memory_path}")
-            return True
-        except Exception as e:
-            print(f"ERROR: Error saving memory: {e}")
-            return False
-
-    def _extract_json(self, text):
-        """
-        Robustly extracts JSON from a string, handling markdown blocks and loose text.
-        """
-        import re
-        text = text.strip()
-        
-        # Try direct parse
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # Try to find a JSON block with regex
-        match = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-                
-        # Try to find from first { to last }
-        try:
-            start = text.find('{')
-            end = text.rfind('}')
-            if start != -1 and end != -1:
-                potential_json = text[start:end+1]
-                return json.loads(potential_json)
-        except json.JSONDecodeError:
-            pass
-
-        return None
-
-    async def think(self, user_message, available_actions, history=None, status_context=None, mode="default"):
+    async def think(self, user_message, available_actions, history=None, status_context=None, mode="default", channel_id=None, on_reply=None):
         """
         Processes the user message and returns a structured plan or reply.
+        Pass `channel_id` so the request can be cancelled (llm.cancel) if the channel goes away.
+        With `on_reply` (an async callback), the response is streamed and on_reply(text) is
+        awaited each time the `reply` field grows; the full parsed object is still returned
+        at the end, so actions are only acted upon once complete.
         """
         if not self.model:
             # Return a professional "offline" message instead of technical error
             return {"reply": "I apologize, but my AI systems are currently offline. A staff member will be with you shortly."}
 
-        # Load Long-Term Memory
-        memory_content = self.load_memory()
-        
-        # Format Status Context
-        status_text = "No active blockers."
-        if status_context:
-            pending_count = len(status_context.get("pending_plans", []))
-            active_sessions = status_context.get("active_sessions", [])
-            sync_status = status_context.get("sync_status", "Unknown")
-            
-            parts = [f"Sync Status: {sync_status}"]
-            if pending_count > 0:
-                parts.append(f"⛔ WAITING FOR APPROVAL: {pending_count} plan(s) are pending user reaction.")
-            if active_sessions:
-                parts.append(f"🔄 ACTIVE SESSIONS: Running in channels {active_sessions}.")
-            
-            if parts:
-                status_text = "\n".join(parts)
-
-        # Select System Prompt based on Mode
-        if mode == "architect":
-            system_prompt = f"""
-You are 'Project Planner', a senior technical planner and strategist for 'Bear Application Department'.
-Your goal is to help users design robust, scalable, and well-thought-out solutions.
-
-CURRENT STATUS:
-{status_text}
-
-**YOUR BEHAVIOR**:
-1.  **Clarify First**: Ask clarifying questions to understand the *why*, *who*, and *constraints*.
-2.  **Gather Context**: You have access to `read_file` and `list_files`. Use them to read the `docs/`, `engineering-playbook/` or other relevant files in the repo to answer your own questions if possible.
-    -   **Project Structure**:
-        -   `engineering-playbook/`: Contains the engineering rules, procedures, and standards.
-        -   `BAD/docs/`: Contains documentation specific to the 'Bear Application Department' codebase.
-    -   Example: "I will read `engineering-playbook/README.md` to understand the standard procedure."
-3.  **Plan**: Only when you are satisfied, output a detailed implementation plan in Markdown.
-4.  **No Direct Execution**: You CANNOT write code or execute command-line scripts. You only plan.
-
-LONG-TERM MEMORY (Context):
-{memory_content}
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "I need to check the docs for the standard issue format...",
-  "reply": "I am checking the engineering playbook...",
-  "actions": ["read_file engineering-playbook/README.md"],
-  "execute_now": true
-}}
-"""
-        elif mode == "manager":
-            system_prompt = f"""
-You are the 'Session Manager' for the Bear Application Department (BAD) bot.
-Your role is to guide the user on how to start working. There is currently NO active conversation session.
+        # Static prefix (compiled once per mode/pinned memory/actions) goes out as the system
+        # instruction; only the small dynamic suffix (incl. the top-k relevant notes) is rebuilt per call
+        memories = await self.memory.prepare(user_message)
+        system_instruction, prefix_digest = self.prompts.system_instruction(mode, available_actions)
+        model = self._model_for(system_instruction, prefix_digest)
+        prompt = self.prompts.dynamic_suffix(user_message, history, status_context, memories=memories)
 
-CURRENT STATUS:
-{status_text}
+        # Identical prompts within the TTL are answered from the cache (and concurrent
+        # identical calls share one upstream request)
+        cache_key = self.response_cache.make_key(mode, prefix_digest, prompt)
+        computed = False
 
-**YOUR BEHAVIOR**:
-1.  **Check Sync Status**: Look at STATUS_TEXT.
-    -   If "Environment NOT Synced" -> Suggest running `!open` to sync code and prepare the environment.
-    -   If "Environment Synced" -> Suggest running `!kickoff` to start a new Agent Session (conversation).
-2.  **Explain Commands**:
-    -   `!open`: Syncs the environment (git pull, check clean state).
-    -   `!kickoff`: Starts a new conversational agent session.
-    -   `!dashboard`: Shows active sessions and pending approvals.
-    -   `!sessions`: Lists active sessions.
-    -   `!close`: Closes the current session (commits & pushes).
-3.  **Proactive Guidance**: If the user tells you what they want to do (e.g., "I want to fix a bug"), acknowledge it but explain that **they must start a session first** to do that.
-    -   Example: "That sounds important! To get started on fixing that bug, we first need to open a session. Shall I run `!kickoff` for you?"
-4.  **Action Execution**: You can execute safe commands like `!open` or `!kickoff` if the user explicitly asks or agrees to your suggestion.
+        async def compute():
+            nonlocal computed
+            computed = True
+            return await self._generate(model, prompt, channel_id, on_reply, mode)
 
-LONG-TERM MEMORY:
-{memory_content}
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "User wants to work but no session is active. Environment is synced.",
-  "reply": "To start working on that, we need to kickoff a session. Shall I do that?",
-  "actions": [], 
-  "execute_now": false
-}}
-"""
+        try:
+            result = await self.response_cache.get_or_compute(cache_key, compute)
+            if on_reply and not computed and result.get("reply"):
+                await on_reply(result["reply"]) # Served from cache: show it in one go
+            return result
+        except Exception as e:
+            # Rate limits (429) were already retried by the LLM client
+            error_str = str(e) or type(e).__name__ # e.g. TimeoutError has no message
+            print(f"Error in AgentBrain: {e}")
+            return {
+                "thought_process": "Error occurred during processing.",
+                "plan_summary": "",
+                "actions": [],
+                "reply": f"I encountered an error trying to think about that: {error_str[:100]}"
+            }
+
+    async def _generate(self, model, prompt, channel_id, on_reply, mode=None):
+        """Calls the model (streaming if on_reply is set) and returns the parsed JSON object; raises on failure."""
+        generation_config = genai.types.GenerationConfig(
+            response_mime_type="application/json"
+        )
+        if on_reply:
+            text, usage = await self._stream_reply(model, prompt, channel_id, generation_config, on_reply, mode)
         else:
-            # Default / BAD Bot Mode
-            system_prompt = f"""
-You are an intelligent Discord bot for 'Bear Application Department'.
-Your goal is to help users manage their engineering tasks, github issues, and servers.
-
-CURRENT STATUS:
-{status_text}
-
-LONG-TERM MEMORY (Preferences & Facts):
-{memory_content}
-
-AVAILABLE ACTIONS:
-{json.dumps(available_actions, indent=2)}
-
-You can now use a "Conversational Flow":
-1.  **Analyze Context**: extensive history is provided. Use it to understand "it", "that", etc.
-2.  **Safe Actions**: If the user asks for information (e.g. "list issues", "get issue 1", "read file", "check status"), YOU MUST SET `execute_now` to `true`. Do NOT ask for confirmation. Run it immediately.
-3.  **Mutating Actions**: If the user asks to change state (e.g. "close issue", "run cleanup", "delete"), set `execute_now` to `false` and I will ask for confirmation.
-4.  **Memory**: Use the `remember` tool ONLY when the user explicitly provides a new preference or fact. Do NOT use it for conversation logging or trivial details.
-5.  **Answering**: If the result of an action is in the history, interpret it and Answer the user in the `reply` field. Do NOT create a new plan just to show the answer.
-6.  **Formatting**: When listing multiple items with URLs, YOU MUST wrap each URL in `<` and `>` (e.g. `<https://example.com>`) to prevent Discord from generating spammy embeds.
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "Analyze functionality and history...",
-  "plan_summary": "Briefly describe what you will do.",
-  "actions": ["action_name arg1", "action_name arg2"],
-  "execute_now": true/false (true ONLY for read-only/safe actions like 'list' or 'get'),
-  "reply": "Message to the user (optional if executing now)"
-}}
-"""
+            # Native async call: bounded by the shared concurrency limit and timeout
+            response = await llm.generate(model, prompt, key=channel_id, mode=mode, generation_config=generation_config)
+            usage = response.usage_metadata
+            text = response.text
+
+        # Parse the JSON response
+        if usage:
+            # Also persisted per call in the llm_usage ledger (see usage_recorder)
+            total_cost = estimate_cost(usage.prompt_token_count, usage.candidates_token_count)
+            
+            # Tokens served from Gemini's cache of the (unchanged) system instruction prefix
+            cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+            logger.info(f"Usage: Input={usage.prompt_token_count} (Cached={cached_tokens}), Output={usage.candidates_token_count} | Est. Cost: ${total_cost:.6f}")
         
-        prompt = f"{system_prompt}\n\n"
+        logger.debug(f"Raw model response:\n{text}")
         
-        if history:
-            prompt += "CONVERSATION HISTORY:\n"
-            for msg in history:
-                prompt += f"{msg}\n"
-            prompt += "\n"
-
-        prompt += f"USER MESSAGE: {user_message}"
-
-        max_retries = 3
-        backoff = 2
-
-        for attempt in range(max_retries + 1):
-            try:
-                # Run sync API call in a thread
-                response = await asyncio.to_thread(
-                    self.model.generate_content,
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        response_mime_type="application/json"
-                    )
-                )
-                
-                # Inspect response before accessing text
-                if not response.candidates:
-                    raise ValueError("No candidates in response")
-                
-                candidate = response.candidates[0]
-                if candidate.finish_reason != 1: # 1 = STOP
-                     print(f"DEBUG: Finish reason: {candidate.finish_reason}")
-                     print(f"DEBUG: Safety ratings: {candidate.safety_ratings}")
-
-                try:
-                    text = response.text
-                except Exception as e:
-                    print(f"DEBUG: response.text failed: {e}")
-                    # Try to access parts directly
-                    if candidate.content and candidate.content.parts:
-                        text = candidate.content.parts[0].text
-                    else:
-                        print(f"DEBUG: Candidate content: {candidate.content}")
-                        raise ValueError(f"Empty content in response. Finish reason: {candidate.finish_reason}")
-
-                print(f"DEBUG: RAW MODEL RESPONSE:\n{text}")
-                
-                if not text:
-                    raise ValueError("Empty response text from Gemini API")
-                
-                # Robust JSON Extraction
-                parsed_json = self._extract_json(text)
-                if parsed_json:
-                    return parsed_json
-                else:
-                    raise ValueError(f"Failed to parse JSON from response: {text[:100]}...")
-
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str and attempt < max_retries:
-                    print(f"WARNING: Quota exceeded. Retrying in {backoff}s... (Attempt {attempt+1}/{max_retries})")
-                    await asyncio.sleep(backoff)
-                    backoff *= 2
-                    continue
-                else:
-                    print(f"Error in AgentBrain: {e}")
-                    return {
-                        "thought_process": "Error occurred during processing.",
-                        "plan_summary": "",
-                        "actions": [],
-                        "reply": f"I encountered an error trying to think about that: {error_str[:100]}"
-                    }
-        else:
-            self.client = genai.Client(api_key=GOOGLE_API_KEY)
-            # Use a model that supports JSON mode well
-            self.model_name = 'gemini-2.0-flash'
-
-
-    def save_memory(self, content):
-        """Saves content to the long-term memory file, merging with existing data."""
-        try:
-            memory_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config', 'memory.json')
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(memory_path), exist_ok=True)
-            
-            # Load existing memory
-            current_memory = {}
-            if os.path.exists(memory_path):
-                with open(memory_path, 'r') as f:
-                    try:
-                        current_memory = json.load(f)
-                    except json.JSONDecodeError:
-                        # If file is corrupted or empty, start fresh. 
-                        # If it was plain text before, we might want to migrate it, but simple overwrite is safer for now to enforce JSON structure.
-                        print("⚠️ Warning: memory.json was not valid JSON, starting fresh.")
-                        current_memory = {}
-
-            # Merge new content
-            if isinstance(content, dict):
-                # Deep merge or top-level update? Let's do top-level update for now.
-                current_memory.update(content)
-            else:
-                # Assume string note
-                if "notes" not in current_memory:
-                    current_memory["notes"] = []
-                if isinstance(current_memory["notes"], list):
-                    current_memory["notes"].append(str(content))
-                else:
-                    # If notes collided with a non-list, force it to list
-                    current_memory["notes"] = [str(current_memory["notes"]), str(content)]
-            
-            with open(memory_path, 'w') as f:
-                json.dump(current_memory, f, indent=2)
-                
-            print(f"DEBUG: Memory saved successfully to {memory_path}")
-            return True
-        except Exception as e:
-            print(f"ERROR: Error saving memory: {e}")
-            return False
-
-    def _extract_json(self, text):
-        """
-        Robustly extracts JSON from a string, handling markdown blocks and loose text.
-        """
-        import re
-        text = text.strip()
+        if not text:
+            raise ValueError("Empty response from Gemini API")
         
-        # Try direct parse
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # Try to find a JSON block with regex
-        match = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL)
-        if match:
+        parsed_json = parse_model_output(text)
+        if parsed_json is None:
+            raise ValueError(f"Failed to parse JSON from response: {text[:100]}...")
+        return validate_output(parsed_json)
+
+    async def _stream_reply(self, model, prompt, channel_id, generation_config, on_reply, mode=None):
+        """Streams a response, feeding the partial `reply` field to on_reply. Returns (text, usage)."""
+        parser = OutputStreamParser()
+        usage = None
+        async for chunk in llm.stream(model, prompt, key=channel_id, mode=mode, generation_config=generation_config):
             try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-                
-        # Try to find from first { to last }
-        try:
-            start = text.find('{')
-            end = text.rfind('}')
-            if start != -1 and end != -1:
-                potential_json = text[start:end+1]
-                return json.loads(potential_json)
-        except json.JSONDecodeError:
-            pass
-
-        return None
-
-    async def think(self, user_message, available_actions, history=None, status_context=None, mode="default"):
+                piece = chunk.text
+            except ValueError: # Chunk without text parts (e.g. only safety/finish info)
+                piece = ""
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            if parser.feed(piece):
+                await on_reply(parser.reply)
+        return parser.text, usage
+
+    async def summarize(self, previous_summary, lines, max_chars=1500):
         """
-        Processes the user message and returns a structured plan or reply.
+        Folds conversation lines into a rolling summary. Returns the new summary text,
+        or None if the model is unavailable or the call failed (callers keep the old one).
         """
         if not self.model:
-            # Return a professional "offline" message instead of technical error
-            return {"reply": "I apologize, but my AI systems are currently offline. A staff member will be with you shortly."}
-
-        # Load Long-Term Memory
-        memory_content = self.load_memory()
-        
-        # Format Status Context
-        status_text = "No active blockers."
-        if status_context:
-            pending_count = len(status_context.get("pending_plans", []))
-            active_sessions = status_context.get("active_sessions", [])
-            sync_status = status_context.get("sync_status", "Unknown")
-            
-            parts = [f"Sync Status: {sync_status}"]
-            if pending_count > 0:
-                parts.append(f"⛔ WAITING FOR APPROVAL: {pending_count} plan(s) are pending user reaction.")
-            if active_sessions:
-                parts.append(f"🔄 ACTIVE SESSIONS: Running in channels {active_sessions}.")
-            
-            if parts:
-                status_text = "\n".join(parts)
-
-        # Select System Prompt based on Mode
-        if mode == "architect":
-            system_prompt = f"""
-You are 'Project Planner', a senior technical planner and strategist for 'Bear Application Department'.
-Your goal is to help users design robust, scalable, and well-thought-out solutions.
-
-CURRENT STATUS:
-{status_text}
-
-**YOUR BEHAVIOR**:
-1.  **Clarify First**: Ask clarifying questions to understand the *why*, *who*, and *constraints*.
-2.  **Gather Context**: You have access to `read_file` and `list_files`. Use them to read the `docs/`, `engineering-playbook/` or other relevant files in the repo to answer your own questions if possible.
-    -   **Project Structure**:
-        -   `engineering-playbook/`: Contains the engineering rules, procedures, and standards.
-        -   `BAD/docs/`: Contains documentation specific to the 'Bear Application Department' codebase.
-    -   Example: "I will read `engineering-playbook/README.md` to understand the standard procedure."
-3.  **Plan**: Only when you are satisfied, output a detailed implementation plan in Markdown.
-4.  **No Direct Execution**: You CANNOT write code or execute command-line scripts. You only plan.
-
-LONG-TERM MEMORY (Context):
-{memory_content}
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "I need to check the docs for the standard issue format...",
-  "reply": "I am checking the engineering playbook...",
-  "actions": ["read_file engineering-playbook/README.md"],
-  "execute_now": true
-}}
-"""
-        elif mode == "manager":
-            system_prompt = f"""
-You are the 'Session Manager' for the Bear Application Department (BAD) bot.
-Your role is to guide the user on how to start working. There is currently NO active conversation session.
-
-CURRENT STATUS:
-{status_text}
-
-**YOUR BEHAVIOR**:
-1.  **Check Sync Status**: Look at STATUS_TEXT.
-    -   If "Environment NOT Synced" -> Suggest running `!open` to sync code and prepare the environment.
-    -   If "Environment Synced" -> Suggest running `!kickoff` to start a new Agent Session (conversation).
-2.  **Explain Commands**:
-    -   `!open`: Syncs the environment (git pull, check clean state).
-    -   `!kickoff`: Starts a new conversational agent session.
-    -   `!dashboard`: Shows active sessions and pending approvals.
-    -   `!sessions`: Lists active sessions.
-    -   `!close`: Closes the current session (commits & pushes).
-3.  **Proactive Guidance**: If the user tells you what they want to do (e.g., "I want to fix a bug"), acknowledge it but explain that **they must start a session first** to do that.
-    -   Example: "That sounds important! To get started on fixing that bug, we first need to open a session. Shall I run `!kickoff` for you?"
-4.  **Action Execution**: You can execute safe commands like `!open` or `!kickoff` if the user explicitly asks or agrees to your suggestion.
-
-LONG-TERM MEMORY:
-{memory_content}
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "User wants to work but no session is active. Environment is synced.",
-  "reply": "To start working on that, we need to kickoff a session. Shall I do that?",
-  "actions": [], 
-  "execute_now": false
-}}
-"""
-        elif mode == "ticket_assistant":
-            system_prompt = f"""
-## Role & Objective
-You are the **Tier 1 Support Assistant** for Bear Application Department.
-**Tone**: Professional, friendly, and helpful. NOT robotic.
-**Goal**: Engage the user in a natural conversation to gather the details needed for a support ticket.
-
-CURRENT STATUS:
-{status_text}
-
-## The "Shadow Form" (Variables to Track)
-1.  **User Intent** (What they want)
-2.  **Timeline** (When they need it by)
-3.  **Blocking Context** (What is this blocking? e.g. Customer, Meeting, Workflow)
-4.  **Evidence** (Files/Logs)
-
-## Conversation Principles
-1.  **Be Conversational**: Do not sound like a form-filler.
-    -   *Bad*: "What is the urgency?" (approving robotic)
-    -   *Good*: "Got it. How quickly do you need this turned around?"
-2.  **NO VERBATIM REPETITION**: If the user gives a vague answer, **DO NOT** repeat your previous question.
-    -   *Instead*: Explain **WHY** you need the info.
-    -   *Example*: Use timelines. "I need to know if this is blocking a customer deliverable today (High Urgency) or just an internal task for next week."
-3.  **Adaptive Questioning**:
-    -   If the user answers "I want a cheeseburger", accept it as the Intent. Do not judge.
-    -   If the answer requires clarification, ask politely.
-4.  **Context Awareness**: Use the chat history provided. **DO NOT** make up facts (like "Invoice 123") unless the user mentioned them in *this* conversation.
-5.  **Proactive Context Enrichment**:
-    -   Don't just ask "tell me more". Ask specific questions to make the ticket better.
-    -   *If technical issue*: "Do you have an error log, screenshot, or request ID you can paste here?"
-    -   *If data request*: "What specific columns or time range do you need?"
-    -   *If feature request*: "Is there a specific example or competitor feature you are referencing?"
-
-## Iterative Proposal Flow
--   **Propose Early & Often**: As soon as you have a rough idea of the Intent, **Propose a Ticket**. Do not wait for perfection.
--   **Refinement**: If the user corrects you or adds more info *after* a proposal, **RE-EMIT** the `propose_ticket` action with the updated details.
-    -   *User*: "Actually, it's urgent." -> *You*: `propose_ticket | ... | 9 | ...`
-    
-    -   **CRITICAL: PROPOSAL DIALOGUE**:
-        When emitting a `propose_ticket` action, your accompanying `reply` MUST:
-        1.  Ask if the draft correctly captures their request.
-        2.  Explicitly ask if they want to **add any more details** or **improve** it.
-        3.  Remind them they can click the **'Accept & Submit'** button if they are satisfied.
-
-## Valid Outcomes
-1.  **Propose Ticket**: When you have Intent and can estimate urgency.
-    -   **Urgency Score (1-10)**:
-        -   **10 (Critical)**: Blocked customer/executive + Due NOW.
-        -   **7-9 (High)**: Blocked team/workflow + Due today.
-        -   **4-6 (Medium)**: Non-blocking issue + Due this week.
-        -   **1-3 (Low)**: "Nice to have" or no deadline.
-    -   Action Format: `propose_ticket | <Title> | <Urgency Score (1-10)> | <Description>`
-    -   **Reply Format**: When proposing a ticket, your `reply` MUST be **EXACTLY** this structure (no preamble):
-        1.  "Did we capture it all correctly? Anything you would like to add?"
-        2.  A blank line (paragraph break).
-        3.  A helpful **Nudge/Tip** to improve the ticket (e.g. "To speed this up, attaching a screenshot would be great.").
-2.  **Abandon**: If the user says "cancel" or "nevermind", tell them to click the "Discard" button or use `!abandon`.
-
-## Crucial Reminders
--   **NO EMAIL PROMISES**: Do not say "You will receive an email". We do not have email integration.
--   **Button Focus**: Always direct the user to the interactive buttons for the final step.
-
-## RESPONSE FORMAT (JSON ONLY)
-{{
-  "thought_process": "User is vague about urgency. I will explain the priority levels.",
-  "reply": "To ensure I can get you the right help, when is this absolutely needed by, and what specific task or meeting is this blocking?",
-  "actions": [], 
-  "execute_now": false
-}}
-
-LONG-TERM MEMORY:
-{memory_content}
-"""
-
-        else:
-            # Default / BAD Bot Mode
-            system_prompt = f"""
-You are an intelligent Discord bot for 'Bear Application Department'.
-Your goal is to help users manage their engineering tasks, github issues, and servers.
-
-CURRENT STATUS:
-{status_text}
-
-LONG-TERM MEMORY (Preferences & Facts):
-{memory_content}
-
-AVAILABLE ACTIONS:
-{json.dumps(available_actions, indent=2)}
-
-You can now use a "Conversational Flow":
-1.  **Analyze Context**: extensive history is provided. Use it to understand "it", "that", etc.
-2.  **Safe Actions**: If the user asks for information (e.g. "list issues", "get issue 1", "read file", "check status"), YOU MUST SET `execute_now` to `true`. Do NOT ask for confirmation. Run it immediately.
-3.  **Mutating Actions**: If the user asks to change state (e.g. "close issue", "run cleanup", "delete"), set `execute_now` to `false` and I will ask for confirmation.
-4.  **Memory**: Use the `remember` tool ONLY when the user explicitly provides a new preference or fact. Do NOT use it for conversation logging or trivial details.
-5.  **Answering**: If the result of an action is in the history, interpret it and Answer the user in the `reply` field. Do NOT create a new plan just to show the answer.
-6.  **Formatting**: When listing multiple items with URLs, YOU MUST wrap each URL in `<` and `>` (e.g. `<https://example.com>`) to prevent Discord from generating spammy embeds.
-
-RESPONSE FORMAT (JSON ONLY):
-{{
-  "thought_process": "Analyze functionality and history...",
-  "plan_summary": "Briefly describe what you will do.",
-  "actions": ["action_name arg1", "action_name arg2"],
-  "execute_now": true/false (true ONLY for read-only/safe actions like 'list' or 'get'),
-  "reply": "Message to the user (optional if executing now)"
-}}
-"""
-        
-        prompt = f"{system_prompt}\n\n"
-        
-        if history:
-            prompt += "CONVERSATION HISTORY:\n"
-            for msg in history:
-                prompt += f"{msg}\n"
-            prompt += "\n"
-
-        prompt += f"USER MESSAGE: {user_message}"
-
-        max_retries = 5
-        backoff = 4
-
-        for attempt in range(max_retries + 1):
-            try:
-                # Run sync API call in a thread to avoid blocking the loop
-                response = await asyncio.to_thread(
-                    self.model.generate_content,
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        response_mime_type="application/json"
-                    )
-                )
-                
-                # Parse the JSON response
-                usage = response.usage_metadata
-                if usage:
-                    # Pricing for Gemini 1.5 Flash (approximate fallback for Flash-Lite/Latest)
-                    # Input: $0.35 / 1M tokens, Output: $1.05 / 1M tokens
-                    input_cost = (usage.prompt_token_count / 1_000_000) * 0.35
-                    output_cost = (usage.candidates_token_count / 1_000_000) * 1.05
-                    total_cost = input_cost + output_cost
-                    
-                    print(f"[COST] Usage: Input={usage.prompt_token_count}, Output={usage.candidates_token_count} | Est. Cost: ${total_cost:.6f}")
-                
-                text = response.text
-                print(f"DEBUG: RAW MODEL RESPONSE:\n{text}")
-                
-                if not text:
-                    print(f"DEBUG: Empty response. Candidates: {response.candidates}")
-                    if response.candidates:
-                            print(f"DEBUG: Finish reason: {response.candidates[0].finish_reason}")
-                    raise ValueError("Empty response from Gemini API")
-                
-                # Robust JSON Extraction
-                parsed_json = self._extract_json(text)
-                if parsed_json:
-                    return parsed_json
-                else:
-                    raise ValueError(f"Failed to parse JSON from response: {text[:100]}...")
-
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str and attempt < max_retries:
-                    print(f"WARNING: Quota exceeded. Retrying in {backoff}s... (Attempt {attempt+1}/{max_retries})")
-                    await asyncio.sleep(backoff)
-                    backoff *= 2
-                    continue
-                else:
-                    print(f"Error in AgentBrain: {e}")
-                    return {
-                        "thought_process": "Error occurred during processing.",
-                        "plan_summary": "",
-                        "actions": [],
-                        "reply": f"I encountered an error trying to think about that: {error_str[:100]}"
-                    }
+            return None
+
+        prompt = (
+            "You maintain a running summary of a support/planning conversation.\n"
+            "Merge the existing summary with the new messages into ONE updated summary.\n"
+            "Keep every fact needed to continue the conversation: names, requirements, decisions, "
+            "open questions, ticket details (title, urgency, description) and results of actions.\n"
+            f"Write plain prose, no JSON, at most {max_chars} characters.\n\n"
+            f"EXISTING SUMMARY:\n{previous_summary or '(none)'}\n\n"
+            "NEW MESSAGES:\n" + "\n".join(lines)
+        )
+        try:
+            response = await llm.generate(self.model, prompt, mode="summary")
+            text = (response.text or "").strip()
+            return text[:max_chars] if text else None
+        except Exception as e:
+            print(f"⚠️ Conversation summary failed: {e}")
+            return None
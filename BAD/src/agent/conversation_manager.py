@@ -1,11 +1,35 @@
 import logging
+import os
 from src import db
 
 logger = logging.getLogger("CONVERSATION_MANAGER")
 
+# How much history is sent to the brain: the last N lines, optionally capped by size (0 = no cap)
+CONVERSATION_HISTORY_LIMIT = int(os.getenv('CONVERSATION_HISTORY_LIMIT', '50'))
+CONVERSATION_HISTORY_MAX_CHARS = int(os.getenv('CONVERSATION_HISTORY_MAX_CHARS', '0'))
+
 class ConversationManager:
-    def __init__(self):
-        pass
+    def __init__(self, message_writer=None):
+        # Optional MessageWriter: when set, message inserts are group-committed
+        # in the background instead of one transaction per message.
+        self.message_writer = message_writer
+
+    @staticmethod
+    def format_line(role, content):
+        return f"{'User' if role == 'user' else 'Bot'}: {content}"
+
+    def _add_message(self, channel_id, conversation_id, role, content):
+        if self.message_writer:
+            self.message_writer.add(conversation_id, role, content)
+        else:
+            db.add_message(conversation_id, role, content)
+        # Write-through so the next get_history() is served from memory
+        db.hot_cache().append_history(channel_id, self.format_line(role, content))
+
+    def flush(self):
+        """Commits any buffered messages (call before shutdown or closing a ticket)."""
+        if self.message_writer:
+            self.message_writer.flush()
 
     def get_or_create_conversation(self, channel_id, user_message=None):
         """
@@ -24,6 +48,8 @@ class ConversationManager:
             
             conversation_id = db.create_conversation(channel_id, topic)
             conversation = db.get_active_conversation(channel_id) # Reload to get full object
+            # A brand new conversation has no history: cache that fact so it never needs reading
+            db.hot_cache().set_history(channel_id, [], complete=True)
             
         return conversation
 
@@ -31,7 +57,7 @@ class ConversationManager:
         """Adds a user message to the active conversation."""
         conversation = self.get_or_create_conversation(channel_id, content)
         if conversation:
-            db.add_message(conversation['id'], 'user', content)
+            self._add_message(channel_id, conversation['id'], 'user', content)
             return conversation
         return None
 
@@ -39,26 +65,66 @@ class ConversationManager:
         """Adds a bot message to the active conversation."""
         conversation = db.get_active_conversation(channel_id)
         if conversation:
-            db.add_message(conversation['id'], 'model', content)
+            self._add_message(channel_id, conversation['id'], 'model', content)
         else:
             logger.warning(f"Attempted to add bot message to inactive conversation in {channel_id}")
 
-    def get_history(self, channel_id):
-        """Returns the conversation history formatted for the brain."""
+    def get_history(self, channel_id, limit=None, max_chars=None):
+        """
+        Returns the conversation history formatted for the brain.
+        Only the latest `limit` lines are returned (CONVERSATION_HISTORY_LIMIT by default),
+        further trimmed to the most recent lines fitting `max_chars` if a budget is set.
+        If older messages were summarized (see ConversationSummarizer), the summary comes
+        first, followed by the messages newer than it.
+        Only reads: call flush() first (on the writer thread) so buffered messages are included.
+        """
+        limit = limit or CONVERSATION_HISTORY_LIMIT
+        max_chars = max_chars if max_chars is not None else (CONVERSATION_HISTORY_MAX_CHARS or None)
+
         conversation = db.get_active_conversation(channel_id)
         if not conversation:
             return []
-        
-        messages = db.get_conversation_history(conversation['id'])
-        formatted_history = []
-        for msg in messages:
-            role = "User" if msg['role'] == 'user' else "Bot"
-            formatted_history.append(f"{role}: {msg['content']}")
-            
-        return formatted_history
+
+        # With a rolling summary, only messages after it are sent raw (and cached)
+        summarized_until = conversation.get('summary_until') or 0
+        cached = db.hot_cache().get_history(channel_id)
+        if cached and (cached[1] or len(cached[0]) >= limit):
+            lines = cached[0][-limit:]
+        else:
+            # Taken before reading: if a message is added meanwhile, what we read is already stale
+            generation = db.hot_cache().history_generation(channel_id)
+            messages = db.get_conversation_history(conversation['id'], limit=limit)
+            recent = [msg for msg in messages if msg['id'] > summarized_until]
+            lines = [self.format_line(msg['role'], msg['content']) for msg in recent]
+
+            # Fewer rows than asked for means we hold everything since the summary
+            complete = len(recent) < limit
+            db.hot_cache().set_history(channel_id, lines, complete=complete, generation=generation)
+
+        lines = self._fit_budget(lines, max_chars)
+        if conversation.get('summary'):
+            return [self.format_summary(conversation['summary'])] + lines
+        return lines
+
+    @staticmethod
+    def format_summary(summary):
+        return f"Summary of earlier conversation: {summary}"
+
+    @staticmethod
+    def _fit_budget(lines, max_chars):
+        """Keeps the most recent lines whose combined length fits max_chars."""
+        if not max_chars:
+            return lines
+        total = 0
+        for i in range(len(lines) - 1, -1, -1):
+            total += len(lines[i])
+            if total > max_chars:
+                return lines[i + 1:]
+        return lines
 
     def start_new_conversation(self, channel_id):
         """Forces a new conversation by closing the old one."""
+        self.flush()
         old_conversation = db.get_active_conversation(channel_id)
         if old_conversation:
             db.close_conversation(old_conversation['id'])
@@ -72,6 +138,8 @@ class ConversationManager:
         If conversation_id is provided, deletes that specific conversation.
         If only channel_id is provided, deletes the active conversation for that channel.
         """
+        # Buffered rows must land before the delete, or they'd be inserted as orphans afterwards
+        self.flush()
         if conversation_id:
             db.delete_conversation(conversation_id)
             logger.info(f"Deleted conversation {conversation_id}")
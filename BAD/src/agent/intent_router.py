@@ -0,0 +1,176 @@
+"""
+Local intent pre-classifier for ticket-channel messages.
+
+Many messages in a ticket chat are trivial ("ok", "thanks", "yes submit",
+"nevermind", a screenshot with no text). IntentRouter recognises those with word
+rules (microseconds, no network) and answers them with a canned reply; everything
+else is routed to AgentBrain.think as before.
+
+The rules only fire when EVERY word of a short message is known (an intent keyword
+or filler), so "don't submit", "no thanks" or "ok but the export is broken" still
+go to the model. Optionally a small Naive Bayes model, trained from the user
+messages in the `messages` table (weakly labelled by the rules), catches variants
+the word lists miss; it only overrides the rules above INTENT_MODEL_THRESHOLD.
+
+scripts/eval_intent_router.py measures how many model calls this avoids on
+archived transcripts.
+"""
+import math
+import os
+import re
+from collections import Counter, defaultdict, namedtuple
+
+INTENT_ROUTER_ENABLED = os.getenv('INTENT_ROUTER_ENABLED', '1') == '1'
+INTENT_MODEL_ENABLED = os.getenv('INTENT_MODEL_ENABLED', '0') == '1'
+INTENT_MODEL_THRESHOLD = float(os.getenv('INTENT_MODEL_THRESHOLD', '0.9'))
+INTENT_MAX_WORDS = int(os.getenv('INTENT_MAX_WORDS', '6'))
+
+THANKS = "thanks"
+ACK = "ack"
+SUBMIT = "submit"
+CANCEL = "cancel"
+ATTACHMENT = "attachment"
+SUBSTANTIVE = "substantive"
+
+# Checked in this order: "ok cancel" is a cancel, "yes submit thanks" a submit
+_KEYWORDS = {
+    CANCEL: {"cancel", "nevermind", "nvm", "discard", "forgetit", "abandon"},
+    SUBMIT: {"submit", "lgtm", "looksgood", "correct", "confirm", "confirmed", "approve", "goahead", "send"},
+    THANKS: {"thanks", "thankyou", "thx", "ty", "tysm", "cheers", "appreciated", "appreciate"},
+    ACK: {"ok", "okay", "k", "kk", "yes", "yep", "yeah", "yup", "sure", "cool", "great", "perfect", "nice",
+          "alright", "gotit", "soundsgood", "allgood", "fine", "understood", "noted", "awesome"},
+}
+_FILLERS = {"it", "that", "thats", "this", "so", "much", "a", "lot", "very", "you", "again", "please", "pls",
+            "just", "now", "then", "all", "oh", "ah", "and", "the", "ticket", "draft", "is", "its", "for"}
+_PHRASES = [
+    (re.compile(r"\bthank you\b"), "thankyou"), (re.compile(r"\bnever ?mind\b"), "nevermind"),
+    (re.compile(r"\bforget (?:about )?it\b"), "forgetit"), (re.compile(r"\blooks? good\b"), "looksgood"),
+    (re.compile(r"\bsounds? good\b"), "soundsgood"), (re.compile(r"\bgot it\b"), "gotit"),
+    (re.compile(r"\bgo ahead\b"), "goahead"), (re.compile(r"\ball good\b"), "allgood"),
+]
+_EMOJI = {"👍": " ok ", "👌": " ok ", "✅": " ok ", "🙏": " thanks ", "❤️": " thanks ", "❤": " thanks "}
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+REPLIES = {
+    THANKS: "You're welcome! 😊 Let me know if there's anything else I can help with.",
+    CANCEL: "No problem. To drop this request, click the **🗑️ Discard** button or use `!abandon`.",
+    SUBMIT: "Great! Click **✅ Accept & Submit** on the draft above and I'll pass it on to the team.",
+    ACK: "👍 If the draft above looks right, click **✅ Accept & Submit**. Otherwise, just tell me what to change.",
+    ATTACHMENT: "📎 Thanks, I've added {count} to the conversation. Anything else you'd like to add?",
+}
+
+Route = namedtuple("Route", "intent reply source confidence")
+
+def normalize(text):
+    """Lowercase, emoji mapped to words, punctuation dropped, multi-word phrases joined."""
+    text = text.lower()
+    for emoji, word in _EMOJI.items():
+        text = text.replace(emoji, word)
+    text = _NON_WORD.sub("", text)
+    text = " ".join(text.split())
+    for pattern, token in _PHRASES:
+        text = pattern.sub(token, text)
+    return text
+
+def rule_intent(text):
+    """The intent of a short all-known-words message, or SUBSTANTIVE."""
+    words = normalize(text).split()
+    if not words or len(words) > INTENT_MAX_WORDS:
+        return SUBSTANTIVE
+    found = set()
+    for word in words:
+        matches = [intent for intent, keywords in _KEYWORDS.items() if word in keywords]
+        if matches:
+            found.update(matches)
+        elif word not in _FILLERS:
+            return SUBSTANTIVE # An unknown word may carry meaning ("no", "don't", "but ...")
+    for intent in _KEYWORDS: # Priority order
+        if intent in found:
+            return intent
+    return SUBSTANTIVE # Fillers only
+
+class NaiveBayesIntentModel:
+    """Multinomial Naive Bayes over normalised words (Laplace smoothing); no dependencies."""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.class_counts = Counter()
+        self.word_counts = defaultdict(Counter)
+        self.vocabulary = set()
+
+    def fit(self, texts, labels):
+        for text, label in zip(texts, labels):
+            words = normalize(text).split()
+            self.class_counts[label] += 1
+            self.word_counts[label].update(words)
+            self.vocabulary.update(words)
+        return self
+
+    def predict(self, text):
+        """Returns (label, probability)."""
+        words = [w for w in normalize(text).split() if w in self.vocabulary]
+        total = sum(self.class_counts.values())
+        if not total:
+            return SUBSTANTIVE, 0.0
+        scores = {}
+        for label, count in self.class_counts.items():
+            denominator = sum(self.word_counts[label].values()) + self.alpha * len(self.vocabulary)
+            scores[label] = math.log(count / total) + sum(
+                math.log((self.word_counts[label][w] + self.alpha) / denominator) for w in words
+            )
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / norm
+
+    @classmethod
+    def from_messages(cls, texts, min_examples=20):
+        """Trains on short user messages labelled by the rules; None if there's too little to learn from."""
+        texts = [t for t in texts if t and len(t.split()) <= INTENT_MAX_WORDS * 2]
+        labels = [rule_intent(t) for t in texts]
+        if sum(1 for label in labels if label != SUBSTANTIVE) < min_examples:
+            return None
+        return cls().fit(texts, labels)
+
+class IntentRouter:
+    def __init__(self, model=None, threshold=INTENT_MODEL_THRESHOLD, enabled=INTENT_ROUTER_ENABLED):
+        self.model = model
+        self.threshold = threshold
+        self.enabled = enabled
+        self.counts = Counter() # intent -> messages routed (for stats)
+
+    def classify(self, text, attachments=0):
+        """Returns (intent, source, confidence)."""
+        if not (text or "").strip():
+            return (ATTACHMENT, "rule", 1.0) if attachments else (SUBSTANTIVE, "rule", 1.0)
+        intent = rule_intent(text)
+        if intent != SUBSTANTIVE:
+            return intent, "rule", 1.0
+        if self.model is not None and len(text.split()) <= INTENT_MAX_WORDS:
+            label, probability = self.model.predict(text)
+            if label != SUBSTANTIVE and probability >= self.threshold:
+                return label, "model", probability
+        return SUBSTANTIVE, "rule", 1.0
+
+    def route(self, text, attachments=0, draft_pending=False):
+        """
+        Decides how to handle a ticket-channel message. Route.reply is the canned answer,
+        or None when the message must go to the LLM. Acknowledgements and "submit" are
+        only answered locally while a draft ticket is waiting for the Accept button;
+        before that they may be answers to the assistant's question.
+        """
+        intent, source, confidence = self.classify(text, attachments) if self.enabled else (SUBSTANTIVE, "off", 1.0)
+        reply = None
+        if intent in (THANKS, CANCEL):
+            reply = REPLIES[intent]
+        elif intent in (SUBMIT, ACK) and draft_pending:
+            reply = REPLIES[intent]
+        elif intent == ATTACHMENT:
+            reply = REPLIES[ATTACHMENT].format(count="the file" if attachments == 1 else f"{attachments} files")
+        self.counts[intent if reply else SUBSTANTIVE] += 1
+        return Route(intent, reply, source, confidence)
+
+    def stats(self):
+        total = sum(self.counts.values())
+        handled = total - self.counts[SUBSTANTIVE]
+        return {"messages": total, "handled_locally": handled, "avoided_rate": handled / total if total else 0.0,
+                "by_intent": dict(self.counts)}
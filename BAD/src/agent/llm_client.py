@@ -0,0 +1,343 @@
+"""
+Shared async access to Gemini.
+
+google-generativeai's `generate_content_async` runs on its async gRPC transport,
+whose channel is created once per process and shared by every GenerativeModel, so
+calls reuse connections and don't hold a thread for the whole round-trip (as
+`asyncio.to_thread(model.generate_content, ...)` did). On top of that LLMClient adds:
+
+- a process-wide rate limiter (LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE)
+  that queues requests fairly across channels, so a burst of tickets turns into
+  short queueing instead of a wall of 429s;
+- retries of rate-limit errors, waiting for the server's retry-after hint when
+  it gives one and a jittered exponential backoff otherwise;
+- a concurrency limit (LLM_MAX_CONCURRENCY) and a per-request timeout
+  (LLM_TIMEOUT_SECONDS);
+- cancellation by key: requests tagged with e.g. a channel id can be cancelled
+  with cancel(channel_id) when that channel is deleted mid-thought;
+- usage accounting: with a usage_recorder, every call's tokens, latency, retries
+  and outcome are logged to the llm_usage ledger (LLM_USAGE_LEDGER=0 disables it).
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger("LLM_CLIENT")
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+# Quota of the API key (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+# Output tokens assumed for a request until its real usage is known
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv('LLM_EXPECTED_OUTPUT_TOKENS', '500'))
+LLM_USAGE_LEDGER = os.getenv('LLM_USAGE_LEDGER', '1') == '1'
+
+_RETRY_HINTS = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+def is_rate_limit_error(error):
+    if getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    return "429" in str(error)
+
+def retry_after_hint(error):
+    """Seconds the server asked us to wait (RetryInfo detail or message text), or None."""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and getattr(delay, "seconds", None) is not None:
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+def estimate_tokens(contents):
+    """Rough input token count of a prompt (~4 characters per token)."""
+    return len(str(contents)) // 4 + 1
+
+class RateLimiter:
+    """
+    Token buckets for requests/minute and tokens/minute, shared by the process.
+
+    Waiters are queued per key and granted round-robin across keys, so one busy
+    channel can't starve the others. Token costs are estimated up front and
+    corrected with record_usage() once the real usage is known.
+    """
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE, clock=time.monotonic):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._clock = clock
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._last = clock()
+        self._paused_until = 0.0
+        self._queues = OrderedDict() # key -> deque of (future, tokens), in round-robin order
+        self._timer = None
+        self._timer_loop = None
+
+    def _refill(self):
+        now = self._clock()
+        elapsed, self._last = now - self._last, now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens):
+        """Seconds until a request costing `tokens` fits (0 = now)."""
+        wait = max(0.0, self._paused_until - self._clock())
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future, tokens = queue[0]
+            if future.done(): # Cancelled while waiting
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                continue
+
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer_loop = asyncio.get_running_loop()
+                self._timer = self._timer_loop.call_later(wait, self._dispatch)
+                return
+
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            queue.popleft()
+            future.set_result(None)
+            if queue:
+                self._queues.move_to_end(key) # Next key's turn
+            else:
+                del self._queues[key]
+
+    async def acquire(self, key=None, tokens=1):
+        """Waits for this key's turn and for quota for one request of ~`tokens` tokens."""
+        if not self.rpm and not self.tpm:
+            return
+        if self.tpm:
+            tokens = min(tokens, self.tpm) # A single huge prompt must still be able to run
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer_loop is not loop:
+            self._timer = None # Armed by a loop that is gone (e.g. a previous asyncio.run)
+        future = loop.create_future()
+        self._queues.setdefault(str(key), deque()).append((future, tokens))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if self._timer is None and self._queues:
+                self._dispatch() # We may have been at the head
+            raise
+
+    def record_usage(self, estimated, actual):
+        """Corrects the token bucket once a request's real token count is known."""
+        if self.tpm and actual is not None:
+            self._tokens -= actual - estimated # May go negative: later requests wait longer
+
+    def pause(self, seconds):
+        """Holds every request for `seconds` (the server told us the quota is exhausted)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+class LLMClient:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS, rate_limiter=None,
+                 max_retries=LLM_MAX_RETRIES, backoff_base=1.0, backoff_cap=30.0, usage_recorder=None):
+        self.timeout = timeout
+        self.usage_recorder = usage_recorder
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = {} # key -> set of tasks waiting on / running a request for it
+
+    def _retry_delay(self, error, attempt):
+        hint = retry_after_hint(error)
+        if hint is not None:
+            # Honour the server, plus a little jitter so waiters don't all return at once
+            return hint + random.uniform(0, 1)
+        # Full jitter: spreads concurrent retries over the whole window
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def _backoff(self, error, attempt):
+        """Sleeps before retrying a rate-limited attempt; re-raises anything else (or when out of retries)."""
+        if not is_rate_limit_error(error) or attempt >= self.max_retries:
+            raise error
+        delay = self._retry_delay(error, attempt)
+        if retry_after_hint(error) is not None:
+            self.rate_limiter.pause(delay) # The quota is shared: hold everyone, not just us
+        logger.warning(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+        await asyncio.sleep(delay)
+
+    def _record(self, response, estimated):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.rate_limiter.record_usage(estimated, getattr(usage, "total_token_count", None))
+
+    def _report(self, model, contents, key, mode, response, status, retries, started, sent):
+        """Logs one call to the usage ledger (if any). `started`: call entry, `sent`: last attempt sent upstream."""
+        if self.usage_recorder is None:
+            return
+        try:
+            usage = getattr(response, "usage_metadata", None) if response is not None else None
+            now = time.monotonic()
+            self.usage_recorder.record(
+                channel_id=key,
+                mode=mode,
+                model=getattr(model, "model_name", None),
+                status=status,
+                prompt_tokens=getattr(usage, "prompt_token_count", None) if usage is not None else (estimate_tokens(contents) if sent else 0),
+                output_tokens=getattr(usage, "candidates_token_count", None) if usage is not None else 0,
+                cached_tokens=getattr(usage, "cached_content_token_count", None) if usage is not None else 0,
+                latency_ms=(now - sent) * 1000 if sent else None,
+                queued_ms=((sent or now) - started) * 1000,
+                retries=retries
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record LLM usage: {e}")
+
+    def _register(self, key):
+        task = asyncio.current_task()
+        if key is not None:
+            self._tasks.setdefault(str(key), set()).add(task)
+        return task
+
+    def _unregister(self, key, task):
+        tasks = self._tasks.get(str(key)) if key is not None else None
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[str(key)]
+
+    async def generate(self, model, contents, key=None, timeout=None, mode=None, **kwargs):
+        """
+        Runs model.generate_content_async(contents, **kwargs) within the rate and
+        concurrency limits, retrying rate-limit errors. Raises asyncio.TimeoutError after
+        `timeout` seconds per attempt, and CancelledError if cancel(key) is called meanwhile.
+        `mode` labels the call in the usage ledger (e.g. "ticket_assistant", "summary").
+        """
+        timeout = timeout or self.timeout
+        kwargs.setdefault("request_options", {"timeout": timeout})
+        estimated = estimate_tokens(contents) + LLM_EXPECTED_OUTPUT_TOKENS
+        task = self._register(key)
+        started, sent, attempt, response, status = time.monotonic(), None, 0, None, "error"
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(key, estimated)
+                try:
+                    async with self._semaphore:
+                        sent = time.monotonic()
+                        response = await asyncio.wait_for(model.generate_content_async(contents, **kwargs), timeout)
+                except Exception as e:
+                    await self._backoff(e, attempt)
+                    continue
+                self._record(response, estimated)
+                status = "ok"
+                return response
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self._unregister(key, task)
+            self._report(model, contents, key, mode, response, status, attempt, started, sent)
+
+    async def stream(self, model, contents, key=None, timeout=None, mode=None, **kwargs):
+        """
+        Like generate(), but with stream=True: yields response chunks as they arrive.
+        `timeout` applies to each chunk. Rate-limit errors are only retried before the
+        first chunk (after that, part of the answer has already been consumed).
+        """
+        timeout = timeout or self.timeout
+        kwargs.setdefault("request_options", {"timeout": timeout})
+        estimated = estimate_tokens(contents) + LLM_EXPECTED_OUTPUT_TOKENS
+        task = self._register(key)
+        started, sent, attempt, response, status = time.monotonic(), None, 0, None, "error"
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(key, estimated)
+                error = None
+                async with self._semaphore:
+                    try:
+                        sent = time.monotonic()
+                        response = await asyncio.wait_for(model.generate_content_async(contents, stream=True, **kwargs), timeout)
+                        chunks = response.__aiter__()
+                        first = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        status = "ok"
+                        return
+                    except Exception as e:
+                        error = e
+                    else:
+                        yield first
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                            except StopAsyncIteration:
+                                break
+                            yield chunk
+                        self._record(response, estimated)
+                        status = "ok"
+                        return
+                await self._backoff(error, attempt) # Outside the semaphore: don't hold a slot while sleeping
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except GeneratorExit:
+            status = "abandoned" # Consumer stopped reading
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self._unregister(key, task)
+            self._report(model, contents, key, mode, response, status, attempt, started, sent)
+
+    def cancel(self, key):
+        """Cancels every in-flight request (and the task awaiting it) tagged with `key`. Returns how many."""
+        tasks = self._tasks.pop(str(key), set())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            logger.info(f"Cancelled {len(tasks)} LLM request(s) for {key}")
+        return len(tasks)
+
+    def in_flight(self, key=None):
+        if key is None:
+            return sum(len(tasks) for tasks in self._tasks.values())
+        return len(self._tasks.get(str(key), ()))
+
+def _default_usage_recorder():
+    if not LLM_USAGE_LEDGER:
+        return None
+    from src.agent.usage_recorder import UsageRecorder
+    return UsageRecorder()
+
+llm = LLMClient(usage_recorder=_default_usage_recorder())
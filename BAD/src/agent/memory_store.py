@@ -0,0 +1,154 @@
+"""
+Long-term memory for AgentBrain, stored in SQLite (tables memories / memories_fts).
+
+Two kinds of entries:
+- keyed facts, one value per (category, key), e.g. preferences/issues_display.
+  They are small and always relevant, so they form the LONG-TERM MEMORY block of
+  the (cached) system prompt, capped at MEMORY_PINNED_MAX_CHARS;
+- notes (free text). Only the MEMORY_TOP_K notes most relevant to the current
+  message (FTS5 / BM25) are added to the per-call part of the prompt.
+
+So the prompt stays the same size however many notes pile up. Writes are single
+SQLite transactions, safe with the three bot processes sharing data/bad.db.
+The legacy config/memory.json is imported once and renamed to memory.json.migrated.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from src import db
+from src import db_async
+
+logger = logging.getLogger("MEMORY_STORE")
+
+MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '5'))
+MEMORY_PINNED_MAX_CHARS = int(os.getenv('MEMORY_PINNED_MAX_CHARS', '2000'))
+
+# Where memory lived before this store; imported once (see import_legacy)
+LEGACY_MEMORY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config', 'memory.json')
+
+NOTES_CATEGORY = "notes"
+GENERAL_CATEGORY = "general"
+
+def _text(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def memory_entries(content):
+    """
+    Maps what the `remember` action stores onto (category, key, content) entries:
+    {"category": {"key": value}} and {"key": value} become keyed facts (the latter in
+    'general'), {"notes": [...]} and plain strings become notes.
+    """
+    if not isinstance(content, dict):
+        text = str(content).strip()
+        return [(NOTES_CATEGORY, None, text)] if text else []
+
+    entries = []
+    for key, value in content.items():
+        if key == NOTES_CATEGORY:
+            notes = value if isinstance(value, list) else [value]
+            entries.extend((NOTES_CATEGORY, None, _text(note)) for note in notes if _text(note).strip())
+        elif isinstance(value, dict):
+            entries.extend((str(key), str(sub_key), _text(sub_value)) for sub_key, sub_value in value.items())
+        else:
+            entries.append((GENERAL_CATEGORY, str(key), _text(value)))
+    return entries
+
+class MemoryStore:
+    def __init__(self, top_k=MEMORY_TOP_K, pinned_max_chars=MEMORY_PINNED_MAX_CHARS, legacy_path=LEGACY_MEMORY_PATH):
+        self.top_k = top_k
+        self.pinned_max_chars = pinned_max_chars
+        self.legacy_path = legacy_path
+        self._version = None
+        self._pinned = ("{}", _digest("{}"))
+        self._pinned_ids = set()
+        self._legacy_checked = False
+
+    def save(self, content):
+        """Stores a `remember` payload (dict or text) atomically. Returns True on success."""
+        try:
+            entries = memory_entries(content)
+            if entries:
+                db.save_memories(entries)
+            return True
+        except Exception as e:
+            print(f"ERROR: Error saving memory: {e}")
+            return False
+
+    def pinned(self):
+        """(text, digest) of the keyed facts for the system prompt, as of the last refresh."""
+        return self._pinned
+
+    def import_legacy(self):
+        """
+        Imports config/memory.json (JSON or plain text) once; the rename makes it safe across
+        processes. If the import fails the file is put back, to be retried on the next call.
+        """
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            self._legacy_checked = True
+            return False
+        claimed = f"{self.legacy_path}.importing.{os.getpid()}"
+        try:
+            os.rename(self.legacy_path, claimed) # Only one process wins
+        except OSError:
+            return False
+
+        try:
+            with open(claimed, 'r') as f:
+                raw = f.read()
+            try:
+                content = json.loads(raw)
+            except ValueError:
+                content = raw
+            if isinstance(content, list):
+                content = {NOTES_CATEGORY: content}
+            db.save_memories(memory_entries(content))
+            os.replace(claimed, f"{self.legacy_path}.migrated")
+        except Exception:
+            os.rename(claimed, self.legacy_path)
+            raise
+        self._legacy_checked = True
+        print(f"🧠 Imported legacy memory from {self.legacy_path}")
+        return True
+
+    def refresh(self):
+        """Rebuilds the pinned block if the keyed facts changed (in any process)."""
+        version = db.get_memory_version()
+        if version == self._version:
+            return
+        facts, ids, size = {}, set(), 2
+        for row in db.get_keyed_memories(): # Most recent first: older facts drop out of the budget first
+            size += len(row['category']) + len(row['key']) + len(row['content']) + 12
+            if size > self.pinned_max_chars:
+                break
+            facts.setdefault(row['category'], {})[row['key']] = row['content']
+            ids.add(row['id'])
+        text = json.dumps(facts, ensure_ascii=False, sort_keys=True, indent=1) # Sorted: byte-stable prefix
+        self._pinned, self._pinned_ids, self._version = (text, _digest(text)), ids, version
+
+    def relevant(self, message):
+        """The top-k memories for `message` that aren't already pinned."""
+        rows = db.search_memories(message, limit=self.top_k + len(self._pinned_ids))
+        return [row for row in rows if row['id'] not in self._pinned_ids][:self.top_k]
+
+    def _prepare(self, message):
+        self.refresh()
+        return [row['content'] for row in self.relevant(message or "")]
+
+    async def prepare(self, message):
+        """
+        Refreshes the pinned facts and returns the notes relevant to `message`. Call
+        before building a prompt. On database errors, keeps the last pinned block and
+        returns no notes.
+        """
+        try:
+            if not self._legacy_checked:
+                await db_async.run_write(self.import_legacy)
+            return await db_async.run_read(self._prepare, message)
+        except Exception as e:
+            logger.warning(f"Memory lookup failed: {e}")
+            return []
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from src import db
+
+logger = logging.getLogger("MESSAGE_WRITER")
+
+# Group-commit window: whichever comes first
+MESSAGE_FLUSH_INTERVAL_MS = int(os.getenv('MESSAGE_FLUSH_INTERVAL_MS', '50'))
+MESSAGE_FLUSH_MAX_ROWS = int(os.getenv('MESSAGE_FLUSH_MAX_ROWS', '100'))
+# Failed group commits retried before falling back to row-by-row writes
+MESSAGE_FLUSH_MAX_RETRIES = int(os.getenv('MESSAGE_FLUSH_MAX_RETRIES', '3'))
+
+class BatchWriter:
+    """
+    Buffers row inserts and commits them in groups.
+
+    Instead of one transaction (and one fsync) per row, rows are collected for up to
+    `flush_interval` seconds or `max_batch` rows and written with a single commit
+    from a background thread. Subclasses implement _write_batch(rows). Call flush()
+    whenever the rows must be visible in the database; close() flushes and stops
+    the thread and is also run at interpreter exit.
+
+    A failed batch is retried with the next window, up to `max_retries` times; then
+    its rows are written one by one and those that still fail (e.g. a message whose
+    conversation was deleted) are dropped, so one bad row can't block the rest.
+    """
+
+    def __init__(self, flush_interval, max_batch, name="batch-writer", max_retries=MESSAGE_FLUSH_MAX_RETRIES):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self._failures = 0 # Consecutive failed commits of the pending rows
+        self._pending = []
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock() # Held for the whole drain+commit, so flush() waits for in-flight batches
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _queue(self, row):
+        """Queues a row for the next group commit; writes it directly if the writer is shut down."""
+        with self._cond:
+            if not self._closed:
+                self._pending.append(row)
+                self._cond.notify()
+                return
+        self._write_batch([row])
+
+    def has_pending(self):
+        with self._cond:
+            return bool(self._pending)
+
+    def flush(self):
+        """Blocks until every message queued so far is committed."""
+        self._write_pending(raise_errors=True)
+
+    def close(self):
+        """Flushes outstanding messages and stops the background thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        self._write_pending()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                # First row of a new batch: keep collecting until the window closes or the batch is full
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            self._write_pending()
+
+    def _write_pending(self, raise_errors=False):
+        with self._commit_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    logger.error(f"Failed to write {len(batch)} buffered rows (attempt {self._failures}): {e}")
+                    # Put them back (in order) so the next window retries them
+                    with self._cond:
+                        self._pending[:0] = batch
+                else:
+                    self._failures = 0
+                    dropped = self._write_rows(batch)
+                    logger.error(f"Dropped {dropped} of {len(batch)} buffered rows after {self.max_retries} failed attempts: {e}")
+                if raise_errors:
+                    raise
+
+    def _write_rows(self, rows):
+        """Writes rows one at a time, skipping those that fail. Returns how many were skipped."""
+        dropped = 0
+        for row in rows:
+            try:
+                self._write_batch([row])
+            except Exception as e:
+                logger.error(f"Dropped buffered row: {e}")
+                dropped += 1
+        return dropped
+
+class MessageWriter(BatchWriter):
+    """
+    Group commit for conversation messages: one transaction per window instead of
+    one per chat line. Call flush() before reading history or closing a ticket.
+    """
+
+    def __init__(self, flush_interval=MESSAGE_FLUSH_INTERVAL_MS / 1000, max_batch=MESSAGE_FLUSH_MAX_ROWS,
+                 max_retries=MESSAGE_FLUSH_MAX_RETRIES):
+        super().__init__(flush_interval, max_batch, name="message-writer", max_retries=max_retries)
+
+    def add(self, conversation_id, role, content):
+        """Queues a message for the next group commit."""
+        self._queue((conversation_id, role, content))
+
+    def _write_batch(self, rows):
+        db.add_messages(rows)
@@ -0,0 +1,264 @@
+"""
+Parsing and validation of AgentBrain model output.
+
+The model is asked for one JSON object (thought_process, reply, actions,
+execute_now, ...). parse_model_output() turns raw text into that object: a plain
+json.loads fast path, then a scan for the first complete object that looks like
+model output (so prose and ``` fences around it, or braces inside strings, don't
+matter), then a repair pass for the usual slips (trailing commas, raw newlines in
+strings, Python literals, output truncated mid-object). validate_output()
+coerces the fields to their expected types.
+
+Actions stay plain strings in the returned dict (they are shown to users and kept in
+pending plans); parse_actions() turns them into typed objects for execution.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from src.agent.streaming import ReplyStreamParser
+
+_DECODER = json.JSONDecoder()
+_FENCE_LINE = re.compile(r"^\s*```[a-zA-Z]*\s*$", re.MULTILINE)
+_OUTPUT_KEYS = {"reply", "actions", "thought_process", "plan_summary", "execute_now"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# --- Typed actions ---
+
+@dataclass(frozen=True)
+class ProposeTicket:
+    title: str = "Untitled"
+    urgency: str = "Normal"
+    description: str = "No description"
+    raw: str = ""
+
+@dataclass(frozen=True)
+class CloseTicket:
+    raw: str = "close_ticket"
+
+@dataclass(frozen=True)
+class Remember:
+    content: Union[str, dict] = ""
+    raw: str = ""
+
+@dataclass(frozen=True)
+class RunScript:
+    name: str = ""
+    args: List[str] = field(default_factory=list)
+    raw: str = ""
+
+Action = Union[ProposeTicket, CloseTicket, Remember, RunScript]
+
+def parse_action(action) -> Optional[Action]:
+    """Parses one action (a "name arg..." string, or a {"type": ...} object) into a typed action."""
+    if isinstance(action, dict):
+        action = action_to_string(action)
+    action = str(action).strip()
+    if not action:
+        return None
+
+    name = action.split(maxsplit=1)[0].split("|")[0].strip().lower()
+    if name == "propose_ticket":
+        # propose_ticket | <Title> | <Urgency> | <Description> (the description may itself contain '|')
+        parts = [p.strip() for p in action.split("|", 3)]
+        return ProposeTicket(
+            title=parts[1] if len(parts) > 1 and parts[1] else "Untitled",
+            urgency=parts[2] if len(parts) > 2 and parts[2] else "Normal",
+            description=parts[3] if len(parts) > 3 and parts[3] else "No description",
+            raw=action
+        )
+    if name == "close_ticket":
+        return CloseTicket(raw=action)
+    if name == "remember":
+        content = action[len("remember"):].strip()
+        if content.startswith("{"):
+            try:
+                content = json.loads(content)
+            except ValueError:
+                pass
+        return Remember(content=content, raw=action)
+
+    parts = action.split()
+    return RunScript(name=parts[0], args=parts[1:], raw=action)
+
+def parse_actions(actions) -> List[Action]:
+    parsed = (parse_action(a) for a in (actions or []))
+    return [a for a in parsed if a is not None]
+
+def action_to_string(action):
+    """Canonical string form of an action given as an object, e.g. {"type": "close_ticket"}."""
+    kind = str(action.get("type") or action.get("action") or action.get("name") or "").strip()
+    if kind == "propose_ticket":
+        return " | ".join([kind] + [str(action.get(k, "")) for k in ("title", "urgency", "description")])
+    if kind == "remember":
+        content = action.get("content", "")
+        return f"remember {json.dumps(content) if isinstance(content, dict) else content}"
+    args = action.get("args") or []
+    if isinstance(args, str):
+        args = [args]
+    return " ".join([kind] + [str(a) for a in args]).strip()
+
+# --- Extraction ---
+
+def _looks_like_output(obj):
+    return isinstance(obj, dict) and bool(_OUTPUT_KEYS & obj.keys())
+
+def repair_json(text):
+    """
+    Best-effort fix of a malformed/truncated JSON object: drops code fences, trailing
+    commas and a dangling incomplete member, escapes raw newlines inside strings,
+    converts Python literals and closes whatever is still open. Stops after the first
+    top-level object, ignoring any trailing prose.
+    """
+    text = _FENCE_LINE.sub("", text)
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    safe = None # (len(out), stack) just before the last top-level-or-nested comma
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            i += 1
+            continue
+        elif ch == ",":
+            safe = (len(out), list(stack))
+        elif ch.isalpha():
+            word = re.match(r"[A-Za-z]+", text[i:]).group(0)
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+
+    if not stack:
+        return "".join(out)
+
+    # Truncated: close what's open, or cut back to the last complete member
+    if in_string:
+        out.append('"')
+    candidate = "".join(out).rstrip().rstrip(",:") + "".join(reversed(stack))
+    try:
+        json.loads(candidate)
+        return candidate
+    except ValueError:
+        if safe is None:
+            return candidate
+        cut, open_stack = safe
+        return "".join(out[:cut]) + "".join(reversed(open_stack))
+
+def parse_model_output(text):
+    """Extracts the model's JSON object from raw text. Returns a dict, or None."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        obj = json.loads(text)
+        if isinstance(obj, dict):
+            return obj
+        if isinstance(obj, list) and len(obj) == 1 and isinstance(obj[0], dict):
+            return obj[0]
+    except ValueError:
+        pass
+
+    # First complete object that looks like model output (skips prose, fences, nested action objects)
+    index = text.find("{")
+    while index != -1:
+        try:
+            obj, _ = _DECODER.raw_decode(text, index)
+            if _looks_like_output(obj):
+                return obj
+        except ValueError:
+            pass
+        index = text.find("{", index + 1)
+
+    repaired = repair_json(text)
+    if repaired:
+        try:
+            obj = json.loads(repaired)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+    return None
+
+# --- Validation ---
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+def validate_output(obj):
+    """Coerces a parsed object to the expected shape (string reply, list of action strings, bool execute_now)."""
+    result = dict(obj)
+    for key in ("thought_process", "plan_summary", "reply"):
+        value = result.get(key)
+        result[key] = "" if value is None else (value if isinstance(value, str) else json.dumps(value))
+
+    actions = result.get("actions") or []
+    if not isinstance(actions, list):
+        actions = [actions]
+    result["actions"] = [action_to_string(a) if isinstance(a, dict) else str(a).strip() for a in actions]
+    result["actions"] = [a for a in result["actions"] if a]
+    result["execute_now"] = _as_bool(result.get("execute_now", False))
+    return result
+
+class OutputStreamParser:
+    """
+    Incremental parser for streamed output: feed() chunks as they arrive (the
+    partial `reply` is available meanwhile), then result() for the validated object.
+    """
+
+    def __init__(self):
+        self._reply = ReplyStreamParser()
+        self._parts = []
+
+    @property
+    def reply(self):
+        return self._reply.reply
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def feed(self, chunk):
+        """Returns True if the partial reply grew."""
+        self._parts.append(chunk)
+        return self._reply.feed(chunk)
+
+    def result(self):
+        obj = parse_model_output(self.text)
+        return validate_output(obj) if obj is not None else None
@@ -0,0 +1,37 @@
+import logging
+
+from src.agent.output_parser import parse_action, Remember, RunScript
+
+logger = logging.getLogger("PLAN_EXECUTOR")
+
+async def execute_plan(actions, save_memory, run_script, send):
+    """
+    Runs the actions of an approved plan in order (bad_bot: ✅ reaction or batch approval).
+    `remember` goes to `await save_memory(content)`, scripts to `await run_script(name, args)`;
+    ticket actions (propose/close) belong to the ticket bot and are skipped. Progress is
+    reported through `await send(text)`. Returns the script results.
+    """
+    results = []
+    for action_str in actions:
+        logger.debug(f"Processing pending action: {action_str}")
+        action = parse_action(action_str)
+
+        # Internal actions like 'remember'
+        if isinstance(action, Remember):
+            logger.debug(f"Executing 'remember' with content: {str(action.content)[:50]}...")
+            if await save_memory(action.content):
+                await send("✅ I have updated my long-term memory.")
+            else:
+                logger.error("save_memory failed")
+                await send("❌ Failed to save memory.")
+            continue
+
+        if not isinstance(action, RunScript):
+            continue
+
+        logger.debug(f"Running script action '{action.name}' with args: {action.args}")
+        await send(f"🔄 Running **{action.name}** with args: {action.args}...")
+        res = await run_script(action.name, action.args)
+        results.append(res)
+        await send(res)
+    return results
@@ -0,0 +1,136 @@
+"""
+Response cache in front of AgentBrain.think.
+
+Identical prompts (same mode, same compiled system prefix - which covers pinned memory
+and the action list - and the same whitespace/case-normalised dynamic part) get the
+same answer for LLM_CACHE_TTL seconds instead of a fresh paid Gemini call. Concurrent
+identical calls are coalesced: one goes upstream, the others await its result.
+
+Entries live in an in-process LRU (LLM_CACHE_MAX_ENTRIES); with LLM_CACHE_PERSIST=1
+they are also written to the llm_response_cache table so they survive restarts.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from src import db_async
+
+logger = logging.getLogger("RESPONSE_CACHE")
+
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '300'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '256'))
+LLM_CACHE_PERSIST = os.getenv('LLM_CACHE_PERSIST', '0') == '1'
+
+class ResponseCache:
+    def __init__(self, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES, persist=LLM_CACHE_PERSIST, clock=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self._clock = clock
+        self._entries = OrderedDict() # key -> (expires_at, response), least recently used first
+        self._inflight = {} # key -> Future of the upstream call other callers can share
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(mode, prefix_digest, prompt):
+        normalised = " ".join(prompt.split()).lower()
+        return hashlib.sha256(f"{mode}\0{prefix_digest}\0{normalised}".encode("utf-8")).hexdigest()
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_local(self, key, response, expires_at):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_persisted(self, key):
+        try:
+            stored = await db_async.get_cached_response(key, self._clock())
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+        if stored is None:
+            return None
+        response, expires_at = json.loads(stored[0]), stored[1]
+        self._put_local(key, response, expires_at)
+        return response
+
+    async def _put_persisted(self, key, response, expires_at):
+        try:
+            await db_async.put_cached_response(key, json.dumps(response), expires_at)
+            self._puts += 1
+            if self._puts % 100 == 0:
+                await db_async.prune_response_cache(self._clock())
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns the cached response for `key`, or awaits compute() (once, even for
+        concurrent callers) and caches its result. Exceptions are not cached.
+        """
+        response = self._get_local(key)
+        if response is not None:
+            self.hits += 1
+            return copy.deepcopy(response)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            response = await asyncio.shield(pending)
+            if response is not None:
+                self.coalesced += 1
+                return copy.deepcopy(response)
+            # The shared call failed: make our own attempt below
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight.setdefault(key, future)
+        try:
+            if self.persist:
+                response = await self._get_persisted(key)
+                if response is not None:
+                    self.hits += 1
+                    future.set_result(response)
+                    return copy.deepcopy(response)
+
+            self.misses += 1
+            response = await compute()
+            expires_at = self._clock() + self.ttl
+            self._put_local(key, response, expires_at)
+            future.set_result(response)
+            if self.persist:
+                await self._put_persisted(key, response, expires_at)
+            return copy.deepcopy(response)
+        finally:
+            if not future.done():
+                future.set_result(None) # Waiters fall back to their own call
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
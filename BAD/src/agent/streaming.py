@@ -0,0 +1,88 @@
+import json
+
+class ReplyStreamParser:
+    """
+    Incrementally extracts one top-level string field (default "reply") from a JSON
+    object that arrives in chunks, so the reply can be shown while the rest of the
+    object (thought_process, actions, ...) is still being generated.
+
+        parser = ReplyStreamParser()
+        for chunk in chunks:
+            if parser.feed(chunk):
+                show(parser.reply)
+    """
+
+    def __init__(self, field="reply"):
+        self.field = field
+        self.done = False # The field's closing quote was seen
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = "" # Partial escape sequence, e.g. "\\u00" split across chunks
+        self._expect_key = False
+        self._key_chars = None # Collecting a top-level key
+        self._key = None
+        self._capturing = False
+
+    @property
+    def reply(self):
+        return "".join(self._parts)
+
+    def feed(self, text):
+        """Consumes a chunk; returns True if the extracted value grew."""
+        changed = False
+        for ch in text:
+            if self._in_string:
+                if self._escape:
+                    self._escape += ch
+                    if self._escape[1] == 'u' and len(self._escape) < 6:
+                        continue
+                    ch, self._escape = self._decode_escape(self._escape), ""
+                elif ch == '\\':
+                    self._escape = ch
+                    continue
+                elif ch == '"':
+                    self._end_string()
+                    continue
+
+                if self._key_chars is not None:
+                    self._key_chars.append(ch)
+                elif self._capturing:
+                    self._parts.append(ch)
+                    changed = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_chars = []
+                elif self._depth == 1 and self._key == self.field and not self.done:
+                    self._capturing = True
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '{' and self._depth == 1:
+                    self._expect_key = True
+            elif ch in '}]':
+                self._depth -= 1
+            elif self._depth == 1 and ch == ':':
+                self._expect_key = False
+            elif self._depth == 1 and ch == ',':
+                self._expect_key = True
+                self._key = None
+        return changed
+
+    def _end_string(self):
+        self._in_string = False
+        if self._key_chars is not None:
+            self._key = "".join(self._key_chars)
+            self._key_chars = None
+        elif self._capturing:
+            self._capturing = False
+            self.done = True
+
+    @staticmethod
+    def _decode_escape(sequence):
+        try:
+            return json.loads(f'"{sequence}"')
+        except ValueError:
+            return ""
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+from src import db, db_async
+
+logger = logging.getLogger("SUMMARIZER")
+
+# Once more than SUMMARY_TRIGGER_MESSAGES messages follow the summary, all but the
+# last SUMMARY_KEEP_RECENT are folded into it. The trigger must stay below the hot
+# cache's history size (HOT_CACHE_HISTORY_LINES) so the raw tail is served from memory.
+SUMMARY_TRIGGER_MESSAGES = int(os.getenv('SUMMARY_TRIGGER_MESSAGES', '30'))
+SUMMARY_KEEP_RECENT = int(os.getenv('SUMMARY_KEEP_RECENT', '10'))
+SUMMARY_MAX_CHARS = int(os.getenv('SUMMARY_MAX_CHARS', '1500'))
+
+class ConversationSummarizer:
+    """
+    Keeps the prompt for long conversations bounded with a rolling summary.
+
+    Older messages are compressed by the brain into a summary stored in the
+    conversation_summaries table; ConversationManager.get_history() then returns
+    that summary followed by the messages newer than it. Summarizing happens in the
+    background after a reply has been sent, so it never delays a turn.
+    """
+
+    def __init__(self, brain, conversation_manager, trigger=SUMMARY_TRIGGER_MESSAGES, keep_recent=SUMMARY_KEEP_RECENT):
+        self.brain = brain
+        self.conversation_manager = conversation_manager
+        self.trigger = trigger
+        self.keep_recent = keep_recent
+        self._running = set() # channel_ids being summarized right now
+        self._tasks = set()
+
+    def schedule(self, channel_id):
+        """Starts a background summary pass for the channel (no-op if one is running)."""
+        if channel_id in self._running:
+            return
+        task = asyncio.create_task(self.maybe_summarize(channel_id))
+        self._tasks.add(task) # Keep a reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+
+    def _needs_summary(self, channel_id):
+        # Cheap check first: the cached tail holds exactly the messages since the summary
+        cached = db.hot_cache().get_history(channel_id)
+        return not (cached and cached[1] and len(cached[0]) <= self.trigger)
+
+    async def maybe_summarize(self, channel_id):
+        """Folds older messages into the summary if the conversation is past the trigger. Returns True if it did."""
+        if not self.brain or channel_id in self._running or not self._needs_summary(channel_id):
+            return False
+
+        self._running.add(channel_id)
+        try:
+            await db_async.run_write(self.conversation_manager.flush)
+            conversation = await db_async.get_active_conversation(channel_id)
+            if not conversation:
+                return False
+
+            # Messages after the current summary, oldest first
+            pending = await db_async.get_conversation_history(
+                conversation['id'], limit=None, after_id=conversation.get('summary_until') or 0
+            )
+            if len(pending) <= self.trigger:
+                return False
+            to_fold = pending[:-self.keep_recent] if self.keep_recent else pending
+
+            lines = [self.conversation_manager.format_line(m['role'], m['content']) for m in to_fold]
+            summary = await self.brain.summarize(conversation.get('summary'), lines, max_chars=SUMMARY_MAX_CHARS)
+            if not summary:
+                return False
+
+            await db_async.save_conversation_summary(conversation['id'], summary, to_fold[-1]['id'])
+            logger.info(f"Summarized {len(to_fold)} messages of conversation {conversation['id']} ({len(summary)} chars)")
+            return True
+        except Exception as e:
+            logger.error(f"Summarizing conversation in {channel_id} failed: {e}")
+            return False
+        finally:
+            self._running.discard(channel_id)
@@ -0,0 +1,91 @@
+"""
+Token/cost ledger of LLM calls.
+
+LLMClient reports every call (tokens, latency, retries, outcome) to a
+UsageRecorder, which writes them to the llm_usage table in group commits (see
+BatchWriter), so logging never adds a transaction to the request path. A small
+in-memory window of recent calls backs the live numbers on the Manager
+dashboard; `!cost` reads the persisted aggregates.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from src import db
+from src.agent.message_writer import BatchWriter
+
+logger = logging.getLogger("USAGE_RECORDER")
+
+USAGE_FLUSH_INTERVAL_MS = int(os.getenv('USAGE_FLUSH_INTERVAL_MS', '2000'))
+USAGE_FLUSH_MAX_ROWS = int(os.getenv('USAGE_FLUSH_MAX_ROWS', '200'))
+# USD per 1M tokens (Gemini Flash list prices; override when switching models)
+LLM_PRICE_INPUT_PER_M = float(os.getenv('LLM_PRICE_INPUT_PER_M', '0.35'))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv('LLM_PRICE_OUTPUT_PER_M', '1.05'))
+USAGE_RECENT_WINDOW = int(os.getenv('USAGE_RECENT_WINDOW', '1000'))
+
+def estimate_cost(prompt_tokens, output_tokens):
+    """Estimated USD cost of one call."""
+    return (prompt_tokens or 0) / 1_000_000 * LLM_PRICE_INPUT_PER_M + (output_tokens or 0) / 1_000_000 * LLM_PRICE_OUTPUT_PER_M
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+class UsageRecorder(BatchWriter):
+    def __init__(self, flush_interval=USAGE_FLUSH_INTERVAL_MS / 1000, max_batch=USAGE_FLUSH_MAX_ROWS,
+                 recent_window=USAGE_RECENT_WINDOW, clock=time.time):
+        super().__init__(flush_interval, max_batch, name="usage-writer")
+        self._clock = clock
+        self._recent = deque(maxlen=recent_window) # Recent rows, for live dashboard numbers
+        self._recent_lock = threading.Lock()
+
+    def record(self, channel_id=None, mode=None, model=None, status="ok", prompt_tokens=0, output_tokens=0,
+               cached_tokens=0, latency_ms=None, queued_ms=None, retries=0):
+        """Queues one call's usage for the next batch. Never blocks on the database."""
+        row = {
+            "created_at": self._clock(),
+            "channel_id": str(channel_id) if channel_id is not None else None,
+            "mode": mode,
+            "model": model,
+            "status": status,
+            "prompt_tokens": prompt_tokens or 0,
+            "output_tokens": output_tokens or 0,
+            "cached_tokens": cached_tokens or 0,
+            "latency_ms": latency_ms,
+            "queued_ms": queued_ms,
+            "retries": retries,
+            "cost": estimate_cost(prompt_tokens, output_tokens)
+        }
+        with self._recent_lock:
+            self._recent.append(row)
+        self._queue(row)
+        return row
+
+    def _write_batch(self, rows):
+        try:
+            db.add_llm_usage(rows)
+        except Exception as e:
+            # Telemetry: drop the batch rather than letting rows pile up behind a broken database
+            logger.warning(f"Dropped {len(rows)} LLM usage rows: {e}")
+
+    def recent_stats(self, window=3600):
+        """Live numbers over the last `window` seconds (this process only): calls, p50/p95 latency, cost and run rates."""
+        since = self._clock() - window
+        with self._recent_lock:
+            rows = [r for r in self._recent if r["created_at"] >= since]
+        latencies = sorted(r["latency_ms"] for r in rows if r["status"] == "ok" and r["latency_ms"] is not None)
+        cost = sum(r["cost"] for r in rows)
+        ok = [r for r in rows if r["status"] == "ok"]
+        return {
+            "calls": len(rows),
+            "errors": len(rows) - len(ok),
+            "p50_latency_ms": _percentile(latencies, 0.50),
+            "p95_latency_ms": _percentile(latencies, 0.95),
+            "tokens_per_turn": sum(r["prompt_tokens"] + r["output_tokens"] for r in ok) / len(ok) if ok else None,
+            "cost": cost,
+            "daily_run_rate": cost * 86400 / window,
+            "monthly_run_rate": cost * 86400 * 30 / window
+        }
@@ -0,0 +1,44 @@
+"""
+Search indexing of archived ticket transcripts (data/archives/**/transcript.jsonl*, see src/transcript.py).
+
+The archiver indexes each transcript when it writes it; reindex_archives backfills
+archives written before the index existed (scripts/reindex_archives.py).
+"""
+import os
+
+from src import db
+from src.transcript import find_archives, open_transcript
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_ROOT = os.path.join(PROJECT_ROOT, 'data', 'archives')
+
+def message_text(msg):
+    """The searchable line of a message ("author: content files"), or None."""
+    content = (msg.get("content") or "").strip()
+    files = " ".join(a["filename"] for a in msg.get("attachments") or [] if a.get("filename"))
+    if content or files:
+        return f"{msg.get('author_name', '')}: {' '.join(filter(None, (content, files)))}"
+    return None
+
+def transcript_text(transcript):
+    """The searchable text of a transcript (an open transcript or a transcript dict): one line per message."""
+    messages = transcript.get("messages", []) if isinstance(transcript, dict) else transcript
+    return "\n".join(filter(None, map(message_text, messages)))
+
+def index_transcript(ticket_id, transcript):
+    db.index_archive_transcript(ticket_id, transcript_text(transcript))
+
+def reindex_archives(root=ARCHIVE_ROOT):
+    """Indexes every archived transcript under `root`. Returns (indexed, skipped)."""
+    indexed = skipped = 0
+    for archive_dir in find_archives(root):
+        try:
+            with open_transcript(archive_dir) as transcript:
+                ticket_id = int(transcript.meta.get("ticket_id"))
+                index_transcript(ticket_id, transcript)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"⚠️ Skipping {archive_dir}: {e}")
+            skipped += 1
+            continue
+        indexed += 1
+    return indexed, skipped
@@ -0,0 +1,135 @@
+"""
+Append-only, checkpointed message log of an archive (messages.jsonl in its directory).
+
+archive_ticket fetches a channel's history after the last archived message and commits
+it here in batches of ARCHIVE_CHECKPOINT_EVERY messages: the lines are appended and
+fsynced, then the checkpoint (last message id, message count, log size) is saved in
+archive_checkpoints. An interrupted run (crash, rate limit, restart) resumes from the
+last committed batch, and archiving a channel again - a snapshot while the ticket is
+open, then on close, then for retention - only fetches the messages posted since.
+Lines written after the checkpoint by a run that died before saving it are truncated
+away on resume, so no message is logged twice.
+
+Each batch adds references to the attachment blobs it uses before it is written, so
+blob gc never collects a blob named in the log, however long the archive takes.
+
+open(), adopt() and append() do everything in one call. The archiver instead runs
+the file work (load(), adopted(), write()) in a worker thread and only the database
+steps (checkpoint(), add_refs()) on the DB writer, so an fsync or a rewritten legacy
+transcript never holds up the bots' other writes.
+
+Messages are kept as first archived: later edits and deletions are not picked up.
+"""
+import json
+import os
+
+from src import db
+from src.transcript import open_transcript
+
+ARCHIVE_CHECKPOINT_EVERY = int(os.getenv('ARCHIVE_CHECKPOINT_EVERY', '100'))
+LOG_NAME = "messages.jsonl"
+
+class ArchiveLog:
+    def __init__(self, channel_id, ticket_id, archive_dir, last_message_id=None, message_count=0, size=0):
+        self.channel_id = channel_id
+        self.ticket_id = ticket_id
+        self.archive_dir = archive_dir
+        self.last_message_id = last_message_id
+        self.message_count = message_count
+        self.size = size
+
+    @property
+    def path(self):
+        return os.path.join(self.archive_dir, LOG_NAME)
+
+    @classmethod
+    def open(cls, channel_id, ticket_id, archive_dir):
+        """Resumes the channel's log where its checkpoint left off, or starts a new one in `archive_dir`."""
+        log = cls.load(channel_id, ticket_id, archive_dir, db.get_archive_checkpoint(channel_id))
+        log.checkpoint()
+        return log
+
+    @classmethod
+    def load(cls, channel_id, ticket_id, archive_dir, checkpoint):
+        """File side of open(): the log resumed from `checkpoint` (a row or None). Checkpoint it afterwards."""
+        if checkpoint and os.path.exists(os.path.join(checkpoint['archive_path'], LOG_NAME)):
+            last_message_id = checkpoint['last_message_id']
+            log = cls(channel_id, checkpoint['ticket_id'], checkpoint['archive_path'],
+                      int(last_message_id) if last_message_id else None, checkpoint['message_count'], checkpoint['log_size'])
+            if os.path.getsize(log.path) > log.size:
+                with open(log.path, 'r+b') as f:
+                    f.truncate(log.size)
+            return log
+
+        os.makedirs(archive_dir, exist_ok=True)
+        log = cls(channel_id, ticket_id, archive_dir)
+        open(log.path, 'wb').close()
+        return log
+
+    @classmethod
+    def adopt(cls, channel_id, ticket_id, archive_dir, after_message_id):
+        """
+        Continues an archive in another channel (a restored ticket): archiving `channel_id`
+        appends to this archive's log, starting after `after_message_id`. An archive
+        written before the log existed gets one from its transcript.
+        """
+        log = cls.adopted(channel_id, ticket_id, archive_dir, after_message_id)
+        log.checkpoint()
+        return log
+
+    @classmethod
+    def adopted(cls, channel_id, ticket_id, archive_dir, after_message_id):
+        """File side of adopt(). Checkpoint the returned log afterwards."""
+        log = cls(channel_id, ticket_id, archive_dir)
+        if not os.path.exists(log.path):
+            with open_transcript(archive_dir) as transcript, open(log.path, 'wb') as f:
+                for msg in transcript:
+                    f.write(_encode([msg]))
+        with open(log.path, 'rb') as f:
+            log.message_count = sum(1 for line in f if line.strip())
+        log.size = os.path.getsize(log.path)
+        log.last_message_id = after_message_id
+        return log
+
+    def checkpoint(self):
+        db.save_archive_checkpoint(self.channel_id, self.ticket_id, self.archive_dir,
+                                   self.last_message_id, self.message_count, self.size)
+
+    def add_refs(self, messages):
+        """References the blobs a batch uses (before writing it)."""
+        hashes = {att["sha256"] for msg in messages for att in msg.get("attachments") or [] if att.get("sha256")}
+        if hashes:
+            db.add_archive_blob_refs(self.archive_dir, sorted(hashes))
+
+    def append(self, messages):
+        """Commits a batch of messages (oldest first): add_refs(), write(), then checkpoint()."""
+        if not messages:
+            return
+        self.add_refs(messages)
+        self.write(messages)
+        self.checkpoint()
+
+    def write(self, messages):
+        """Appends and fsyncs a batch, advancing past it; committed once checkpoint() saves that."""
+        data = _encode(messages)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size += len(data)
+        self.message_count += len(messages)
+        self.last_message_id = messages[-1]["id"]
+
+    def messages(self):
+        """Iterates the committed messages, oldest first."""
+        with open(self.path, 'rb') as f:
+            remaining = self.size
+            for line in f:
+                remaining -= len(line)
+                if remaining < 0:
+                    break
+                if line.strip():
+                    yield json.loads(line)
+
+def _encode(messages):
+    return "".join(json.dumps(msg, ensure_ascii=False) + "\n" for msg in messages).encode('utf-8')
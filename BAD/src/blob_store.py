@@ -0,0 +1,175 @@
+"""
+Content-addressed store for archived attachments: data/archives/blobs/<aa>/<sha256>.
+
+A file re-posted across tickets (or archived again after a restore) is stored once.
+Transcripts reference attachments by `sha256`; their `local_path` points at the blob
+relative to the transcript, so the HTML viewer and older readers keep working.
+
+Reference counts live in SQLite (archive_blobs.refs, maintained by triggers on
+archive_blob_refs, one row per transcript directory and blob). gc() deletes blobs
+whose count has dropped to zero, after a grace period that protects blobs of an
+archive still being written. Archives in progress reference their blobs batch by
+batch (ArchiveLog.append), so a run resumed after the grace period keeps them. scripts/gc_blobs.py runs it and moves attachments of
+archives written before the store into it.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from src import db
+from src.archive_index import ARCHIVE_ROOT
+from src.archive_log import LOG_NAME
+from src.transcript import LEGACY_NAME, find_archives, find_transcript, open_transcript
+
+BLOB_ROOT = os.path.join(ARCHIVE_ROOT, 'blobs')
+BLOB_GC_GRACE_S = int(os.getenv('BLOB_GC_GRACE_S', '86400'))
+_HASH_CHUNK = 1024 * 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BlobStore:
+    def __init__(self, root=BLOB_ROOT):
+        self.root = root
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def incoming_path(self):
+        """A fresh temporary path on the store's filesystem (so put_file is a rename)."""
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        return os.path.join(self.root, "tmp", uuid.uuid4().hex)
+
+    def put_file(self, src_path):
+        """Moves a file into the store (dropping it if the content is already there). Returns (sha256, size)."""
+        sha256, size = file_sha256(src_path), os.path.getsize(src_path)
+        db.add_archive_blob(sha256, size) # First, so gc() leaves an existing copy alone
+        dest = self.path(sha256)
+        if os.path.exists(dest):
+            os.remove(src_path)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(src_path, dest)
+        return sha256, size
+
+    def attachment_entry(self, archive_dir, sha256, size, filename, original_url):
+        """The transcript entry of a stored attachment."""
+        return {
+            "original_url": original_url,
+            "filename": filename,
+            "sha256": sha256,
+            "size": size,
+            "local_path": os.path.relpath(self.path(sha256), archive_dir).replace(os.sep, "/"),
+        }
+
+    def resolve(self, archive_dir, attachment):
+        """Absolute path of a transcript attachment (blob or pre-store file), or None if it has no file."""
+        if attachment.get("sha256"):
+            return self.path(attachment["sha256"])
+        if attachment.get("local_path"):
+            return os.path.join(archive_dir, attachment["local_path"])
+        return None
+
+    def set_refs(self, archive_dir, messages):
+        """Records which blobs a transcript's messages use (replacing what it used before)."""
+        hashes = {att["sha256"] for msg in messages for att in msg.get("attachments") or [] if att.get("sha256")}
+        db.set_archive_blob_refs(archive_dir, sorted(hashes))
+        return hashes
+
+    def gc(self, grace=BLOB_GC_GRACE_S, dry_run=False):
+        """
+        Drops references of archives that no longer exist, then deletes blobs nothing
+        references (and stray files: unregistered blobs, abandoned downloads) older than
+        `grace` seconds. Returns (blobs removed, bytes freed).
+        """
+        cutoff = time.time() - grace
+        for archive_dir in db.get_archive_blob_ref_paths():
+            gone = not find_transcript(archive_dir) and not os.path.exists(os.path.join(archive_dir, LOG_NAME))
+            if gone and not dry_run:
+                db.set_archive_blob_refs(archive_dir, [])
+
+        removed = freed = 0
+        for row in db.get_unreferenced_blobs(cutoff):
+            if dry_run or db.delete_archive_blob(row['sha256'], cutoff): # Skips blobs re-used meanwhile
+                if not dry_run and os.path.exists(self.path(row['sha256'])):
+                    os.remove(self.path(row['sha256']))
+                removed += 1
+                freed += row['size']
+
+        known = None
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_mtime >= cutoff:
+                    continue
+                if os.path.basename(dirpath) != "tmp":
+                    known = known if known is not None else db.get_archive_blob_hashes()
+                    if name in known:
+                        continue
+                if not dry_run:
+                    os.remove(path)
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+    def migrate_archive(self, archive_dir):
+        """
+        Moves the attachments of a transcript written before the store into it and
+        rewrites the transcript to reference them by hash. Returns the number moved.
+        """
+        json_path = os.path.join(archive_dir, LEGACY_NAME)
+        if find_transcript(archive_dir) != json_path:
+            # Written by the current archiver: attachments are in the store already
+            with open_transcript(archive_dir) as transcript:
+                self.set_refs(archive_dir, transcript)
+            return 0
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            transcript = json.load(f)
+
+        moved = 0
+        for msg in transcript.get("messages", []):
+            for i, att in enumerate(msg.get("attachments") or []):
+                path = self.resolve(archive_dir, att)
+                if att.get("sha256") or not path or not os.path.exists(path):
+                    continue
+                sha256, size = self.put_file(path)
+                msg["attachments"][i] = self.attachment_entry(archive_dir, sha256, size, att.get("filename"), att.get("original_url"))
+                moved += 1
+
+        if moved:
+            tmp_path = json_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(transcript, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, json_path)
+        self.set_refs(archive_dir, transcript.get("messages", []))
+        attachments_dir = os.path.join(archive_dir, "attachments")
+        if os.path.isdir(attachments_dir) and not os.listdir(attachments_dir):
+            os.rmdir(attachments_dir)
+        return moved
+
+    def migrate_archives(self, root=ARCHIVE_ROOT):
+        """
+        Runs migrate_archive over every transcript under `root`, which also rebuilds the
+        references of each. Returns (attachments moved, transcripts skipped).
+        """
+        moved = skipped = 0
+        for archive_dir in find_archives(root):
+            try:
+                moved += self.migrate_archive(archive_dir)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {archive_dir}: {e}")
+                skipped += 1
+        return moved, skipped
+
+store = BlobStore()
@@ -47,6 +47,32 @@ except ImportError as e:
 
 # Conversational History
 history = deque(maxlen=20)
+# Rolling summary of entries folded out of `history` (action outputs make entries large)
+history_summary = None
+ARCHITECT_SUMMARY_TRIGGER = int(os.getenv('ARCHITECT_SUMMARY_TRIGGER', '12'))
+ARCHITECT_SUMMARY_KEEP_RECENT = int(os.getenv('ARCHITECT_SUMMARY_KEEP_RECENT', '6'))
+
+def prompt_history():
+    """History as sent to the brain: the rolling summary, then the recent raw entries."""
+    if history_summary:
+        return [f"Summary of earlier conversation: {history_summary}"] + list(history)
+    return list(history)
+
+async def compact_history():
+    """Folds the oldest history entries into history_summary once the deque gets long."""
+    global history_summary
+    if not brain or len(history) < ARCHITECT_SUMMARY_TRIGGER:
+        return
+    # Copied, not removed: on failure the raw entries simply stay
+    old_entries = list(history)[:len(history) - ARCHITECT_SUMMARY_KEEP_RECENT]
+    summary = await brain.summarize(history_summary, old_entries)
+    if not summary:
+        return
+    history_summary = summary
+    for entry in old_entries:
+        # Entries appended meanwhile may already have pushed some out (maxlen)
+        if history and history[0] is entry:
+            history.popleft()
 
 
 
@@ -307,8 +333,9 @@ async def on_message(message):
                 thought = await brain.think(
                     user_message=message.content if turn == 0 else "System: Actions completed. Proceed.", 
                     available_actions=ARCHITECT_TOOLS,
-                    history=list(history),
-                    mode="architect"
+                    history=prompt_history(),
+                    mode="architect",
+                    channel_id=message.channel.id
                 )
                 
                 # Debug
@@ -355,6 +382,7 @@ async def on_message(message):
                             await message.channel.send(reply)
                         
                         history.append(f"Planner: {reply}")
+                        asyncio.create_task(compact_history())
                     break
 
 if __name__ == "__main__":
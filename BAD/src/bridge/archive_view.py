@@ -1,9 +1,22 @@
+import asyncio
 import discord
-from discord.ext import commands
-from src import db
+from src import db, db_async
+from src.transcript_html import page_paths, zip_pages
 import os
 import math
 
+async def transcript_file(archive_dir, ticket_id):
+    """
+    The transcript of an archive as a discord.File (None if it has none). A long transcript
+    is split into pages that link to each other by name, so they are sent zipped together.
+    """
+    pages = page_paths(archive_dir)
+    if len(pages) == 1:
+        return discord.File(pages[0], filename=f"ticket-{ticket_id}-transcript.html")
+    if pages:
+        return discord.File(await asyncio.to_thread(zip_pages, archive_dir), filename=f"ticket-{ticket_id}-transcript.zip")
+    return None
+
 
 class SearchModal(discord.ui.Modal, title="🔍 Search Tickets"):
     query = discord.ui.TextInput(label="Search Query", placeholder="Title, User, or Description...", max_length=100)
@@ -34,6 +47,10 @@ class ArchiveDashboardView(discord.ui.View):
         
         self.items_per_page = 10
         self.total_pages = 1 # Will be updated
+        # Keyset paging: cursors of the first/last ticket shown, and how the next render seeks
+        self.first_cursor = None
+        self.last_cursor = None
+        self.seek = None # None (first page), ('after', cursor), ('before', cursor) or ('last', None)
         
         self.update_components()
 
@@ -50,22 +67,49 @@ class ArchiveDashboardView(discord.ui.View):
                  elif child.custom_id == "last_page":
                      child.disabled = (self.page >= self.total_pages - 1)
         
+    async def load_page(self, status_filter, user_filter):
+        """Fetches the page self.seek points at by keyset (no OFFSET); the total comes from the count cache."""
+        filters = dict(status=status_filter, user_id=user_filter, urgency=self.filter_urgency)
+        total_count = await db_async.count_tickets(**filters)
+        seek, self.seek = self.seek, None
+        total_pages = math.ceil(total_count / self.items_per_page) if total_count > 0 else 1
+
+        if seek and seek[0] == 'last' or self.page >= total_pages:
+            # Reverse seek from the end: the last page holds whatever the full pages leave over
+            self.page = total_pages - 1
+            remainder = total_count - self.page * self.items_per_page
+            tickets = await db_async.get_tickets_page(**filters, limit=remainder or self.items_per_page, sort_desc=self.sort_desc, last=True)
+        elif seek and self.page > 0:
+            tickets = await db_async.get_tickets_page(**filters, limit=self.items_per_page, sort_desc=self.sort_desc, **{seek[0]: seek[1]})
+            if not tickets: # Rows moved since the last render
+                self.page = 0
+        else:
+            self.page = 0
+            tickets = []
+        if not tickets and self.page == 0:
+            tickets = await db_async.get_tickets_page(**filters, limit=self.items_per_page, sort_desc=self.sort_desc)
+
+        self.first_cursor = db.encode_ticket_cursor(tickets[0]) if tickets else None
+        self.last_cursor = db.encode_ticket_cursor(tickets[-1]) if tickets else None
+        return tickets, total_count
+
     async def generate_embed(self, guild):
-        offset = self.page * self.items_per_page
-        
         # Determine filters
         status_filter = ['closed', 'archived'] if self.filter_status == 'all' else [self.filter_status]
         user_filter = None if self.show_all else self.user_id
         
-        tickets, total_count = db.get_tickets_with_filter(
-            status=status_filter,
-            user_id=user_filter,
-            limit=self.items_per_page,
-            offset=offset,
-            sort_desc=self.sort_desc,
-            search_query=self.search_query,
-            urgency=self.filter_urgency
-        )
+        if self.search_query:
+            # Ranked full-text search over tickets and archived transcripts
+            tickets, total_count = await db_async.search_tickets(
+                self.search_query,
+                status=status_filter,
+                user_id=user_filter,
+                urgency=self.filter_urgency,
+                limit=self.items_per_page,
+                offset=self.page * self.items_per_page
+            )
+        else:
+            tickets, total_count = await self.load_page(status_filter, user_filter)
         
         self.total_pages = math.ceil(total_count / self.items_per_page) if total_count > 0 else 1
         
@@ -77,7 +121,7 @@ class ArchiveDashboardView(discord.ui.View):
         
         msg_parts = []
         msg_parts.append(f"Viewing **{'All Tickets' if self.show_all else 'My Tickets'}**")
-        msg_parts.append(f"Sorted by **{'Newest' if self.sort_desc else 'Oldest'}**")
+        msg_parts.append(f"Sorted by **{'Relevance' if self.search_query else 'Newest' if self.sort_desc else 'Oldest'}**")
         
         filters = []
         if self.filter_status != 'all': filters.append(f"Status: {self.filter_status}")
@@ -96,16 +140,20 @@ class ArchiveDashboardView(discord.ui.View):
                 title = t.get('title') or "No Title"
                 status = t.get('status', 'closed')
                 urgency = t.get('urgency', '')
+                score = t.get('urgency_score') or 0
                 
                 emoji = "🔒" if status == 'archived' else "📁"
-                if urgency and ("High" in urgency or "Critical" in urgency):
+                if score >= db.URGENT_SCORE:
                     emoji = "🔴"
-                elif urgency and "Medium" in urgency:
+                elif score >= db.URGENCY_BANDS["Medium"][0]:
                     emoji = "🟡"
 
+                value = f"👤 {user_name} | 📅 {date_str}\nStatus: `{status}` | Urgency: `{urgency if urgency else 'None'}`"
+                if t.get('snippet'):
+                    value += f"\n🔎 {t['snippet'][:200]}"
                 embed.add_field(
                     name=f"{emoji} #{t['id']} {title[:40]}",
-                    value=f"👤 {user_name} | 📅 {date_str}\nStatus: `{status}` | Urgency: `{urgency if urgency else 'None'}`",
+                    value=value,
                     inline=False
                 )
         else:
@@ -126,6 +174,7 @@ class ArchiveDashboardView(discord.ui.View):
     async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.page > 0:
             self.page -= 1
+            self.seek = ('before', self.first_cursor)
             embed = await self.generate_embed(interaction.guild)
             self.update_components()
             await interaction.response.edit_message(embed=embed, view=self)
@@ -134,6 +183,7 @@ class ArchiveDashboardView(discord.ui.View):
     async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.page < self.total_pages - 1:
             self.page += 1
+            self.seek = ('after', self.last_cursor)
             embed = await self.generate_embed(interaction.guild)
             self.update_components()
             await interaction.response.edit_message(embed=embed, view=self)
@@ -142,6 +192,7 @@ class ArchiveDashboardView(discord.ui.View):
     async def last_conn_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if self.page < self.total_pages - 1:
             self.page = self.total_pages - 1
+            self.seek = ('last', None)
             embed = await self.generate_embed(interaction.guild)
             self.update_components()
             await interaction.response.edit_message(embed=embed, view=self)
@@ -186,7 +237,7 @@ class ArchiveDashboardView(discord.ui.View):
         elif val == "filter_archived":
             self.filter_status = "archived"
         elif val == "filter_high":
-            self.filter_urgency = "High" # Partial match logic in DB handles "High" vs "Cr_High" etc.
+            self.filter_urgency = "High" # A band of urgency_score (db.URGENCY_BANDS): 7-10, so Critical too
         elif val == "filter_medium":
             self.filter_urgency = "Medium"
         elif val == "view_all":
@@ -210,7 +261,7 @@ class TicketLookupModal(discord.ui.Modal, title="Lookup Ticket"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             t_id = int(self.ticket_id.value)
-            ticket = db.get_ticket_by_id(t_id)
+            ticket = await db_async.get_ticket_by_id(t_id)
             
             if not ticket:
                 await interaction.response.send_message("❌ Ticket not found.", ephemeral=True)
@@ -254,11 +305,11 @@ class TicketDetailsView(discord.ui.View):
              await interaction.response.send_message("❌ No archive files found for this ticket.", ephemeral=True)
              return
              
-        html_path = os.path.join(path, "transcript.html")
-        if os.path.exists(html_path):
+        transcript = await transcript_file(path, self.ticket['id'])
+        if transcript:
             await interaction.response.send_message(
                 content=f"📂 Transcript for Ticket #{self.ticket['id']}",
-                file=discord.File(html_path, filename=f"ticket-{self.ticket['id']}-transcript.html"),
+                file=transcript,
                 ephemeral=True
             )
         else:
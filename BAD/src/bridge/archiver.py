@@ -1,176 +1,142 @@
+import asyncio
 import discord
 import os
-import json
-import aiohttp
+import weakref
 from datetime import datetime
-from src import db
+from src import db_async
+from src.bridge.attachment_downloader import AttachmentDownloader, DownloadError
+from src.archive_index import transcript_text
+from src.blob_store import store as blob_store
+from src.archive_log import ARCHIVE_CHECKPOINT_EVERY, ArchiveLog
+from src.transcript import TranscriptWriter, find_transcript, open_transcript
+from src.transcript_html import render_transcript_html
 
 # Base archive directory
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 ARCHIVE_ROOT = os.path.join(PROJECT_ROOT, 'data', 'archives')
 
+# channel id -> asyncio.Lock: one archival per channel at a time. Held by the running
+# archival and its waiters only, so a channel's lock goes away once they are done.
+_archive_locks = weakref.WeakValueDictionary()
+
 async def archive_ticket(channel: discord.TextChannel):
     """
     Archives a ticket channel by saving its history and attachments.
+    Resumes from the channel's checkpoint, so archiving again (or after an interruption)
+    only fetches newer messages; works on open tickets too (a snapshot so far).
     Returns the absolute path to the archive directory.
     """
+    lock = _archive_locks.setdefault(channel.id, asyncio.Lock())
+    async with lock:
+        return await _archive_ticket(channel)
+
+async def _archive_ticket(channel):
     # 1. Get Ticket Details from DB
-    ticket_data = db.get_ticket(channel.id)
+    ticket_data = await db_async.get_ticket(channel.id)
     ticket_id = ticket_data['id'] if ticket_data else "unknown"
     
-    # 2. Create Directory: data/archives/YYYY/MM/ticket_id/
+    # 2. Resume the checkpointed log, or start one in data/archives/YYYY/MM/ticket_id/
     now = datetime.now()
     year = now.strftime("%Y")
     month = now.strftime("%m")
     
-    archive_dir = os.path.join(ARCHIVE_ROOT, year, month, str(ticket_id))
-    attachments_dir = os.path.join(archive_dir, "attachments")
-    os.makedirs(attachments_dir, exist_ok=True)
-    
-    # 3. Fetch History
-    messages = []
-    
-    async for msg in channel.history(limit=None, oldest_first=True):
-        msg_data = {
-            "id": msg.id,
-            "timestamp": msg.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "author_id": msg.author.id,
-            "author_name": msg.author.display_name,
-            "content": msg.content,
-            "attachments": []
-        }
-        
-        # Download Attachments
-        if msg.attachments:
+    # File work in a thread, only the checkpoint on the DB writer (see src/archive_log.py)
+    checkpoint = await db_async.get_archive_checkpoint(channel.id)
+    log = await asyncio.to_thread(ArchiveLog.load, channel.id, ticket_id, os.path.join(ARCHIVE_ROOT, year, month, str(ticket_id)), checkpoint)
+    await db_async.run_write(log.checkpoint)
+    archive_dir = log.archive_dir
+    after = discord.Object(id=log.last_message_id) if log.last_message_id else None
+    
+    # 3. Fetch History (attachments download concurrently while we keep reading),
+    # committing a batch to the log once its attachments are stored
+    async def store_attachment(entries, index, att, download_path, future):
+        try:
+            await future
+            sha256, size = await asyncio.to_thread(blob_store.put_file, download_path)
+            entries[index] = blob_store.attachment_entry(archive_dir, sha256, size, att.filename, att.url)
+        except DownloadError as e:
+            # Failed ones keep the URL and the error
+            print(f"❌ Failed to download attachment {att.url}: {e}")
+            entries[index] = {"original_url": att.url, "error": str(e)}
+
+    async def commit(batch, downloads):
+        await asyncio.gather(*(store_attachment(*download) for download in downloads))
+        if batch:
+            await db_async.run_write(log.add_refs, batch)
+            await asyncio.to_thread(log.write, batch)
+            await db_async.run_write(log.checkpoint)
+
+    fetched = 0
+    async with AttachmentDownloader() as downloader:
+        batch = []
+        downloads = [] # (message attachments, index, attachment, download path, future)
+        async for msg in channel.history(limit=None, after=after, oldest_first=True):
+            msg_data = {
+                "id": msg.id,
+                "timestamp": msg.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "author_id": msg.author.id,
+                "author_name": msg.author.display_name,
+                "content": msg.content,
+                "attachments": []
+            }
+            
             for att in msg.attachments:
-                # Sanitize filename
-                safe_filename = f"{msg.id}_{att.filename}"
-                local_path = os.path.join(attachments_dir, safe_filename)
-                
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(att.url) as resp:
-                            if resp.status == 200:
-                                with open(local_path, 'wb') as f:
-                                    f.write(await resp.read())
-                                    
-                    msg_data["attachments"].append({
-                        "original_url": att.url,
-                        "filename": att.filename,
-                        "local_path": f"attachments/{safe_filename}",
-                        "size": att.size
-                    })
-                except Exception as e:
-                    print(f"❌ Failed to download attachment {att.url}: {e}")
-                    msg_data["attachments"].append({
-                        "original_url": att.url,
-                        "error": str(e)
-                    })
-        
-        messages.append(msg_data)
+                msg_data["attachments"].append(None) # Filled in once stored
+                download_path = blob_store.incoming_path()
+                downloads.append((msg_data["attachments"], len(msg_data["attachments"]) - 1, att, download_path,
+                                  await downloader.submit(att.url, download_path)))
+            
+            batch.append(msg_data)
+            fetched += 1
+            if len(batch) >= ARCHIVE_CHECKPOINT_EVERY:
+                await commit(batch, downloads)
+                batch, downloads = [], []
+        await commit(batch, downloads)
         
-    # 4. Save JSON Transcript
-    transcript_data = {
-        "meta": {
-            "ticket_id": ticket_id,
-            "channel_id": channel.id,
-            "channel_name": channel.name,
-            "archived_at": now.strftime("%Y-%m-%d %H:%M:%S"),
-            "title": ticket_data.get('title', 'No Title') if ticket_data else 'No Title',
-            "description": ticket_data.get('description', '') if ticket_data else ''
-        },
-        "messages": messages
+    # 4. Save the Transcript (the whole log: earlier runs included), streamed line by line
+    meta = {
+        "ticket_id": ticket_id,
+        "channel_id": channel.id,
+        "channel_name": channel.name,
+        "archived_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "title": ticket_data.get('title', 'No Title') if ticket_data else 'No Title',
+        "description": ticket_data.get('description', '') if ticket_data else ''
     }
     
-    json_path = os.path.join(archive_dir, "transcript.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(transcript_data, f, indent=2, ensure_ascii=False)
+    def write_transcript():
+        with TranscriptWriter(archive_dir, meta) as writer:
+            for msg in log.messages():
+                writer.write(msg)
+        blob_store.set_refs(archive_dir, log.messages())
+        return transcript_text(log.messages())
+
+    search_text = await asyncio.to_thread(write_transcript)
         
-    # 5. Save HTML Transcript (Simple Viewer)
-    html_content = generate_html_transcript(transcript_data)
-    html_path = os.path.join(archive_dir, "transcript.html")
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    # 5. Save HTML Transcript (Simple Viewer), streamed page by page
+    await asyncio.to_thread(render_transcript_html, archive_dir, meta, log.messages(), log.message_count)
         
     # 6. Update DB
-    db.update_archive_path(channel.id, archive_dir)
-    print(f"✅ Archived ticket {ticket_id} to {archive_dir}")
+    await db_async.update_archive_path(channel.id, archive_dir)
+    if isinstance(ticket_id, int):
+        await db_async.index_archive_transcript(ticket_id, search_text)
+    print(f"✅ Archived ticket {ticket_id} to {archive_dir} ({fetched} new messages, {log.message_count} total)")
     
     return archive_dir
 
-def generate_html_transcript(data):
-    """Generates a simple HTML view of the transcript."""
-    meta = data['meta']
-    messages = data['messages']
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Ticket #{meta['ticket_id']} - Archive</title>
-        <style>
-            body {{ font-family: sans-serif; background: #36393f; color: #dcddde; padding: 20px; }}
-            .header {{ border-bottom: 1px solid #72767d; padding-bottom: 10px; margin-bottom: 20px; }}
-            .message {{ margin-bottom: 15px; padding: 10px; border-radius: 5px; background: #2f3136; }}
-            .author {{ font-weight: bold; color: #fff; }}
-            .time {{ font-size: 0.8em; color: #72767d; margin-left: 10px; }}
-            .content {{ margin-top: 5px; white-space: pre-wrap; }}
-            .attachment {{ margin-top: 10px; }}
-            a {{ color: #00b0f4; }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Ticket #{meta['ticket_id']}: {meta['title']}</h1>
-            <p><strong>Channel:</strong> {meta['channel_name']}</p>
-            <p><strong>Archived:</strong> {meta['archived_at']}</p>
-            <p><strong>Description:</strong> {meta['description']}</p>
-        </div>
-        <div class="messages">
-    """
-    
-    for msg in messages:
-        attachments_html = ""
-        for att in msg['attachments']:
-             if 'local_path' in att:
-                 attachments_html += f'<div class="attachment">📎 <a href="{att["local_path"]}" target="_blank">{att["filename"]}</a></div>'
-             else:
-                 attachments_html += f'<div class="attachment">⚠️ Failed to load: {att["original_url"]}</div>'
-                 
-        html += f"""
-            <div class="message">
-                <span class="author">{msg['author_name']}</span>
-                <span class="time">{msg['timestamp']}</span>
-                <div class="content">{msg['content']}</div>
-                {attachments_html}
-            </div>
-        """
-        
-    html += """
-        </div>
-    </body>
-    </html>
-    """
-    return html
-
 async def restore_ticket_from_archive(interaction, ticket_id):
     """
     Restores an archived ticket to a new channel.
     """
     # 1. Look up Archive Path
-    path = db.get_archive_path(ticket_id)
+    path = await db_async.get_archive_path(ticket_id)
     if not path or not os.path.exists(path):
         return f"❌ Archive not found for ticket {ticket_id}."
         
-    json_path = os.path.join(path, "transcript.json")
-    if not os.path.exists(json_path):
-        return f"❌ Transcript file missing at {json_path}."
-        
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if not find_transcript(path):
+        return f"❌ Transcript file missing in {path}."
         
-    meta = data['meta']
-    messages = data['messages']
+    transcript = open_transcript(path)
+    meta = transcript.meta
     
     guild = interaction.guild
     
@@ -195,29 +161,37 @@ async def restore_ticket_from_archive(interaction, ticket_id):
     # We can use webhooks to impersonate, but simple bot playback is safer/easier permission-wise
     # But bot playback loses original timestamps (though we can put them in text)
     
-    for msg in messages:
-        timestamp = msg['timestamp']
-        author = msg['author_name']
-        content = msg['content']
+    with transcript: # Streamed, not loaded whole
+        for msg in transcript:
+            timestamp = msg['timestamp']
+            author = msg['author_name']
+            content = msg['content']
         
-        # Prepare Attachments
-        files = []
-        if msg['attachments']:
-            for att in msg['attachments']:
-                local_file = os.path.join(path, att['local_path'])
-                if os.path.exists(local_file):
-                    files.append(discord.File(local_file))
+            # Prepare Attachments
+            files = []
+            if msg['attachments']:
+                for att in msg['attachments']:
+                    local_file = blob_store.resolve(path, att)
+                    if local_file and os.path.exists(local_file):
+                        files.append(discord.File(local_file, filename=att.get('filename')))
         
-        # Format message
-        # "[2023-01-01 12:00] User: content"
-        formatted_content = f"**{author}** `[{timestamp}]`:\n{content}"
+            # Format message
+            # "[2023-01-01 12:00] User: content"
+            formatted_content = f"**{author}** `[{timestamp}]`:\n{content}"
         
-        try:
-            await channel.send(content=formatted_content, files=files)
-        except Exception as e:
-            await channel.send(f"⚠️ Failed to restore a message: {e}")
+            try:
+                await channel.send(content=formatted_content, files=files)
+            except Exception as e:
+                await channel.send(f"⚠️ Failed to restore a message: {e}")
             
-    await channel.send("✅ **Restoration Complete.** You can now continue the conversation.")
+    done = await channel.send("✅ **Restoration Complete.** You can now continue the conversation.")
+    
+    # Archiving the restored channel continues this archive with what is posted from here on
+    try:
+        log = await asyncio.to_thread(ArchiveLog.adopted, channel.id, ticket_id, path, done.id)
+        await db_async.run_write(log.checkpoint)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Restored ticket {ticket_id} will be archived from scratch: {e}")
     
     # 4. Update DB status
     # We might need to map the old ticket ID to the NEW channel ID?
@@ -233,10 +207,6 @@ async def restore_ticket_from_archive(interaction, ticket_id):
     # Updating seems cleaner for "Restoring" the same entity.
     
     # Update DB with new channel ID
-    conn = db.get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET channel_id = ?, status = 'active' WHERE id = ?", (str(channel.id), ticket_id))
-    conn.commit()
-    conn.close()
+    await db_async.update_ticket_channel(ticket_id, channel.id, status='active')
     
     return channel
@@ -0,0 +1,132 @@
+"""
+Concurrent, streaming attachment downloads for the archiver.
+
+One aiohttp session is shared by a fixed pool of ARCHIVE_DOWNLOAD_WORKERS worker
+tasks fed from a bounded queue, so archiving a ticket with many attachments takes
+about as long as its bytes take to transfer, and walking the channel history pauses
+(back-pressure) instead of queueing without limit.
+
+Bodies are streamed to `<file>.part` in ARCHIVE_DOWNLOAD_CHUNK_KB chunks, with the
+writes done off the event loop, so memory stays flat however large a file is. A
+failed transfer is retried with backoff and resumed with an HTTP Range request from
+the bytes already on disk; the file only gets its final name once complete.
+
+Usage:
+    async with AttachmentDownloader() as downloader:
+        result = await downloader.submit(url, path)   # waits for a free queue slot
+    result.result() -> {"size": ...} or raises DownloadError
+"""
+import asyncio
+import os
+
+import aiohttp
+
+ARCHIVE_DOWNLOAD_WORKERS = int(os.getenv('ARCHIVE_DOWNLOAD_WORKERS', '4'))
+ARCHIVE_DOWNLOAD_RETRIES = int(os.getenv('ARCHIVE_DOWNLOAD_RETRIES', '3'))
+ARCHIVE_DOWNLOAD_CHUNK_KB = int(os.getenv('ARCHIVE_DOWNLOAD_CHUNK_KB', '256'))
+ARCHIVE_DOWNLOAD_TIMEOUT_S = float(os.getenv('ARCHIVE_DOWNLOAD_TIMEOUT_S', '300'))
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class DownloadError(Exception):
+    pass
+
+class _Retry(Exception):
+    pass
+
+class AttachmentDownloader:
+    def __init__(self, workers=ARCHIVE_DOWNLOAD_WORKERS, retries=ARCHIVE_DOWNLOAD_RETRIES,
+                 chunk_size=ARCHIVE_DOWNLOAD_CHUNK_KB * 1024, timeout=ARCHIVE_DOWNLOAD_TIMEOUT_S,
+                 backoff=0.5, session=None):
+        self.workers = workers
+        self.retries = retries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.backoff = backoff
+        self.session = session
+        self._owns_session = session is None
+        self._queue = None
+        self._tasks = []
+        self.bytes_downloaded = 0
+
+    async def __aenter__(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=60))
+        self._queue = asyncio.Queue(maxsize=self.workers * 4)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, url, path):
+        """Queues a download (waiting while the queue is full). Returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((url, path, future))
+        return future
+
+    async def close(self):
+        """Lets the queued downloads finish, then stops the workers and the session."""
+        if self._queue is not None:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _worker(self):
+        while True:
+            url, path, future = await self._queue.get()
+            try:
+                result = await asyncio.wait_for(self.download(url, path), self.timeout)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e if isinstance(e, DownloadError) else DownloadError(f"{type(e).__name__}: {e}"))
+            finally:
+                self._queue.task_done()
+
+    async def download(self, url, path):
+        """Streams `url` to `path`, retrying and resuming from the partial file. Returns {"size": bytes}."""
+        part_path = path + ".part"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                size = await self._fetch(url, part_path)
+                await asyncio.to_thread(os.replace, part_path, path)
+                return {"size": size}
+            except _Retry as e:
+                last_error = str(e)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+        raise DownloadError(f"Gave up after {self.retries + 1} attempts: {last_error}")
+
+    async def _fetch(self, url, part_path):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        async with self.session.get(url, headers=headers) as resp:
+            if resp.status == 416 and offset:
+                # Range beyond the end: the partial file already holds the whole body
+                return offset
+            if resp.status in RETRY_STATUSES:
+                raise _Retry(f"HTTP {resp.status}")
+            if resp.status not in (200, 206):
+                raise DownloadError(f"HTTP {resp.status}")
+            if resp.status == 200:
+                offset = 0 # Server ignored the Range header: start over
+
+            f = await asyncio.to_thread(open, part_path, 'ab' if offset else 'wb')
+            try:
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    await asyncio.to_thread(f.write, chunk)
+                    offset += len(chunk)
+                    self.bytes_downloaded += len(chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            return offset
@@ -158,7 +158,12 @@ pending_plans = {}
 
 # Conversation Manager
 from src.agent.conversation_manager import ConversationManager
-conversation_manager = ConversationManager()
+from src.agent.message_writer import MessageWriter
+conversation_manager = ConversationManager(message_writer=MessageWriter())
+from src.agent.summarizer import ConversationSummarizer
+from src.agent.plan_executor import execute_plan
+from src.agent.llm_client import llm
+summarizer = ConversationSummarizer(bot.brain, conversation_manager)
 def authorized_only():
     async def predicate(ctx):
         # 1. Fallback to Admin ID (Root Access)
@@ -189,6 +194,10 @@ def authorized_only():
 async def on_disconnect():
     print("⚠️ Bot disconnected from Discord.")
 
+async def save_memory(content):
+    """Stores a `remember` payload on the DB writer thread (MemoryStore writes SQLite/FTS)."""
+    return await db_async.run_write(bot.brain.save_memory, content)
+
 async def run_script(action_name, args=None):
     """Generic function to run a script based on action name (Async Version)."""
     action_config = ACTIONS.get(action_name)
@@ -300,7 +309,7 @@ async def on_message(message):
         async with message.channel.typing():
             # Add user message to history
             # history.append(f"User: {message.content}")
-            conversation_manager.add_user_message(message.channel.id, message.content[:1000]) # Truncate if huge
+            await db_async.run_write(conversation_manager.add_user_message, message.channel.id, message.content[:1000]) # Truncate if huge
             
             # Determine context
             sync_status = "Environment Synced" if getattr(bot, "is_env_synced", False) else "Environment NOT Synced"
@@ -323,12 +332,15 @@ async def on_message(message):
             for turn in range(3):
                 print(f"DEBUG: Turn {turn}")
                 try:
+                    # Buffered messages are committed on the writer, then history is a pure read
+                    await db_async.run_write(conversation_manager.flush)
                     thought = await bot.brain.think(
                         user_message=message.content,
                         available_actions=ACTIONS, 
-                        history=conversation_manager.get_history(message.channel.id), 
+                        history=await db_async.run_read(conversation_manager.get_history, message.channel.id), 
                         status_context=status_context,
-                        mode="manager"
+                        mode="manager",
+                        channel_id=message.channel.id
                     )
                 except Exception as e:
                     print(f"ERROR: Brain think failed: {e}")
@@ -382,7 +394,9 @@ async def on_message(message):
                 if reply:
                     await message.channel.send(reply)
                     # history.append(f"Bot: {reply}")
-                    conversation_manager.add_bot_message(message.channel.id, reply[:1000])
+                    await db_async.run_write(conversation_manager.add_bot_message, message.channel.id, reply[:1000])
+                    # Keep the prompt bounded: fold older turns into the summary (in the background)
+                    summarizer.schedule(message.channel.id)
                 break
 
 @bot.event
@@ -410,31 +424,7 @@ async def on_reaction_add(reaction, user):
             await reaction.message.edit(embed=embed)
             
             # Execute actions
-            results = []
-            for action_str in plan['actions']:
-                logger.debug(f"Processing pending action: {action_str}")
-                
-                # Check for internal actions like 'remember'
-                if action_str.startswith("remember"):
-                    content_to_remember = action_str.replace("remember ", "", 1)
-                    logger.debug(f"Executing 'remember' with content: {content_to_remember[:50]}...")
-                    if bot.brain.save_memory(json.loads(content_to_remember) if content_to_remember.startswith("{") else content_to_remember):
-                        await reaction.message.channel.send("✅ I have updated my long-term memory.")
-                    else:
-                        logger.error("save_memory failed")
-                        await reaction.message.channel.send("❌ Failed to save memory.")
-                    continue
-
-                # Parse arguments: "action arg1 arg2"
-                parts = action_str.split()
-                action_name = parts[0]
-                args = parts[1:] if len(parts) > 1 else []
-
-                logger.debug(f"Running script action '{action_name}' with args: {args}")
-                await reaction.message.channel.send(f"🔄 Running **{action_name}** with args: {args}...")
-                res = await run_script(action_name, args)
-                results.append(res)
-                await reaction.message.channel.send(res)
+            await execute_plan(plan['actions'], save_memory, run_script, reaction.message.channel.send)
             
             # Final update
             embed.color = discord.Color.green()
@@ -482,21 +472,52 @@ async def status_cmd(ctx):
     except Exception as e:
         await ctx.send(f"⚠️ System Unstable: {e}")
 
+def _ms(value):
+    return f"{value:.0f}ms" if value is not None else "n/a"
+
+async def llm_usage_report():
+    """LLM spend from the llm_usage ledger: 7-day run rate, last 24h totals/latency, per-mode prompt sizes, top tickets."""
+    now = time.time()
+    week = await db_async.get_llm_usage_summary(since=now - 7 * 86400)
+    if not week['calls']:
+        return "\n🤖 **LLM Usage:** no calls recorded yet."
+    day = await db_async.get_llm_usage_summary(since=now - 86400)
+    modes = await db_async.get_llm_usage_by_mode(since=now - 86400)
+    tickets = await db_async.get_llm_usage_by_ticket(limit=3)
+
+    msg = (f"\n🤖 **LLM Run Rate:** ${week['cost'] / 7 * 30:.2f}/mo (7-day avg, {week['calls']} calls)"
+           f"\nLast 24h: {day['calls']} calls, {day['errors']} errors, {day['retries']} retries, ${day['cost']:.4f} | "
+           f"{day['prompt_tokens']} in / {day['output_tokens']} out tokens"
+           f"\nLatency p50 {_ms(day['p50_latency_ms'])}, p95 {_ms(day['p95_latency_ms'])} | "
+           f"Tokens/turn: {day['tokens_per_turn'] or 0:.0f}")
+    for m in modes:
+        msg += f"\n• `{m['mode']}`: {m['calls']} calls, ~{m['avg_prompt_tokens'] or 0:.0f} in / {m['avg_output_tokens'] or 0:.0f} out tokens, ${m['cost'] or 0:.4f}"
+    if tickets:
+        msg += "\nTop tickets: " + ", ".join(
+            f"{'#' + str(t['ticket_id']) if t['ticket_id'] else '<#' + t['channel_id'] + '>'} ${t['cost'] or 0:.4f}" for t in tickets
+        )
+    return msg
+
 @bot.command(name='cost')
 async def cost_cmd(ctx):
     """Estimates the monthly run rate."""
     try:
         if not os.path.exists(LEDGER_FILE):
-            await ctx.send("💰 **Monthly Run Rate:** Unknown (Ledger missing).")
-            return
-
-        with open(LEDGER_FILE, 'r') as f:
-            ledger = json.load(f)
-        
-        total_cost = sum(item.get('estimated_cost_mo', 0) for item in ledger)
-        resource_count = len(ledger)
+            msg = "💰 **Monthly Run Rate:** Unknown (Ledger missing)."
+        else:
+            with open(LEDGER_FILE, 'r') as f:
+                ledger = json.load(f)
+            
+            total_cost = sum(item.get('estimated_cost_mo', 0) for item in ledger)
+            resource_count = len(ledger)
+            msg = f"💰 **Monthly Run Rate:** ${total_cost:.2f}\nActive Resources: {resource_count}"
 
-        await ctx.send(f"💰 **Monthly Run Rate:** ${total_cost:.2f}\nActive Resources: {resource_count}")
+        msg += await llm_usage_report()
+        if getattr(bot, "brain", None):
+            cache = bot.brain.response_cache.stats()
+            msg += (f"\n🧠 **LLM Response Cache:** {cache['hits']} hits, {cache['coalesced']} shared, "
+                    f"{cache['misses']} misses ({cache['hit_rate']:.0%} saved), {cache['entries']} cached")
+        await ctx.send(msg)
 
     except Exception as e:
         await ctx.send(f"❌ Error calculating cost: {e}")
@@ -590,6 +611,7 @@ if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 try:
     from src import db
+    from src import db_async
     # Initialize DB on startup
     db.init_db()
 except ImportError as e:
@@ -599,7 +621,7 @@ except ImportError as e:
 async def get_result_cmd(ctx, job_id: str):
     """Retrieves the latest result link for a given Job ID."""
     try:
-        res = db.get_latest_result(job_id)
+        res = await db_async.get_latest_result(job_id)
         if res:
             await ctx.send(f"📂 **Result for Job {job_id}**\nLink: {res['file_url']}\nType: {res['result_type']}\nCreated: {res['created_at']}")
         else:
@@ -637,7 +659,7 @@ async def kickoff_cmd(ctx):
 async def add_result_cmd(ctx, job_id: str, url: str, rtype: str = 'manual'):
     """Manually adds a result (for testing or admin use)."""
     try:
-        row_id = db.add_result(job_id, url, rtype)
+        row_id = await db_async.add_result(job_id, url, rtype)
         await ctx.send(f"✅ Result added for Job `{job_id}` (Row ID: {row_id})")
     except Exception as e:
         await ctx.send(f"❌ Error adding result: {e}")
@@ -650,7 +672,7 @@ async def add_result_cmd(ctx, job_id: str, url: str, rtype: str = 'manual'):
 async def reset_cmd(ctx):
     """Resets the conversation history."""
     # history.clear()
-    if conversation_manager.start_new_conversation(ctx.channel.id):
+    if await db_async.run_write(conversation_manager.start_new_conversation, ctx.channel.id):
         await ctx.send("broom **Conversation Reset.** A new conversation has been started.")
     else:
         await ctx.send("broom **Conversation Reset.** (No active conversation was found to close).")
@@ -837,7 +859,7 @@ class DashboardView(discord.ui.View):
             if msg_id not in pending_plans: continue
             plan = pending_plans[msg_id]
             
-            # Execute actions (Reusing logic from on_reaction_add - ideally should be refactored to a function)
+            # Execute actions
             plan['status'] = "executing"
             
             # Log to channel that we are auto-executing
@@ -845,16 +867,7 @@ class DashboardView(discord.ui.View):
             # So we just post to the interaction channel (which should be the dashboard channel)
             await self.ctx.send(f"🤖 **Batch Executing Plan {msg_id}**")
             
-            for action_str in plan['actions']:
-                # ... (Execution Logic Duplicated for safety/speed, or call helper)
-                # For robustness in this prompt, I will call run_script directly
-                parts = action_str.split()
-                action_name = parts[0]
-                args = parts[1:] if len(parts) > 1 else []
-                
-                await self.ctx.send(f"🔄 Running **{action_name}** {args}...")
-                res = await run_script(action_name, args)
-                await self.ctx.send(res)
+            await execute_plan(plan['actions'], save_memory, run_script, self.ctx.send)
             
             del pending_plans[msg_id]
 
@@ -917,6 +930,17 @@ def create_dashboard_embed():
         except: pass
         
     embed.add_field(name="system_health", value=f"Last Heartbeat: {heartbeat}\nLatency: {bot.latency*1000:.0f}ms", inline=False)
+
+    # 4. LLM usage (live, last hour of this process)
+    if llm.usage_recorder is not None:
+        usage = llm.usage_recorder.recent_stats()
+        if usage['calls']:
+            llm_text = (f"{usage['calls']} calls ({usage['errors']} failed), p50 {_ms(usage['p50_latency_ms'])}, "
+                        f"p95 {_ms(usage['p95_latency_ms'])}\n~{usage['tokens_per_turn'] or 0:.0f} tokens/turn | "
+                        f"Run rate: ${usage['daily_run_rate']:.2f}/day (${usage['monthly_run_rate']:.2f}/mo)")
+        else:
+            llm_text = "*No LLM calls in the last hour.*"
+        embed.add_field(name="llm_usage", value=llm_text, inline=False)
     embed.set_footer(text=f"Updated: {datetime.datetime.now().strftime('%H:%M:%S')}")
     return embed
 
@@ -1,7 +1,7 @@
 
 import discord
 from discord.ui import View, Select, Button
-import src.db as db
+from src import db_async
 from datetime import datetime
 
 class UnifiedDashboardView(View):
@@ -85,7 +85,7 @@ class UnifiedDashboardView(View):
 
         if self.current_role == "User":
             embed.title = f"👤 User Dashboard: {self.user.display_name}"
-            tickets = db.get_user_tickets(self.user.id)
+            tickets = await db_async.get_user_tickets(self.user.id)
             active_tickets = [t for t in tickets if t['status'] not in ['closed', 'archived']]
             
             if active_tickets:
@@ -108,7 +108,7 @@ class UnifiedDashboardView(View):
             embed.color = discord.Color.orange()
             
             # 1. Unassigned Queue
-            unassigned = db.get_unassigned_tickets(limit=5)
+            unassigned = await db_async.get_unassigned_tickets(limit=5)
             queue_str = ""
             if unassigned:
                 for t in unassigned:
@@ -118,10 +118,10 @@ class UnifiedDashboardView(View):
             else:
                 queue_str = "✅ Queue is clear!"
                 
-            embed.add_field(name="📨 Unassigned Queue (Oldest)", value=queue_str, inline=False)
+            embed.add_field(name="📨 Unassigned Queue (Priority)", value=queue_str, inline=False)
             
             # 2. My Assignments
-            my_tickets = db.get_assigned_tickets(self.user.id)
+            my_tickets = await db_async.get_assigned_tickets(self.user.id)
             mined_str = ""
             if my_tickets:
                 for t in my_tickets[:5]:
@@ -138,7 +138,7 @@ class UnifiedDashboardView(View):
             embed.title = "📊 Manager Command Center"
             embed.color = discord.Color.dark_theme()
             
-            stats = db.get_ticket_stats()
+            stats = await db_async.get_ticket_stats(active_limit=0, urgent_limit=5)
             
             embed.description = (
                 f"**Overview**\n"
@@ -148,8 +148,7 @@ class UnifiedDashboardView(View):
             )
             
             # Urgent List
-            tickets = stats['active_list']
-            urgent_list = [t for t in tickets if t['urgency'] and ('high' in t['urgency'].lower() or '10' in t['urgency'])]
+            urgent_list = stats['urgent_list']
             
             urgent_str = ""
             if urgent_list:
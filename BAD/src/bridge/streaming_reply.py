@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+
+# Discord allows ~5 message edits per 5s per channel; stay well under it
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.2'))
+DISCORD_MESSAGE_LIMIT = 2000
+
+class StreamingReply:
+    """
+    Shows a reply that is still being generated in a single Discord message.
+
+    The first text is sent right away (so the user sees something within a second),
+    later updates are coalesced into at most one edit per `edit_interval`. Call
+    finish() with the final text (and optionally an embed/view) once it is known.
+    """
+
+    def __init__(self, channel, edit_interval=STREAM_EDIT_INTERVAL):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.message = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._pending = None # Scheduled coalesced edit
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _preview(text):
+        if len(text) > DISCORD_MESSAGE_LIMIT:
+            return text[:DISCORD_MESSAGE_LIMIT - 1] + "…"
+        return text
+
+    async def update(self, text):
+        """Records the reply so far; sends or schedules an edit."""
+        self._text = text
+        if not text.strip():
+            return
+        if self.message is None:
+            async with self._lock:
+                if self.message is None:
+                    self._shown = self._preview(text)
+                    self.message = await self.channel.send(self._shown)
+                    self._last_edit = time.monotonic()
+            return
+        if self._pending is None:
+            self._pending = asyncio.create_task(self._delayed_edit())
+
+    async def _delayed_edit(self):
+        await asyncio.sleep(max(0.0, self._last_edit + self.edit_interval - time.monotonic()))
+        self._pending = None
+        async with self._lock:
+            preview = self._preview(self._text)
+            if preview != self._shown:
+                await self.message.edit(content=preview)
+                self._shown = preview
+                self._last_edit = time.monotonic()
+
+    async def finish(self, text=None, **kwargs):
+        """
+        Writes the final text (default: the last update) plus any extra message fields
+        (embed=..., view=...). Text over Discord's limit continues in follow-up messages.
+        Returns the (first) message, or None if nothing was sent.
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        text = self._text if text is None else text
+        chunks = [text[i:i + DISCORD_MESSAGE_LIMIT] for i in range(0, len(text), DISCORD_MESSAGE_LIMIT)] or [""]
+
+        async with self._lock:
+            if self.message is None:
+                if not text and not kwargs:
+                    return None
+                self.message = await self.channel.send(content=chunks[0] or None, **kwargs)
+            elif chunks[0] != self._shown or kwargs:
+                await self.message.edit(content=chunks[0], **kwargs)
+            self._shown = chunks[0]
+            for chunk in chunks[1:]:
+                await self.channel.send(chunk)
+        return self.message
@@ -71,12 +71,21 @@ if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 
 from src import db
+from src import db_async
+from src.agent.llm_client import llm
+from src.bridge.streaming_reply import StreamingReply
+from src.agent.output_parser import parse_actions, ProposeTicket, CloseTicket
 
 try:
     from src.agent.brain import AgentBrain
     from src.agent.conversation_manager import ConversationManager
+    from src.agent.message_writer import MessageWriter
+    from src.agent.summarizer import ConversationSummarizer
+    from src.agent.intent_router import IntentRouter, NaiveBayesIntentModel, INTENT_MODEL_ENABLED
     brain = AgentBrain()
-    conversation_manager = ConversationManager()
+    conversation_manager = ConversationManager(message_writer=MessageWriter())
+    summarizer = ConversationSummarizer(brain, conversation_manager)
+    intent_router = IntentRouter()
     print("🧠 Agent Brain & Conversation Manager Intergrated")
     
     # Initialize DB (and run migrations) - Moved outside try/except
@@ -86,6 +95,8 @@ except ImportError as e:
     brain = None
     brain = None
     conversation_manager = None
+    summarizer = None
+    intent_router = None
 
 # consistently init DB
 db.init_db()
@@ -93,7 +104,14 @@ db.init_db()
 from src.bridge import archiver
 import shutil
 from src.bridge.dashboard_view import UnifiedDashboardView
-from src.bridge.archive_view import ArchiveDashboardView
+from src.bridge.archive_view import ArchiveDashboardView, transcript_file
+
+async def close_ticket_record(channel_id):
+    """Marks a ticket closed in the DB, committing any buffered chat history first."""
+    if conversation_manager:
+        await db_async.run_write(conversation_manager.flush)
+    await db_async.update_ticket_status(channel_id, 'closed')
+    pending_drafts.discard(channel_id) # Discarded (or closed) with a draft showing
 
 # --- Views ---
 
@@ -109,7 +127,7 @@ class RestoreView(discord.ui.View):
         
         # 1. Update DB
         # Defaulting to active if restored
-        db.update_ticket_status(interaction.channel.id, 'active')
+        await db_async.update_ticket_status(interaction.channel.id, 'active')
         
         # 2. Move to Incoming/Active Categories
         # Try finding INCOMING first, then defaults
@@ -240,27 +258,27 @@ class DashboardView(discord.ui.View):
              await interaction.message.edit(embed=embed, view=view)
         else:
              # Legacy/Manager Dashboard
-             view = create_dashboard_view(interaction.guild)
-             embed = generate_dashboard_embed(interaction.guild)
+             view = await create_dashboard_view(interaction.guild)
+             embed = await generate_dashboard_embed(interaction.guild)
              await interaction.message.edit(embed=embed, view=view)
 
     @discord.ui.button(label="📢 Announce Queue", style=discord.ButtonStyle.primary, custom_id="dashboard_announce")
     async def announce_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        stats = db.get_ticket_stats()
+        stats = await db_async.get_ticket_stats(active_limit=0, urgent_limit=0)
         await interaction.channel.send(f"📢 **Status Update**: We currently have **{stats['total_open']}** open tickets ({stats['unassigned']} unassigned).")
         await interaction.response.defer()
 
-def create_dashboard_view(guild):
+async def create_dashboard_view(guild):
     """Helper to create a DashboardView with populated select options."""
     view = DashboardView()
-    stats = db.get_ticket_stats()
-    tickets = stats['active_list'][:25] # Limit to 25 for select menu
+    stats = await db_async.get_ticket_stats(active_limit=25) # Limit to 25 for select menu
+    tickets = stats['active_list']
     
     options = []
     for t in tickets:
         title = t['title'] or "No Title"
         label = f"#{t['id']} {title[:50]}" 
-        emoji = "🔴" if t['urgency'] and ("High" in t['urgency'] or "10" in t['urgency']) else "🟢"
+        emoji = "🔴" if (t['urgency_score'] or 0) >= db.URGENT_SCORE else "🟢"
         if not t['channel_id']: continue
         
         desc = f"User: {t['user_name']}"
@@ -318,9 +336,9 @@ def is_ticket_channel(channel):
         
     return True
 
-def generate_dashboard_embed(guild):
+async def generate_dashboard_embed(guild):
     """Generates the dashboard embed based on current stats."""
-    stats = db.get_ticket_stats()
+    stats = await db_async.get_ticket_stats(active_limit=10)
     
     embed = discord.Embed(title="🎛️ Manager Command Center", color=discord.Color.dark_theme())
     embed.description = f"**Active Overview**\nTotal Open: `{stats['total_open']}`\nUnassigned: `{stats['unassigned']}`\nHigh Priority: `{stats['urgent']}`"
@@ -342,8 +360,8 @@ def generate_dashboard_embed(guild):
             title = t['title'] or "No Title"
             list_str += f"**#{t['id']}** {chan_link}\n└ 📂 {title} | 👤 {t['user_name']} | 👮 `{assigned_text}`\n"
         
-        if len(tickets) > 10:
-            list_str += f"\n...and {len(tickets)-10} more."
+        if stats['total_open'] > 10:
+            list_str += f"\n...and {stats['total_open']-10} more."
             
         embed.add_field(name="📋 Active Tickets (Top 10)", value=list_str or "No active tickets.", inline=False)
     else:
@@ -405,7 +423,7 @@ class EditTicketModal(discord.ui.Modal, title="Edit Ticket Details"):
                 f"New Urgency: {self.original_view.urgency}\n"
                 f"New Description: {self.original_view.description}"
             )
-            self.conversation_manager.add_user_message(interaction.channel.id, system_note)
+            await db_async.run_write(self.conversation_manager.add_user_message, interaction.channel.id, system_note)
             
             # Optional: Trigger a "Thinking" pass? 
             # Not strictly necessary if we just wait for the user to say "Looks good" or "Thanks".
@@ -428,8 +446,9 @@ class ProposalView(discord.ui.View):
         guild = interaction.guild
         
         # 1. Update DB Details & Status
-        db.update_ticket_details(channel.id, self.title, self.description, self.urgency)
-        db.update_ticket_status(channel.id, 'active')
+        await db_async.update_ticket_details(channel.id, self.title, self.description, self.urgency)
+        await db_async.update_ticket_status(channel.id, 'active')
+        pending_drafts.discard(channel.id)
 
         # 2. Move to Incoming/Active Categories
         # Try finding INCOMING first, then defaults
@@ -487,7 +506,7 @@ class ProposalView(discord.ui.View):
         
         # 5. Tell Brain it's done (Optional)
         if self.conversation_manager:
-             self.conversation_manager.add_user_message(channel.id, "[System Event] Ticket Submitted.")
+             await db_async.run_write(self.conversation_manager.add_user_message, channel.id, "[System Event] Ticket Submitted.")
 
     @discord.ui.button(label="✏️ Edit Manually", style=discord.ButtonStyle.secondary, custom_id="edit_ticket_btn")
     async def edit_details(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -504,7 +523,7 @@ class ProposalView(discord.ui.View):
         guild = interaction.guild
         
         # 0. Update DB
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
 
         # 1. Move to Closed Archives
         category = guild.get_channel(CLOSED_ARCHIVES_ID)
@@ -558,7 +577,7 @@ class TicketControlView(discord.ui.View):
         guild = interaction.guild
         
         # 0. Update DB
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
         
         # 1. Move to Closed Archives
         category = guild.get_channel(CLOSED_ARCHIVES_ID)
@@ -585,7 +604,7 @@ class TicketControlView(discord.ui.View):
         guild = interaction.guild
         
         # 0. Update DB
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
         
         # 1. Move to Closed Archives
         category = guild.get_channel(CLOSED_ARCHIVES_ID)
@@ -611,7 +630,7 @@ class TicketControlView(discord.ui.View):
         channel = interaction.channel
         
         # 0. Update DB to deleted (so archiver doesn't complain or process it)
-        db.update_ticket_status(channel.id, 'deleted')
+        await db_async.update_ticket_status(channel.id, 'deleted')
         
         # 1. Delete Channel
         await channel.delete(reason=f"Ticket Deleted by {interaction.user.display_name}")
@@ -627,7 +646,7 @@ class DiscardView(discord.ui.View):
         guild = interaction.guild
         
         # 0. Update DB
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
         
         # 1. Move to Closed Archives
         category = guild.get_channel(CLOSED_ARCHIVES_ID)
@@ -671,7 +690,7 @@ class TicketView(discord.ui.View):
 
         try:
             # 1. Create DB Record to get ID
-            ticket_id = db.create_ticket_record("pending", guild.id, user.id, user.name)
+            ticket_id = await db_async.create_ticket_record("pending", guild.id, user.id, user.name)
             
             # Format: ticket-BAD-001 (or just ticket-1)
             # User request: "BAD-0001" style numbering might be good for display, but channel names usually keep it simple or use the ID.
@@ -696,7 +715,7 @@ class TicketView(discord.ui.View):
             # 2. Create Channel with ID
             # 3. Update DB record with valid Channel ID
             
-            db.update_ticket_status(str(channel.id), 'draft') # optimizing to just use update logic or raw sql if needed
+            await db_async.update_ticket_status(str(channel.id), 'draft') # optimizing to just use update logic or raw sql if needed
             # We need a way to update the channel_id for the record we just created.
             # Let's hack it: The DB schema has channel_id as non-primary.
             # We can execute a direct update here or add a function. 
@@ -706,15 +725,11 @@ class TicketView(discord.ui.View):
             # Let's add a `update_ticket_channel_id(ticket_pk, new_channel_id)` to db.py?
             # Or just use the `ticket_id` returned.
             
-            conn = db.get_connection()
-            c = conn.cursor()
-            c.execute("UPDATE tickets SET channel_id = ? WHERE id = ?", (str(channel.id), ticket_id))
-            conn.commit()
-            conn.close()
+            await db_async.update_ticket_channel(ticket_id, channel.id)
             
             # Start Conversation
             if conversation_manager:
-                conversation_manager.start_new_conversation(channel.id)
+                await db_async.run_write(conversation_manager.start_new_conversation, channel.id)
                 # We let the bot logic generate the greeting based on the new system prompt
                 # But we trigger it by simulating a join event or just having the bot speak first?
                 # Actually, the brain needs a trigger. Let's force a "hello" from the bot.
@@ -737,8 +752,8 @@ class TicketView(discord.ui.View):
                 await channel.send(content=greeting_part_2)
 
                 # Record both in conversation history
-                conversation_manager.add_bot_message(channel.id, greeting_part_1)
-                conversation_manager.add_bot_message(channel.id, greeting_part_2)
+                await db_async.run_write(conversation_manager.add_bot_message, channel.id, greeting_part_1)
+                await db_async.run_write(conversation_manager.add_bot_message, channel.id, greeting_part_2)
             
             # Delete the "Thinking..." / "Creating..." message so it doesn't linger
             try:
@@ -869,7 +884,7 @@ async def check_and_archive_tickets():
     await bot.wait_until_ready()
     
     try:
-        closed_tickets = db.get_closed_tickets()
+        closed_tickets = await db_async.get_closed_tickets()
         
         # Policy: Keep max 50 AND max 7 days old
         # archive if (index >= 50) OR (age > 7 days) (whichever is less kept -> stricter policy wins)
@@ -912,8 +927,8 @@ async def check_and_archive_tickets():
                          archive_path = await archiver.archive_ticket(channel)
                          
                          # Update DB first
-                         db.mark_ticket_archived(channel_id)
-                         db.update_archive_path(channel_id, archive_path)
+                         await db_async.mark_ticket_archived(channel_id)
+                         await db_async.update_archive_path(channel_id, archive_path)
                          
                          # Delete Channel
                          await channel.delete(reason="Automated Archival: Retention Policy")
@@ -921,7 +936,7 @@ async def check_and_archive_tickets():
                          archived_count += 1
                     else:
                          print(f"   ⚠️ Channel {channel_id} not found, marking archived in DB.")
-                         db.mark_ticket_archived(channel_id)
+                         await db_async.mark_ticket_archived(channel_id)
 
                 except Exception as e:
                     print(f"   ⚠️ Failed to archive channel {channel_id}: {e}")
@@ -952,6 +967,12 @@ async def on_ready():
         bot.add_view(DashboardView())
         print(f'   Ticket Views Registered.')
 
+        # Optional learned intent model, trained from past user messages
+        if intent_router and INTENT_MODEL_ENABLED and intent_router.model is None:
+            texts = await db_async.get_user_message_texts()
+            intent_router.model = NaiveBayesIntentModel.from_messages(texts)
+            print(f"   Intent model: {'trained on ' + str(len(texts)) + ' messages' if intent_router.model else 'not enough data, rules only'}")
+
         # Load Cogs (Uplink, etc.)
         try:
             # Check if extension is already loaded to check re-connects
@@ -1031,7 +1052,7 @@ class AssignView(discord.ui.View):
                  if category and interaction.channel.category_id != ACTIVE_TICKETS_ID:
                      await interaction.channel.edit(category=category)
                      # Update DB
-                     db.update_ticket_status(interaction.channel.id, 'active')
+                     await db_async.update_ticket_status(interaction.channel.id, 'active')
              except Exception as e:
                  print(f"Failed to move to active: {e}")
                  
@@ -1043,7 +1064,7 @@ class AssignView(discord.ui.View):
                  category = interaction.guild.get_channel(BLOCKED_ESCALATED_ID)
                  if category and interaction.channel.category_id != BLOCKED_ESCALATED_ID:
                      await interaction.channel.edit(category=category)
-                     db.update_ticket_status(interaction.channel.id, 'escalated')
+                     await db_async.update_ticket_status(interaction.channel.id, 'escalated')
              except Exception as e:
                  print(f"Failed to move to escalated: {e}")
         
@@ -1071,8 +1092,8 @@ async def assign_ticket(ctx, member: discord.Member = None):
                 await ctx.channel.edit(category=category)
                 # Update DB
                 # Update DB
-                db.update_ticket_status(ctx.channel.id, 'active')
-                db.update_ticket_assignment(ctx.channel.id, member.id)
+                await db_async.update_ticket_status(ctx.channel.id, 'active')
+                await db_async.update_ticket_assignment(ctx.channel.id, member.id)
         except Exception as e:
              print(f"Failed to move to active: {e}")
 
@@ -1102,7 +1123,7 @@ async def escalate_ticket(ctx, member: discord.Member = None):
             category = ctx.guild.get_channel(BLOCKED_ESCALATED_ID)
             if category and ctx.channel.category_id != BLOCKED_ESCALATED_ID:
                 await ctx.channel.edit(category=category)
-                db.update_ticket_status(ctx.channel.id, 'escalated')
+                await db_async.update_ticket_status(ctx.channel.id, 'escalated')
         except Exception as e:
              print(f"Failed to move to escalated: {e}")
              
@@ -1141,8 +1162,8 @@ async def return_ticket(ctx):
     # 3. Update Status
     # We keep it 'active' since it's just unassigned but still open.
     # If there was a 'blocked' status, we are clearing it.
-    db.update_ticket_status(ctx.channel.id, 'active')
-    db.update_ticket_assignment(ctx.channel.id, None)
+    await db_async.update_ticket_status(ctx.channel.id, 'active')
+    await db_async.update_ticket_assignment(ctx.channel.id, None)
 
     # 4. Remove User Assignment (Overwrite)
     # This removes the explicit permission overwrite for the command invoker,
@@ -1173,12 +1194,12 @@ async def abandon_ticket_cmd(ctx):
     await ctx.send("🏚️ Abandoning ticket...")
 
     # Update DB
-    db.update_ticket_status(ctx.channel.id, 'closed')
+    await close_ticket_record(ctx.channel.id)
 
     # Archive
     try:
         archive_path = await archiver.archive_ticket(ctx.channel)
-        db.update_archive_path(ctx.channel.id, archive_path)
+        await db_async.update_archive_path(ctx.channel.id, archive_path)
     except Exception as e:
         await ctx.send(f"⚠️ Failed to save archive: {e}")
 
@@ -1195,6 +1216,20 @@ async def abandon_ticket_cmd(ctx):
     else:
         await ctx.send("🏚️ Ticket abandoned (Archive category not found).")
 
+@bot.command(name='snapshot')
+async def snapshot_ticket_cmd(ctx):
+    """Archives the ticket so far without closing it (later archives only add newer messages)."""
+    if not (ctx.channel.name.startswith("ticket-") or ctx.channel.name.startswith("incoming-")):
+        await ctx.send("⚠️ This command only works in ticket channels.")
+        return
+
+    try:
+        archive_path = await archiver.archive_ticket(ctx.channel)
+    except Exception as e:
+        await ctx.send(f"⚠️ Failed to save snapshot: {e}")
+        return
+    await ctx.send(f"💾 Snapshot saved to `{os.path.relpath(archive_path, archiver.ARCHIVE_ROOT)}`.")
+
 @bot.command(name='delete')
 @commands.has_permissions(manage_channels=True)
 async def delete_ticket_cmd(ctx):
@@ -1210,7 +1245,7 @@ async def delete_ticket_cmd(ctx):
     if view.value:
         await ctx.send("🗑️ Deleting ticket...")
         # DB Update
-        db.update_ticket_status(ctx.channel.id, 'deleted')
+        await db_async.update_ticket_status(ctx.channel.id, 'deleted')
         # Delete Channel
         await ctx.channel.delete(reason=f"Ticket Deleted by {ctx.author.display_name}")
     else:
@@ -1245,18 +1280,18 @@ async def close_ticket_cmd(ctx):
     await ctx.send("🔒 Closing ticket...")
 
     # 2. Update DB
-    db.update_ticket_status(ctx.channel.id, 'closed')
+    await close_ticket_record(ctx.channel.id)
 
     # 3. Archive Ticket Data
     try:
         archive_path = await archiver.archive_ticket(ctx.channel)
-        db.update_archive_path(ctx.channel.id, archive_path)
+        await db_async.update_archive_path(ctx.channel.id, archive_path)
     except Exception as e:
         await ctx.send(f"⚠️ Failed to save archive: {e}")
         archive_path = None
 
     # 4. DM the User (Transcript)
-    ticket_data = db.get_ticket(ctx.channel.id)
+    ticket_data = await db_async.get_ticket(ctx.channel.id)
     target_user = None
     
     if ticket_data and ticket_data['user_id']:
@@ -1267,12 +1302,12 @@ async def close_ticket_cmd(ctx):
              pass
 
     if target_user and archive_path:
-        html_file = os.path.join(archive_path, "transcript.html")
-        if os.path.exists(html_file):
+        transcript = await transcript_file(archive_path, ticket_data['id'])
+        if transcript:
             try:
                 await target_user.send(
                     f"Your ticket **{ctx.channel.name}** has been closed. You can view the transcript attached.",
-                    file=discord.File(html_file)
+                    file=transcript
                 )
                 await ctx.send(f"✅ Transcript sent to {target_user.mention}.")
             except discord.Forbidden:
@@ -1349,7 +1384,7 @@ async def restore_ticket_slash(interaction: discord.Interaction, ticket_id: int)
 async def history_cmd(ctx, member: discord.Member = None):
     """Shows ticket history for a user."""
     target = member or ctx.author
-    tickets = db.get_user_tickets(target.id)
+    tickets = await db_async.get_user_tickets(target.id)
     
     if not tickets:
         await ctx.send(f"No ticket history found for {target.display_name}.")
@@ -1372,14 +1407,14 @@ async def history_cmd(ctx, member: discord.Member = None):
 @bot.tree.command(name='view_archive', description="Retrieves the transcript for an archived ticket.")
 async def view_archive_slash(interaction: discord.Interaction, ticket_id: int):
     """Retrieves the transcript for an archived ticket."""
-    path = db.get_archive_path(ticket_id)
+    path = await db_async.get_archive_path(ticket_id)
     if not path:
         await interaction.response.send_message(f"❌ No archive found for Ticket #{ticket_id}.", ephemeral=True)
         return
         
-    html_file = os.path.join(path, "transcript.html")
-    if os.path.exists(html_file):
-        await interaction.response.send_message(f"📄 Transcript for Ticket #{ticket_id}:", file=discord.File(html_file), ephemeral=True)
+    transcript = await transcript_file(path, ticket_id)
+    if transcript:
+        await interaction.response.send_message(f"📄 Transcript for Ticket #{ticket_id}:", file=transcript, ephemeral=True)
     else:
         await interaction.response.send_message(f"⚠️ Archive directory exists but transcript is missing.", ephemeral=True)
 
@@ -1422,6 +1457,7 @@ async def help_slash(interaction: discord.Interaction):
     embed.add_field(name="/dashboard", value="Opens your personal ticket dashboard.", inline=False)
     embed.add_field(name="!close", value="Closes ticket with a resolved state, saves and sends a transcript.", inline=False)
     embed.add_field(name="!abandon", value="Abandons the ticket in its current state and archives it.", inline=False)
+    embed.add_field(name="!snapshot", value="Archives the ticket so far without closing it.", inline=False)
     embed.add_field(name="!delete", value="Deletes a ticket entirely (Confirm Required).", inline=False)
     embed.add_field(name="/tickethelp", value="Shows this message.", inline=False)
     embed.add_field(name="Note", value="Staff/Admins: Use /commands for full command list.", inline=False)
@@ -1471,14 +1507,14 @@ class ArchiveIDModal(discord.ui.Modal, title="View Archive"):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             tid = int(self.ticket_id.value)
-            path = db.get_archive_path(tid)
+            path = await db_async.get_archive_path(tid)
             if not path:
                 await interaction.response.send_message(f"❌ No archive found for Ticket #{tid}.", ephemeral=True)
                 return
                 
-            html_file = os.path.join(path, "transcript.html")
-            if os.path.exists(html_file):
-                await interaction.response.send_message(f"📄 Transcript for Ticket #{tid}:", file=discord.File(html_file), ephemeral=True)
+            transcript = await transcript_file(path, tid)
+            if transcript:
+                await interaction.response.send_message(f"📄 Transcript for Ticket #{tid}:", file=transcript, ephemeral=True)
             else:
                 await interaction.response.send_message(f"⚠️ Archive directory exists but transcript is missing.", ephemeral=True)
         except ValueError:
@@ -1535,12 +1571,12 @@ class CommandsView(discord.ui.View):
         channel = interaction.channel
         guild = interaction.guild
         
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
         
         # Archive
         try:
              archive_path = await archiver.archive_ticket(channel)
-             db.update_archive_path(channel.id, archive_path)
+             await db_async.update_archive_path(channel.id, archive_path)
         except Exception as e:
              await interaction.followup.send(f"⚠️ Archive failed: {e}", ephemeral=True)
 
@@ -1574,8 +1610,8 @@ class CommandsView(discord.ui.View):
         if category:
             await channel.edit(category=category)
             
-        db.update_ticket_status(channel.id, 'active')
-        db.update_ticket_assignment(channel.id, None)
+        await db_async.update_ticket_status(channel.id, 'active')
+        await db_async.update_ticket_assignment(channel.id, None)
         
         try:
             await channel.set_permissions(interaction.user, overwrite=None)
@@ -1590,10 +1626,10 @@ class CommandsView(discord.ui.View):
         channel = interaction.channel
         guild = interaction.guild
         
-        db.update_ticket_status(channel.id, 'closed')
+        await close_ticket_record(channel.id)
         try:
             archive_path = await archiver.archive_ticket(channel)
-            db.update_archive_path(channel.id, archive_path)
+            await db_async.update_archive_path(channel.id, archive_path)
         except: pass
         
         category = guild.get_channel(CLOSED_ARCHIVES_ID)
@@ -1609,7 +1645,7 @@ class CommandsView(discord.ui.View):
         await interaction.followup.send("🏚️ Ticket Abandoned.", ephemeral=True)
 
     async def history_cb(self, interaction: discord.Interaction):
-        tickets = db.get_user_tickets(interaction.user.id)
+        tickets = await db_async.get_user_tickets(interaction.user.id)
         if not tickets:
             await interaction.response.send_message("No ticket history found for you.", ephemeral=True)
             return
@@ -1659,6 +1695,15 @@ async def commands_slash(interaction: discord.Interaction):
     embed.set_footer(text="Interactive Command Menu")
     await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
+# Ticket channels showing a draft (ProposalView) that hasn't been submitted yet
+pending_drafts = set()
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    # A ticket deleted mid-thought: stop waiting on the model for it
+    llm.cancel(channel.id)
+    pending_drafts.discard(channel.id)
+
 @bot.event
 async def on_message(message):
     # Ignore ALL bot messages (Prevents loops with Project Planner)
@@ -1684,10 +1729,23 @@ async def on_message(message):
         # Check if conversation manager is active and ticket is NOT yet submitted
         if conversation_manager and brain:
             # Check DB status
-            status = db.get_ticket_status(message.channel.id)
+            status = await db_async.get_ticket_status(message.channel.id)
             if status != 'active': # Only chat if not active (meaning still pending/draft)
-                # Add user message to history
-                conversation_manager.add_user_message(message.channel.id, message.content)
+                # Prepare Message with Attachments
+                user_message_content = message.content
+                if message.attachments:
+                    attachment_list = "\n".join([f"<Attachment: {a.url}>" for a in message.attachments])
+                    user_message_content += f"\n\n[System Note: User uploaded files]\n{attachment_list}"
+
+                # Add user message to history (attachment-only messages keep their file list)
+                await db_async.run_write(conversation_manager.add_user_message, message.channel.id, message.content or user_message_content.strip())
+
+                # Trivial messages (thanks, ok, cancel, files only) are answered locally, without a model call
+                route = intent_router.route(message.content, len(message.attachments), draft_pending=message.channel.id in pending_drafts)
+                if route.reply:
+                    await message.channel.send(route.reply)
+                    await db_async.run_write(conversation_manager.add_bot_message, message.channel.id, route.reply)
+                    return
             
                 async with message.channel.typing():
                     # Define Actions (for context, updated structure)
@@ -1696,18 +1754,17 @@ async def on_message(message):
                         "close_ticket"
                     ]
 
-                    # Prepare Message with Attachments
-                    user_message_content = message.content
-                    if message.attachments:
-                        attachment_list = "\n".join([f"<Attachment: {a.url}>" for a in message.attachments])
-                        user_message_content += f"\n\n[System Note: User uploaded files]\n{attachment_list}"
-
-                    # Think
+                    # Think (streamed: the reply shows up and grows while the model is still writing)
+                    streamed_reply = StreamingReply(message.channel)
+                    # Buffered messages are committed on the writer, then history is a pure read
+                    await db_async.run_write(conversation_manager.flush)
                     thought = await brain.think(
                         user_message=user_message_content,
                         available_actions=available_actions, 
-                        history=conversation_manager.get_history(message.channel.id), 
-                        mode="ticket_assistant"
+                        history=await db_async.run_read(conversation_manager.get_history, message.channel.id), 
+                        mode="ticket_assistant",
+                        channel_id=message.channel.id,
+                        on_reply=streamed_reply.update
                     )
                     
                     # Check for Actions
@@ -1716,22 +1773,16 @@ async def on_message(message):
                     proposal_handled = False
                     
                     # Execute Actions
-                    for action in actions:
-                        if "close_ticket" in action:
+                    for action in parse_actions(actions):
+                        if isinstance(action, CloseTicket):
                             await message.channel.send(content="🔒 Closing ticket as requested...")
                             # In a real scenario, we might want to archive it properly
                             await message.channel.delete() 
                             return # Stop processing
                         
-                        if "propose_ticket" in action:
-                            # Parse: propose_ticket | Title | Urgency | Desc
+                        if isinstance(action, ProposeTicket):
                             try:
-                                parts = action.split("|")
-                                # parts[0] is 'propose_ticket '
-                                title = parts[1].strip() if len(parts) > 1 else "Untitled"
-                                urgency = parts[2].strip() if len(parts) > 2 else "Normal"
-                                description = parts[3].strip() if len(parts) > 3 else "No description"
-                                
+                                title, urgency, description = action.title, action.urgency, action.description
                                 
                                 embed = discord.Embed(title="📝 Draft Ticket", color=discord.Color.gold())
                                 embed.add_field(name="Title", value=title, inline=False)
@@ -1741,16 +1792,19 @@ async def on_message(message):
                                 # Use the brain's reply as the content, or a default if empty
                                 content_msg = reply if reply else "I have prepared this ticket based on our conversation. Is this correct?"
                                 
-                                await message.channel.send(
-                                    content=content_msg,
+                                # Attach the draft to the streamed reply message
+                                await streamed_reply.finish(
+                                    content_msg,
                                     embed=embed,
                                     view=ProposalView(title, urgency, description, brain, conversation_manager)
                                 )
                                 proposal_handled = True
+                                pending_drafts.add(message.channel.id)
                                 
                                 # Record history since we consumed 'reply'
                                 if reply:
-                                    conversation_manager.add_bot_message(message.channel.id, reply)
+                                    await db_async.run_write(conversation_manager.add_bot_message, message.channel.id, reply)
+                                    summarizer.schedule(message.channel.id)
                                     
                             except Exception as e:
                                 print(f"Failed to parse propose_ticket: {e}")
@@ -1758,8 +1812,10 @@ async def on_message(message):
 
                     # Reply (only if not already consumed by proposal)
                     if reply and not proposal_handled:
-                        await message.channel.send(reply)
-                        conversation_manager.add_bot_message(message.channel.id, reply)
+                        await streamed_reply.finish(reply)
+                        await db_async.run_write(conversation_manager.add_bot_message, message.channel.id, reply)
+                        # Keep the prompt bounded: fold older turns into the summary (in the background)
+                        summarizer.schedule(message.channel.id)
 
 if __name__ == "__main__":
     # --- Singleton Lock ---
@@ -1,22 +1,185 @@
 import sqlite3
 import os
+import atexit
+import base64
+import json
+import re
+import threading
+import time
 from datetime import datetime
+from src.hot_cache import cache as _cache, MISSING
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'bad.db')
 
+# --- Connection Pool ---
+# All three bots share data/bad.db, so connections are opened once, tuned with the
+# PRAGMAs below and then recycled instead of paying connect/close per statement.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))                 # idle connections kept per database file
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))  # wait on locks held by the other bots
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '8192'))      # page cache per connection
+DB_MMAP_SIZE_MB = int(os.getenv('DB_MMAP_SIZE_MB', '64'))
+TICKET_COUNT_TTL_S = float(os.getenv('TICKET_COUNT_TTL_S', '30')) # archive dashboard totals, see count_tickets
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _file_identity(path):
+    """Returns (device, inode) for the database file, or None if it doesn't exist yet."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool instead of closing it."""
+    pool = None
+    file_id = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        """Really closes the underlying connection."""
+        self.pool = None
+        super().close()
+
+class ConnectionPool:
+    """A small pool of reusable, pre-configured connections to a single database file."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            factory=PooledConnection,
+            check_same_thread=False # Connections move between threads, but are only ever checked out once
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        try:
+            # WAL is persistent in the file: readers no longer block the writer (and vice versa)
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Could not enable WAL mode on {self.path}: {e}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.pool = self
+        conn.file_id = _file_identity(self.path)
+        return conn
+
+    def acquire(self):
+        """Checks out an idle connection, opening a new one if none are available."""
+        # If the file was deleted or swapped (backup restore, test fixtures),
+        # connections to the old file must not be handed out again.
+        current_id = _file_identity(self.path)
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.file_id == current_id:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for c in stale:
+            c.discard()
+        return conn if conn is not None else self._open()
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.discard()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def close_all(self):
+        """Closes every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+def _get_pool(path):
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path, DB_POOL_SIZE)
+    return pool
+
+def configure(pool_size=None, busy_timeout_ms=None, cache_size_kb=None, mmap_size_mb=None):
+    """
+    Overrides the connection settings (call once at startup, before the first query).
+    Any already pooled connections are closed so the new settings take effect.
+    """
+    global DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE_MB
+    if pool_size is not None:
+        DB_POOL_SIZE = pool_size
+    if busy_timeout_ms is not None:
+        DB_BUSY_TIMEOUT_MS = busy_timeout_ms
+    if cache_size_kb is not None:
+        DB_CACHE_SIZE_KB = cache_size_kb
+    if mmap_size_mb is not None:
+        DB_MMAP_SIZE_MB = mmap_size_mb
+    close_all_connections()
+
+def close_all_connections():
+    """Closes all pooled connections (on shutdown, or before replacing the database file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+atexit.register(close_all_connections)
+
+def hot_cache():
+    """Returns the in-process hot cache, reset whenever DB_PATH points at another file."""
+    _cache.bind(DB_PATH)
+    return _cache
+
 def get_connection():
-    """Establishes a connection to the SQLite database."""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Returns a pooled connection to the SQLite database.
+    Calling close() on it returns it to the pool.
+    """
+    return _get_pool(DB_PATH).acquire()
 
-def init_db():
-    """Initializes the database with the required schema."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create results table
+# --- Schema Migrations ---
+# Each step runs once, in its own transaction, and is recorded in schema_version.
+# Steps are written to be safe on databases from before the framework (IF NOT
+# EXISTS, column checks), which start at version 0 and replay them all once.
+# To change the schema, append a step: never edit one that has shipped.
+
+def _has_column(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def _add_column(cursor, table, column, definition):
+    if not _has_column(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migration_base_schema(cursor):
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS results (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -26,8 +189,6 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
-    # Create conversations table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS conversations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,8 +199,6 @@ def init_db():
             closed_at TIMESTAMP
         )
     ''')
-
-    # Create messages table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,8 +209,6 @@ def init_db():
             FOREIGN KEY (conversation_id) REFERENCES conversations (id)
         )
     ''')
-
-    # Create tickets table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS tickets (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -70,28 +227,323 @@ def init_db():
     # Index for fast lookups
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_channel_id ON tickets(channel_id)')
 
-    # Migration: Check if archive_path exists
+def _migration_ticket_archive_path(cursor):
+    _add_column(cursor, "tickets", "archive_path", "TEXT")
+
+def _migration_ticket_assigned_to(cursor):
+    _add_column(cursor, "tickets", "assigned_to", "TEXT")
+
+def _migration_conversation_summaries(cursor):
+    # Rolling summary of older messages
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            conversation_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+        )
+    ''')
+    # History windows: seek straight to a conversation's newest/oldest messages
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id)')
+
+def _migration_llm_response_cache(cursor):
+    # Optional persistent backend of src.agent.response_cache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_llm_usage(cursor):
+    # One row per model call, written in batches by src.agent.usage_recorder
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            conversation_id INTEGER,
+            channel_id TEXT,
+            mode TEXT,
+            model TEXT,
+            status TEXT NOT NULL,
+            prompt_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            cached_tokens INTEGER DEFAULT 0,
+            latency_ms REAL,
+            queued_ms REAL,
+            retries INTEGER DEFAULT 0,
+            cost REAL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_usage_channel_id ON llm_usage(channel_id, created_at)')
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS llm_usage_daily AS
+        SELECT date(created_at, 'unixepoch') AS day,
+               COUNT(*) AS calls,
+               SUM(prompt_tokens) AS prompt_tokens,
+               SUM(output_tokens) AS output_tokens,
+               SUM(cost) AS cost,
+               AVG(latency_ms) AS avg_latency_ms,
+               AVG(prompt_tokens + output_tokens) AS tokens_per_call
+        FROM llm_usage
+        GROUP BY day
+    ''')
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS llm_usage_per_ticket AS
+        SELECT u.channel_id,
+               (SELECT t.id FROM tickets t WHERE t.channel_id = u.channel_id ORDER BY t.id DESC LIMIT 1) AS ticket_id,
+               COUNT(*) AS calls,
+               COUNT(DISTINCT u.conversation_id) AS conversations,
+               SUM(u.prompt_tokens) AS prompt_tokens,
+               SUM(u.output_tokens) AS output_tokens,
+               SUM(u.cost) AS cost,
+               AVG(u.latency_ms) AS avg_latency_ms,
+               MAX(u.created_at) AS last_call_at
+        FROM llm_usage u
+        WHERE u.channel_id IS NOT NULL
+        GROUP BY u.channel_id
+    ''')
+
+def _migration_memories(cursor):
+    # Long-term memory store: keyed facts (category, key) and free-form notes (key NULL),
+    # full-text indexed so prompts only carry the memories relevant to the message
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            key TEXT,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            UNIQUE (category, key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+            category, key, content, content='memories', content_rowid='id'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts(rowid, category, key, content) VALUES (new.id, new.category, new.key, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, category, key, content) VALUES ('delete', old.id, old.category, old.key, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE ON memories BEGIN
+            INSERT INTO memories_fts(memories_fts, rowid, category, key, content) VALUES ('delete', old.id, old.category, old.key, old.content);
+            INSERT INTO memories_fts(rowid, category, key, content) VALUES (new.id, new.category, new.key, new.content);
+        END
+    ''')
+
+def _migration_ticket_search(cursor):
+    # Full-text search over tickets (kept in sync by triggers) and archived transcripts
+    # (one row per ticket, rowid = ticket id, filled by index_archive_transcript)
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+            title, description, user_name, content='tickets', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5(
+            content, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+            INSERT INTO tickets_fts(rowid, title, description, user_name) VALUES (new.id, new.title, new.description, new.user_name);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+            INSERT INTO tickets_fts(tickets_fts, rowid, title, description, user_name) VALUES ('delete', old.id, old.title, old.description, old.user_name);
+            DELETE FROM archive_fts WHERE rowid = old.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF title, description, user_name ON tickets BEGIN
+            INSERT INTO tickets_fts(tickets_fts, rowid, title, description, user_name) VALUES ('delete', old.id, old.title, old.description, old.user_name);
+            INSERT INTO tickets_fts(rowid, title, description, user_name) VALUES (new.id, new.title, new.description, new.user_name);
+        END
+    ''')
+    # Index the tickets created before the search index
+    cursor.execute("INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')")
+
+def _migration_archive_paging_indexes(cursor):
+    # Archive dashboard: keyset pages over (created_at, id) within a status, per user or for everyone
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status, created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_user_status_created ON tickets(user_id, status, created_at, id)')
+
+def _migration_urgency_score(cursor):
+    _add_column(cursor, "tickets", "urgency_score", "INTEGER")
+    _backfill_urgency_scores(cursor)
+    # Queues and urgent lists: range scans in priority order within a status
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_status_urgency ON tickets(status, urgency_score DESC, created_at)')
+
+def _migration_ticket_stats(cursor):
+    # Dashboard counters (one row), kept current by triggers on every ticket insert,
+    # delete and status/assignment/urgency change, from any process
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ticket_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_open INTEGER NOT NULL DEFAULT 0,
+            unassigned INTEGER NOT NULL DEFAULT 0,
+            urgent INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    open_new, open_old = _ticket_stats_terms("new."), _ticket_stats_terms("old.")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ticket_stats_ai AFTER INSERT ON tickets BEGIN
+            UPDATE ticket_stats SET total_open = total_open + {open_new[0]}, unassigned = unassigned + {open_new[1]},
+                urgent = urgent + {open_new[2]} WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ticket_stats_ad AFTER DELETE ON tickets BEGIN
+            UPDATE ticket_stats SET total_open = total_open - {open_old[0]}, unassigned = unassigned - {open_old[1]},
+                urgent = urgent - {open_old[2]} WHERE id = 1;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ticket_stats_au AFTER UPDATE OF status, assigned_to, urgency_score ON tickets BEGIN
+            UPDATE ticket_stats SET total_open = total_open + {open_new[0]} - {open_old[0]},
+                unassigned = unassigned + {open_new[1]} - {open_old[1]},
+                urgent = urgent + {open_new[2]} - {open_old[2]} WHERE id = 1;
+        END
+    ''')
+    _rebuild_ticket_stats(cursor)
+
+def _migration_archive_blobs(cursor):
+    # Content-addressed attachment store (src/blob_store.py): one row per blob, with a
+    # reference count kept by triggers on the (transcript directory, blob) references
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_blob_refs (
+            archive_path TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (archive_path, sha256)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_blobs_refs ON archive_blobs(refs, created_at)')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS archive_blob_refs_ai AFTER INSERT ON archive_blob_refs BEGIN
+            UPDATE archive_blobs SET refs = refs + 1 WHERE sha256 = new.sha256;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS archive_blob_refs_ad AFTER DELETE ON archive_blob_refs BEGIN
+            UPDATE archive_blobs SET refs = refs - 1 WHERE sha256 = old.sha256;
+        END
+    ''')
+
+def _migration_archive_checkpoints(cursor):
+    # Resumable archival (src/archive_log.py): how far each channel's history is archived
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_checkpoints (
+            channel_id TEXT PRIMARY KEY,
+            ticket_id INTEGER,
+            archive_path TEXT NOT NULL,
+            last_message_id TEXT,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            log_size INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+# (version, name, step): append only
+MIGRATIONS = [
+    (1, "base schema", _migration_base_schema),
+    (2, "tickets.archive_path", _migration_ticket_archive_path),
+    (3, "tickets.assigned_to", _migration_ticket_assigned_to),
+    (4, "conversation summaries", _migration_conversation_summaries),
+    (5, "llm response cache", _migration_llm_response_cache),
+    (6, "llm usage ledger", _migration_llm_usage),
+    (7, "memories", _migration_memories),
+    (8, "ticket search index", _migration_ticket_search),
+    (9, "archive paging indexes", _migration_archive_paging_indexes),
+    (10, "tickets.urgency_score", _migration_urgency_score),
+    (11, "ticket stats", _migration_ticket_stats),
+    (12, "archive blobs", _migration_archive_blobs),
+    (13, "archive checkpoints", _migration_archive_checkpoints),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(cursor=None):
+    """The version of the last migration applied to the database (0 before the framework)."""
+    conn = None
+    if cursor is None:
+        conn = get_connection()
+        cursor = conn.cursor()
     try:
-        cursor.execute("SELECT archive_path FROM tickets LIMIT 1")
-    except sqlite3.OperationalError:
-        print("⚠️ Migrating Database: Adding archive_path to tickets table...")
-        try:
-             cursor.execute("ALTER TABLE tickets ADD COLUMN archive_path TEXT")
-        except Exception as e:
-             print(f"❌ Migration failed: {e}")
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        version = cursor.fetchone()[0] or 0
+    except sqlite3.OperationalError: # No schema_version table yet
+        version = 0
+    if conn is not None:
+        conn.close()
+    return version
+
+def pending_migrations(version):
+    return [(v, name) for v, name, _ in MIGRATIONS if v > version]
 
-    # Migration: Check if assigned_to exists
+def init_db(dry_run=False):
+    """
+    Brings the database schema up to date. The fast path, when it already is, is a
+    single query. With dry_run=True nothing is changed. Returns the (version, name)
+    of the migrations that are (or, on a dry run, would be) applied.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT assigned_to FROM tickets LIMIT 1")
-    except sqlite3.OperationalError:
-        print("⚠️ Migrating Database: Adding assigned_to to tickets table...")
-        try:
-             cursor.execute("ALTER TABLE tickets ADD COLUMN assigned_to TEXT")
-        except Exception as e:
-             print(f"❌ Migration failed: {e}")
+        version = get_schema_version(cursor)
+        if version >= SCHEMA_VERSION or dry_run:
+            return pending_migrations(version)
 
-    conn.commit()
-    conn.close()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        applied = []
+        for step_version, name, step in MIGRATIONS:
+            if step_version <= version:
+                continue
+            cursor.execute("BEGIN IMMEDIATE") # Takes the write lock: the other bots wait here
+            try:
+                # Another process may have applied it while we waited for the lock
+                cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (step_version,))
+                if cursor.fetchone():
+                    conn.rollback()
+                    continue
+                print(f"⚠️ Migrating Database: {step_version} {name}...")
+                step(cursor)
+                cursor.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (step_version, name))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Migration {step_version} ({name}) failed: {e}")
+                raise
+            applied.append((step_version, name))
+        return applied
+    finally:
+        conn.close()
 
 def create_ticket_record(channel_id, guild_id, user_id, user_name):
     """Creates a new ticket record and returns the ticket ID."""
@@ -104,19 +556,77 @@ def create_ticket_record(channel_id, guild_id, user_id, user_name):
     conn.commit()
     ticket_id = cursor.lastrowid
     conn.close()
+    _ticket_counts.clear()
+    hot_cache().invalidate_ticket(channel_id)
     return ticket_id
 
+# --- Urgency ---
+# Free-text urgency ("10 - Critical", "High", "9", "Medium") is parsed once at write
+# time into tickets.urgency_score, 1-10 as in TICKET_ASSISTANT_PROMPT
+URGENT_SCORE = 7 # "High" and above; part of the ticket_stats trigger definitions
+URGENCY_BANDS = {"Critical": (10, 10), "High": (7, 10), "Medium": (4, 6), "Low": (1, 3)}
+_URGENCY_NUMBER = re.compile(r"\b(10|[1-9])\b")
+_URGENCY_WORDS = [("critical", 10), ("emergency", 10), ("blocker", 10), ("high", 8), ("urgent", 9),
+                  ("medium", 5), ("moderate", 5), ("normal", 5), ("low", 2), ("minor", 2)]
+
+def parse_urgency_score(urgency):
+    """The 1-10 score of a free-text urgency: its first number, else a keyword; None if neither."""
+    if not urgency:
+        return None
+    text = str(urgency).lower()
+    match = _URGENCY_NUMBER.search(text)
+    if match:
+        return int(match.group(1))
+    for word, score in _URGENCY_WORDS:
+        if word in text:
+            return score
+    return None
+
+def _backfill_urgency_scores(cursor, batch_size=500):
+    updated, last_id = 0, 0
+    while True:
+        cursor.execute('''
+            SELECT id, urgency FROM tickets
+            WHERE urgency_score IS NULL AND urgency IS NOT NULL AND id > ?
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+        scores = [(parse_urgency_score(urgency), ticket_id) for ticket_id, urgency in rows]
+        scores = [(score, ticket_id) for score, ticket_id in scores if score is not None]
+        cursor.executemany('UPDATE tickets SET urgency_score = ? WHERE id = ?', scores)
+        updated += len(scores)
+
+def backfill_urgency_scores(batch_size=500):
+    """Scores tickets that have an urgency but no urgency_score (rows written before the column). Returns the count."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    updated = _backfill_urgency_scores(cursor, batch_size)
+    conn.commit()
+    conn.close()
+    return updated
+
+def _urgency_filter(urgency, column_prefix=""):
+    """SQL clause and params for an urgency filter: a band name (see URGENCY_BANDS) or legacy substring match."""
+    if urgency in URGENCY_BANDS:
+        return f"{column_prefix}urgency_score BETWEEN ? AND ?", list(URGENCY_BANDS[urgency])
+    return f"{column_prefix}urgency LIKE ?", [f"%{urgency}%"]
+
 def update_ticket_details(channel_id, title, description, urgency):
     """Updates ticket details (usually from draft)."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE tickets 
-        SET title = ?, description = ?, urgency = ?
+        SET title = ?, description = ?, urgency = ?, urgency_score = ?
         WHERE channel_id = ?
-    ''', (title, description, urgency, str(channel_id)))
+    ''', (title, description, urgency, parse_urgency_score(urgency), str(channel_id)))
     conn.commit()
     conn.close()
+    _ticket_counts.clear()
+    hot_cache().invalidate_ticket(channel_id)
 
 def update_ticket_status(channel_id, status):
     """Updates the status of a ticket."""
@@ -138,17 +648,46 @@ def update_ticket_status(channel_id, status):
         
     conn.commit()
     conn.close()
+    _ticket_counts.clear()
+    hot_cache().invalidate_ticket(channel_id)
+
+def update_ticket_channel(ticket_id, channel_id, status=None):
+    """Points a ticket record at a (new) channel, optionally updating its status."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if status:
+        cursor.execute('''
+            UPDATE tickets
+            SET channel_id = ?, status = ?
+            WHERE id = ?
+        ''', (str(channel_id), status, ticket_id))
+    else:
+        cursor.execute('''
+            UPDATE tickets
+            SET channel_id = ?
+            WHERE id = ?
+        ''', (str(channel_id), ticket_id))
+    conn.commit()
+    conn.close()
+    hot_cache().invalidate_ticket_id(ticket_id)
+    _ticket_counts.clear()
+    hot_cache().invalidate_ticket(channel_id)
 
 def get_ticket(channel_id):
     """Retrieves ticket data by channel ID."""
+    cached = hot_cache().get_ticket(channel_id)
+    if cached is not MISSING:
+        return cached
+
+    generation = hot_cache().ticket_generation(channel_id) # Taken first: a write meanwhile makes this row stale
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM tickets WHERE channel_id = ?', (str(channel_id),))
     row = cursor.fetchone()
     conn.close()
-    if row:
-        return dict(row)
-    return None
+    ticket = dict(row) if row else None
+    hot_cache().set_ticket(channel_id, ticket, generation)
+    return ticket
 
 def update_ticket_assignment(channel_id, user_id):
     """Updates the assigned user for a ticket."""
@@ -161,16 +700,14 @@ def update_ticket_assignment(channel_id, user_id):
     ''', (str(user_id) if user_id else None, str(channel_id)))
     conn.commit()
     conn.close()
+    hot_cache().invalidate_ticket(channel_id)
 
 def get_ticket_status(channel_id):
     """Retrieves the status of a ticket."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT status FROM tickets WHERE channel_id = ?', (str(channel_id),))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return row[0]
+    # Served from the hot cache (the whole row is loaded once on a miss)
+    ticket = get_ticket(channel_id)
+    if ticket:
+        return ticket['status']
     return None
 
 def get_closed_tickets():
@@ -197,6 +734,8 @@ def mark_ticket_archived(channel_id):
     ''', (str(channel_id),))
     conn.commit()
     conn.close()
+    _ticket_counts.clear()
+    hot_cache().invalidate_ticket(channel_id)
 
 def update_archive_path(channel_id, path):
     """Updates the archive path for a ticket."""
@@ -209,6 +748,7 @@ def update_archive_path(channel_id, path):
     ''', (path, str(channel_id)))
     conn.commit()
     conn.close()
+    hot_cache().invalidate_ticket(channel_id)
 
 def get_archive_path(ticket_id):
     """Retrieves the archive path by ticket ID."""
@@ -245,8 +785,36 @@ def get_ticket_by_id(ticket_id):
         return dict(row)
     return None
 
-def get_ticket_stats():
-    """Returns statistics for tickets."""
+def _ticket_stats_terms(prefix=""):
+    """SQL for whether a row ("new."/"old." in triggers) counts as (open, unassigned, urgent), each 0 or 1."""
+    is_open = f"({prefix}status = 'active')"
+    return (
+        is_open,
+        f"({is_open} AND ({prefix}assigned_to IS NULL OR {prefix}assigned_to = ''))",
+        f"({is_open} AND COALESCE({prefix}urgency_score >= {URGENT_SCORE}, 0))",
+    )
+
+def _rebuild_ticket_stats(cursor):
+    is_open, unassigned, urgent = _ticket_stats_terms()
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO ticket_stats (id, total_open, unassigned, urgent)
+        SELECT 1, COALESCE(SUM({is_open}), 0), COALESCE(SUM({unassigned}), 0), COALESCE(SUM({urgent}), 0)
+        FROM tickets
+    ''')
+
+def rebuild_ticket_stats():
+    """Recounts ticket_stats from the tickets table (the triggers keep it current otherwise)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    _rebuild_ticket_stats(cursor)
+    conn.commit()
+    conn.close()
+
+def get_ticket_stats(active_limit=25, urgent_limit=5):
+    """
+    Returns statistics for tickets: the ticket_stats counters plus the newest
+    `active_limit` active tickets and the `urgent_limit` most urgent ones.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -254,23 +822,27 @@ def get_ticket_stats():
         "total_open": 0,
         "unassigned": 0,
         "urgent": 0,
-        "active_list": []
+        "active_list": [],
+        "urgent_list": []
     }
     
     # Get Counts
-    cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'active'")
-    stats['total_open'] = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'active' AND (assigned_to IS NULL OR assigned_to = '')")
-    stats['unassigned'] = cursor.fetchone()[0]
-    
-    # Urgency check (loose string match)
-    cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'active' AND (urgency LIKE '%High%' OR urgency LIKE '%10%' OR urgency LIKE '%9%' OR urgency LIKE '%Urgent%')")
-    stats['urgent'] = cursor.fetchone()[0]
+    cursor.execute("SELECT total_open, unassigned, urgent FROM ticket_stats WHERE id = 1")
+    row = cursor.fetchone()
+    if row:
+        stats.update(dict(row))
     
-    # Get Active List
-    cursor.execute("SELECT * FROM tickets WHERE status = 'active' ORDER BY created_at DESC")
+    # Get Active List (seeks idx_tickets_status_created, stops after the limit)
+    cursor.execute("SELECT * FROM tickets WHERE status = 'active' ORDER BY created_at DESC, id DESC LIMIT ?", (active_limit,))
     stats['active_list'] = [dict(row) for row in cursor.fetchall()]
+
+    if stats['urgent']:
+        # Range scan of idx_tickets_status_urgency: highest score first, oldest first within a score
+        cursor.execute('''
+            SELECT * FROM tickets WHERE status = 'active' AND urgency_score >= ?
+            ORDER BY urgency_score DESC, created_at ASC LIMIT ?
+        ''', (URGENT_SCORE, urgent_limit))
+        stats['urgent_list'] = [dict(row) for row in cursor.fetchall()]
     
     conn.close()
     return stats
@@ -279,15 +851,12 @@ def get_unassigned_tickets(limit=5):
     """Retrieves unassigned active tickets, prioritizing urgency."""
     conn = get_connection()
     cursor = conn.cursor()
-    # Sort by urgency (descending string sort isn't perfect but 'High' > 'Low' alphabetically? No. 
-    # Logic: urgency is text. We should probably sort by created_at for FIFO or implement urgency weights.
-    # Current system uses text: "10 - Critical", "Medium", etc.
-    # Let's just sort by created_at ASC (Oldest first) for fairness, or maybe filtered by urgency keyword?
-    # Simple approach: Oldest unassigned first.
+    # Highest urgency_score first (unscored last), oldest first within a score:
+    # walks idx_tickets_status_urgency in order and stops after `limit`
     cursor.execute('''
         SELECT * FROM tickets 
         WHERE status = 'active' AND (assigned_to IS NULL OR assigned_to = '')
-        ORDER BY created_at ASC
+        ORDER BY urgency_score DESC, created_at ASC
         LIMIT ?
     ''', (limit,))
     rows = cursor.fetchall()
@@ -308,8 +877,13 @@ def get_assigned_tickets(user_id):
     return [dict(row) for row in rows]
 
 def get_all_active_tickets():
-     stats = get_ticket_stats()
-     return stats['active_list']
+    """Retrieves every active ticket, newest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM tickets WHERE status = 'active' ORDER BY created_at DESC, id DESC")
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
 
 def add_result(job_id, file_url, result_type='generic'):
     """Adds a new result record."""
@@ -346,6 +920,8 @@ def get_tickets_with_filter(status=None, user_id=None, limit=10, offset=0, sort_
     
     query = "SELECT * FROM tickets WHERE 1=1"
     params = []
+    # A query with no words (e.g. "!!!") filters nothing
+    search_match = fts_query(search_query, min_length=1, operator="AND", prefix=True) if search_query else None
     
     if status:
         if isinstance(status, list):
@@ -360,16 +936,16 @@ def get_tickets_with_filter(status=None, user_id=None, limit=10, offset=0, sort_
         query += " AND user_id = ?"
         params.append(str(user_id))
 
-    if search_query:
-        # Search in title, user_name, or description
-        query += " AND (title LIKE ? OR user_name LIKE ? OR description LIKE ?)"
-        wildcard_query = f"%{search_query}%"
-        params.extend([wildcard_query, wildcard_query, wildcard_query])
+    if search_match:
+        # Search in title, user_name, or description (full-text index; see search_tickets for ranking)
+        query += " AND id IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ?)"
+        params.append(search_match)
 
     if urgency:
-        # Strict or partial match? Let's do partial for flexibility since it's text
-        query += " AND urgency LIKE ?"
-        params.append(f"%{urgency}%")
+        # A band ("High") compares urgency_score; anything else is a partial text match
+        clause, urgency_params = _urgency_filter(urgency)
+        query += f" AND {clause}"
+        params.extend(urgency_params)
         
     order = "DESC" if sort_desc else "ASC"
     query += f" ORDER BY created_at {order} LIMIT ? OFFSET ?"
@@ -395,14 +971,14 @@ def get_tickets_with_filter(status=None, user_id=None, limit=10, offset=0, sort_
         count_query += " AND user_id = ?"
         count_params.append(str(user_id))
         
-    if search_query:
-        count_query += " AND (title LIKE ? OR user_name LIKE ? OR description LIKE ?)"
-        wildcard_query = f"%{search_query}%"
-        count_params.extend([wildcard_query, wildcard_query, wildcard_query])
+    if search_match:
+        count_query += " AND id IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ?)"
+        count_params.append(search_match)
 
     if urgency:
-        count_query += " AND urgency LIKE ?"
-        count_params.append(f"%{urgency}%")
+        clause, urgency_params = _urgency_filter(urgency)
+        count_query += f" AND {clause}"
+        count_params.extend(urgency_params)
         
     cursor.execute(count_query, count_params)
     total_count = cursor.fetchone()[0]
@@ -410,6 +986,87 @@ def get_tickets_with_filter(status=None, user_id=None, limit=10, offset=0, sort_
     conn.close()
     return [dict(row) for row in rows], total_count
 
+# --- Archive Dashboard Paging ---
+
+_ticket_counts = {} # (db path, filters) -> (expires_at, count); cleared on ticket writes in this process
+
+def _ticket_filters(status=None, user_id=None, urgency=None):
+    clauses, params = [], []
+    if status:
+        statuses = status if isinstance(status, (list, tuple)) else [status]
+        clauses.append(f"status IN ({','.join(['?'] * len(statuses))})")
+        params.extend(statuses)
+    if user_id:
+        clauses.append("user_id = ?")
+        params.append(str(user_id))
+    if urgency:
+        clause, urgency_params = _urgency_filter(urgency)
+        clauses.append(clause)
+        params.extend(urgency_params)
+    return clauses, params
+
+def encode_ticket_cursor(ticket):
+    """Opaque page cursor for a ticket row: its (created_at, id) sort key."""
+    key = json.dumps([ticket['created_at'], ticket['id']])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_ticket_cursor(cursor):
+    created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return created_at, ticket_id
+
+def get_tickets_page(status=None, user_id=None, urgency=None, limit=10, sort_desc=True, after=None, before=None, last=False):
+    """
+    One page of tickets ordered by (created_at, id), without OFFSET: the query seeks
+    straight to the cursor in idx_tickets_*_created. Pass `after` (cursor of the last
+    row shown) for the next page, `before` (cursor of the first row shown) for the
+    previous one, last=True for the last `limit` rows; none of them for the first page.
+    Rows are returned in display order.
+    """
+    backwards = bool(before) or last
+    descending = sort_desc != backwards
+    cursor_value = after or before
+    direction = "DESC" if descending else "ASC"
+    order_by = f"ORDER BY created_at {direction}, id {direction} LIMIT ?"
+
+    # One seek per status, merged: "status IN (...)" would make SQLite sort every match
+    statuses = status if isinstance(status, (list, tuple)) else [status]
+    arms, params = [], []
+    for arm_status in statuses:
+        clauses, arm_params = _ticket_filters(arm_status, user_id, urgency)
+        if cursor_value:
+            clauses.append(f"(created_at, id) {'<' if descending else '>'} (?, ?)")
+            arm_params.extend(decode_ticket_cursor(cursor_value))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        arms.append(f"SELECT * FROM (SELECT * FROM tickets {where} {order_by})")
+        params.extend(arm_params + [limit])
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"{' UNION ALL '.join(arms)} {order_by}", params + [limit])
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows[::-1] if backwards else rows
+
+def count_tickets(status=None, user_id=None, urgency=None, ttl=None):
+    """COUNT(*) for the given filters, cached for TICKET_COUNT_TTL_S so paging doesn't recount."""
+    ttl = TICKET_COUNT_TTL_S if ttl is None else ttl
+    key = (DB_PATH, tuple(status) if isinstance(status, (list, tuple)) else status, str(user_id) if user_id else None, urgency)
+    cached = _ticket_counts.get(key)
+    now = time.monotonic()
+    if ttl > 0 and cached and cached[0] > now:
+        return cached[1]
+
+    clauses, params = _ticket_filters(status, user_id, urgency)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM tickets {where}", params)
+    count = cursor.fetchone()[0]
+    conn.close()
+    if ttl > 0:
+        _ticket_counts[key] = (now + ttl, count)
+    return count
+
 # --- Conversation Management ---
 
 def create_conversation(channel_id, topic=None):
@@ -423,23 +1080,32 @@ def create_conversation(channel_id, topic=None):
     conn.commit()
     conversation_id = cursor.lastrowid
     conn.close()
+    hot_cache().invalidate_channel_conversation(channel_id)
     return conversation_id
 
 def get_active_conversation(channel_id):
     """Retrieves the active conversation for a channel."""
+    cached = hot_cache().get_conversation(channel_id)
+    if cached is not MISSING:
+        return cached
+
+    generation = hot_cache().conversation_generation(channel_id) # Taken first, as in get_ticket()
     conn = get_connection()
     cursor = conn.cursor()
+    # The rolling summary (if any) travels with the conversation so it's cached with it
     cursor.execute('''
-        SELECT * FROM conversations
-        WHERE channel_id = ? AND status = 'active'
-        ORDER BY created_at DESC
+        SELECT c.*, s.summary, s.last_message_id AS summary_until
+        FROM conversations c
+        LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+        WHERE c.channel_id = ? AND c.status = 'active'
+        ORDER BY c.created_at DESC
         LIMIT 1
     ''', (str(channel_id),))
     row = cursor.fetchone()
     conn.close()
-    if row:
-        return dict(row)
-    return None
+    conversation = dict(row) if row else None
+    hot_cache().set_conversation(channel_id, conversation, generation)
+    return conversation
 
 def close_conversation(conversation_id):
     """Closes a conversation."""
@@ -452,6 +1118,7 @@ def close_conversation(conversation_id):
     ''', (conversation_id,))
     conn.commit()
     conn.close()
+    hot_cache().invalidate_conversation(conversation_id)
 
 def delete_conversation(conversation_id):
     """Deletes a conversation and its messages."""
@@ -461,14 +1128,18 @@ def delete_conversation(conversation_id):
     # Enable foreign key support just in case, though we'll delete manually to be safe
     cursor.execute("PRAGMA foreign_keys = ON")
     
-    # Delete messages first
+    # Delete messages and summary first
     cursor.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+    cursor.execute('DELETE FROM conversation_summaries WHERE conversation_id = ?', (conversation_id,))
     
     # Delete conversation
     cursor.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
     
     conn.commit()
+    # Pooled connection: don't leak the pragma into unrelated callers
+    cursor.execute("PRAGMA foreign_keys = OFF")
     conn.close()
+    hot_cache().invalidate_conversation(conversation_id)
 
 def add_message(conversation_id, role, content):
     """Adds a message to a conversation."""
@@ -481,25 +1152,501 @@ def add_message(conversation_id, role, content):
     conn.commit()
     conn.close()
 
-def get_conversation_history(conversation_id, limit=20):
-    """Retrieves the last N messages of a conversation."""
+def add_messages(rows):
+    """Adds several (conversation_id, role, content) messages in a single transaction."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO messages (conversation_id, role, content)
+        VALUES (?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+def get_conversation_history(conversation_id, limit=20, before_id=None, after_id=None, max_chars=None, max_tokens=None):
+    """
+    Retrieves a window of a conversation's messages, oldest first.
+
+    By default returns the latest `limit` messages (limit=None for all of them).
+    Cursor pagination: `before_id` returns the `limit` messages just before that
+    message id, `after_id` the `limit` messages just after it.
+    Budget mode: with `max_chars` / `max_tokens`, returns as many of the most recent
+    messages as fit the budget (tokens are estimated, see estimate_tokens()).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    query = 'SELECT id, role, content, created_at FROM messages WHERE conversation_id = ?'
+    params = [conversation_id]
+    if before_id is not None:
+        query += ' AND id < ?'
+        params.append(before_id)
+    if after_id is not None:
+        query += ' AND id > ?'
+        params.append(after_id)
+    # Walk the (conversation_id, id) index from the end we want, so only the window is read
+    newest_first = after_id is None
+    query += ' ORDER BY id DESC' if newest_first else ' ORDER BY id ASC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    cursor.execute(query, params)
+
+    rows = []
+    chars = tokens = 0
+    for row in cursor: # Lazy: stops reading as soon as the budget is spent
+        if max_chars is not None or max_tokens is not None:
+            chars += len(row['content'])
+            tokens += estimate_tokens(row['content'])
+            if (max_chars is not None and chars > max_chars) or (max_tokens is not None and tokens > max_tokens):
+                break
+        rows.append(dict(row))
+    conn.close()
+
+    if newest_first:
+        rows.reverse()
+    return rows
+
+def get_user_message_texts(max_chars=120, limit=5000):
+    """Recent short user messages (training data for the local intent classifier)."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT role, content FROM messages
-        WHERE conversation_id = ?
-        ORDER BY created_at ASC
-    ''', (conversation_id,)) # Limit should be applying to the *latest* messages, but we want them in ASC order. 
-                             # So we'd need subquery or just fetch all and slice in python if not huge.
-                             # For now, let's just fetch all as context window usually limits us anyway.
-    
-    rows = cursor.fetchall()
+        SELECT content FROM messages WHERE role = 'user' AND length(content) <= ?
+        ORDER BY id DESC LIMIT ?
+    ''', (max_chars, limit))
+    texts = [row['content'] for row in cursor.fetchall()]
+    conn.close()
+    return texts
+
+def save_conversation_summary(conversation_id, summary, last_message_id):
+    """Stores the rolling summary of a conversation's messages up to last_message_id."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO conversation_summaries (conversation_id, summary, last_message_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT(conversation_id) DO UPDATE SET
+            summary = excluded.summary,
+            last_message_id = excluded.last_message_id,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (conversation_id, summary, last_message_id))
+    conn.commit()
+    conn.close()
+    # The cached history window is relative to the old summary
+    hot_cache().invalidate_conversation(conversation_id)
+
+def get_cached_response(cache_key, now):
+    """Returns (response_json, expires_at) of an unexpired cached LLM response, or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT response, expires_at FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?', (cache_key, now))
+    row = cursor.fetchone()
+    conn.close()
+    return (row['response'], row['expires_at']) if row else None
+
+def put_cached_response(cache_key, response, expires_at):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('INSERT OR REPLACE INTO llm_response_cache (cache_key, response, expires_at) VALUES (?, ?, ?)',
+                   (cache_key, response, expires_at))
+    conn.commit()
+    conn.close()
+
+def prune_response_cache(now):
+    """Deletes expired cached LLM responses."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (now,))
+    conn.commit()
+    conn.close()
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) for history budgeting."""
+    return (len(text) + 3) // 4
+
+# --- LLM usage ledger ---
+
+LLM_USAGE_COLUMNS = ('created_at', 'channel_id', 'mode', 'model', 'status', 'prompt_tokens', 'output_tokens',
+                     'cached_tokens', 'latency_ms', 'queued_ms', 'retries', 'cost')
+
+def add_llm_usage(rows):
+    """
+    Inserts several usage records (dicts with LLM_USAGE_COLUMNS) in a single transaction.
+    Each row is attributed to its channel's active conversation, if any.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(f'''
+        INSERT INTO llm_usage (conversation_id, {', '.join(LLM_USAGE_COLUMNS)})
+        VALUES ((SELECT id FROM conversations WHERE channel_id = :channel_id AND status = 'active' ORDER BY id DESC LIMIT 1),
+                {', '.join(':' + c for c in LLM_USAGE_COLUMNS)})
+    ''', [{c: row.get(c) for c in LLM_USAGE_COLUMNS} for row in rows])
+    conn.commit()
+    conn.close()
+
+def _latency_percentile(cursor, since, fraction, count):
+    """Latency at `fraction` (0..1) of the successful calls since `since` (one sorted OFFSET lookup)."""
+    if not count:
+        return None
+    cursor.execute('''
+        SELECT latency_ms FROM llm_usage
+        WHERE created_at >= ? AND status = 'ok' AND latency_ms IS NOT NULL
+        ORDER BY latency_ms LIMIT 1 OFFSET ?
+    ''', (since, int(fraction * (count - 1))))
+    row = cursor.fetchone()
+    return row['latency_ms'] if row else None
+
+def get_llm_usage_summary(since=0):
+    """
+    Totals of LLM calls since the `since` unix timestamp: calls, errors, tokens, cost,
+    retries, tokens per turn (prompt + output per successful call) and p50/p95 latency.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) AS calls,
+               SUM(status != 'ok') AS errors,
+               SUM(status = 'ok' AND latency_ms IS NOT NULL) AS timed,
+               COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+               COALESCE(SUM(output_tokens), 0) AS output_tokens,
+               COALESCE(SUM(cached_tokens), 0) AS cached_tokens,
+               COALESCE(SUM(retries), 0) AS retries,
+               COALESCE(SUM(cost), 0) AS cost,
+               AVG(CASE WHEN status = 'ok' THEN prompt_tokens + output_tokens END) AS tokens_per_turn
+        FROM llm_usage WHERE created_at >= ?
+    ''', (since,))
+    summary = dict(cursor.fetchone())
+    timed = summary.pop('timed') or 0
+    summary['errors'] = summary['errors'] or 0
+    summary['p50_latency_ms'] = _latency_percentile(cursor, since, 0.50, timed)
+    summary['p95_latency_ms'] = _latency_percentile(cursor, since, 0.95, timed)
+    conn.close()
+    return summary
+
+def get_llm_usage_by_mode(since=0):
+    """Per-mode (ticket_assistant, manager, summary, ...) call counts, average prompt/output size and cost."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COALESCE(mode, 'default') AS mode, COUNT(*) AS calls,
+               AVG(prompt_tokens) AS avg_prompt_tokens, AVG(output_tokens) AS avg_output_tokens,
+               AVG(latency_ms) AS avg_latency_ms, SUM(cost) AS cost
+        FROM llm_usage WHERE created_at >= ?
+        GROUP BY COALESCE(mode, 'default') ORDER BY cost DESC
+    ''', (since,))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def get_llm_usage_daily(days=7):
+    """The last `days` rows of the llm_usage_daily view, newest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM llm_usage_daily ORDER BY day DESC LIMIT ?', (days,))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def get_llm_usage_by_ticket(limit=5):
+    """The most expensive channels/tickets from the llm_usage_per_ticket view."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM llm_usage_per_ticket ORDER BY cost DESC LIMIT ?', (limit,))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+# --- Long-term memory ---
+
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def save_memories(entries, now=None):
+    """
+    Stores (category, key, content) memories in one transaction. Keyed entries replace
+    the previous value of their (category, key); entries with key None are appended as notes.
+    """
+    now = now or time.time()
+    conn = get_connection()
+    cursor = conn.cursor()
+    for category, key, content in entries:
+        if key is None:
+            cursor.execute('''
+                INSERT INTO memories (category, key, content, created_at, updated_at) VALUES (?, NULL, ?, ?, ?)
+            ''', (category, content, now, now))
+        else:
+            cursor.execute('''
+                INSERT INTO memories (category, key, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(category, key) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at
+            ''', (category, key, content, now, now))
+    conn.commit()
+    conn.close()
+
+def delete_memory(memory_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM memories WHERE id = ?', (memory_id,))
+    conn.commit()
+    conn.close()
+
+def get_keyed_memories():
+    """All keyed memories (category, key, content), most recently updated first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, category, key, content, updated_at FROM memories
+        WHERE key IS NOT NULL ORDER BY updated_at DESC, id DESC
+    ''')
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def get_memory_version():
+    """Cheap change marker of the keyed memories (count, last update)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) AS n, MAX(updated_at) AS last FROM memories WHERE key IS NOT NULL')
+    row = cursor.fetchone()
+    conn.close()
+    return (row['n'], row['last'])
+
+def count_memories():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM memories')
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def fts_query(text, max_terms=16, min_length=3, operator="OR", prefix=False):
+    """
+    Turns free text into a safe FTS5 query of its distinct words (None if it has none).
+    Every word is quoted, so user input never acts as FTS syntax; with prefix=True the
+    last word also matches as a prefix ("prin" finds "printer").
+    """
+    terms = []
+    for word in _FTS_TOKEN.findall(text.lower()):
+        if len(word) >= min_length and word not in terms:
+            terms.append(word)
+        if len(terms) >= max_terms:
+            break
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return f" {operator} ".join(quoted)
+
+def search_memories(text, limit=5, notes_only=False):
+    """Memories most relevant to `text` (BM25 over category, key and content), best first."""
+    query = fts_query(text)
+    if not query:
+        return []
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT m.id, m.category, m.key, m.content, m.updated_at
+        FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid
+        WHERE memories_fts MATCH ? {'AND m.key IS NULL' if notes_only else ''}
+        ORDER BY bm25(memories_fts) LIMIT ?
+    ''', (query, limit))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+# --- Ticket Search ---
+
+def index_archive_transcript(ticket_id, text):
+    """(Re)indexes the message contents of a ticket's archived transcript."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM archive_fts WHERE rowid = ?', (ticket_id,))
+    if text:
+        cursor.execute('INSERT INTO archive_fts(rowid, content) VALUES (?, ?)', (ticket_id, text))
+    conn.commit()
+    conn.close()
+
+def rebuild_ticket_search_index():
+    """Re-indexes every ticket's title, description and user name."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+
+def search_tickets(search_query, status=None, user_id=None, urgency=None, limit=10, offset=0, order='rank'):
+    """
+    Ranked full-text search over ticket title, description, user name and archived
+    transcript messages. Every word must match (the last one as a prefix).
+    Returns (tickets, total_count); each ticket also has a `snippet` with the matched
+    words in **bold** and a `score` (lower is better). order: 'rank', 'newest' or 'oldest'.
+    A query with no words (e.g. "!!!") filters nothing: the filtered tickets are listed
+    by date, without snippet or score.
+    """
+    match = fts_query(search_query or "", min_length=1, operator="AND", prefix=True)
+    if not match:
+        return get_tickets_with_filter(status=status, user_id=user_id, urgency=urgency,
+                                       limit=limit, offset=offset, sort_desc=order != 'oldest')
+
+    filters, params = [], [match, match]
+    if status:
+        statuses = status if isinstance(status, list) else [status]
+        filters.append(f"t.status IN ({','.join(['?'] * len(statuses))})")
+        params.extend(statuses)
+    if user_id:
+        filters.append("t.user_id = ?")
+        params.append(str(user_id))
+    if urgency:
+        clause, urgency_params = _urgency_filter(urgency, "t.")
+        filters.append(clause)
+        params.extend(urgency_params)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    order_by = {
+        'newest': "t.created_at DESC, t.id DESC",
+        'oldest': "t.created_at ASC, t.id ASC",
+    }.get(order, "best.score, t.id DESC")
+
+    # Ticket fields weigh more than transcript text; the best match of each ticket
+    # supplies its snippet (SQLite takes bare columns from the MIN() row)
+    query = f'''
+        WITH matches AS (
+            SELECT rowid AS ticket_id, bm25(tickets_fts, 10.0, 3.0, 5.0) AS score,
+                   snippet(tickets_fts, -1, '**', '**', '…', 12) AS snippet
+            FROM tickets_fts WHERE tickets_fts MATCH ?
+            UNION ALL
+            SELECT rowid, bm25(archive_fts), snippet(archive_fts, 0, '**', '**', '…', 12)
+            FROM archive_fts WHERE archive_fts MATCH ?
+        ),
+        best AS (SELECT ticket_id, MIN(score) AS score, snippet FROM matches GROUP BY ticket_id)
+        SELECT t.*, best.score, best.snippet, COUNT(*) OVER () AS total_count
+        FROM best JOIN tickets t ON t.id = best.ticket_id
+        {where}
+        ORDER BY {order_by} LIMIT ? OFFSET ?
+    '''
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params + [limit, offset])
+    rows = [dict(row) for row in cursor.fetchall()]
+    if rows:
+        total_count = rows[0]['total_count']
+    elif offset:
+        # Paged past the end: the window count isn't available
+        cursor.execute(f"SELECT COUNT(*) FROM ({query})", params + [-1, 0])
+        total_count = cursor.fetchone()[0]
+    else:
+        total_count = 0
+    conn.close()
+    for row in rows:
+        del row['total_count']
+    return rows, total_count
+
+# --- Archive Blobs ---
+
+def add_archive_blob(sha256, size, now=None):
+    """Registers a blob, or renews a known one's grace period before it gets referenced again."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO archive_blobs (sha256, size, created_at) VALUES (?, ?, ?)
+        ON CONFLICT(sha256) DO UPDATE SET created_at = excluded.created_at
+    ''', (sha256, size, time.time() if now is None else now))
+    conn.commit()
+    conn.close()
+
+def set_archive_blob_refs(archive_path, hashes):
+    """Replaces the set of blobs a transcript directory references (empty drops them all)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM archive_blob_refs WHERE archive_path = ?', (archive_path,))
+    cursor.executemany('INSERT OR IGNORE INTO archive_blob_refs (archive_path, sha256) VALUES (?, ?)',
+                       [(archive_path, h) for h in hashes])
+    conn.commit()
+    conn.close()
+
+def add_archive_blob_refs(archive_path, hashes):
+    """Adds blobs to those a transcript directory references (keeping the ones it has)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT OR IGNORE INTO archive_blob_refs (archive_path, sha256) VALUES (?, ?)',
+                       [(archive_path, h) for h in hashes])
+    conn.commit()
+    conn.close()
+
+def get_archive_blob_ref_paths():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT archive_path FROM archive_blob_refs')
+    paths = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return paths
+
+def get_archive_blob_hashes():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT sha256 FROM archive_blobs')
+    hashes = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return hashes
+
+def get_archive_blob(sha256):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM archive_blobs WHERE sha256 = ?', (sha256,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_unreferenced_blobs(created_before):
+    """Blobs with no references, registered before `created_before` (epoch seconds)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT sha256, size FROM archive_blobs WHERE refs <= 0 AND created_at < ?', (created_before,))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def delete_archive_blob(sha256, created_before):
+    """Forgets a blob if it is still unreferenced and unrenewed. Returns whether it was deleted."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM archive_blobs WHERE sha256 = ? AND refs <= 0 AND created_at < ?', (sha256, created_before))
+    deleted = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return deleted
+
+# --- Archive Checkpoints ---
+
+def get_archive_checkpoint(channel_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM archive_checkpoints WHERE channel_id = ?', (str(channel_id),))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def save_archive_checkpoint(channel_id, ticket_id, archive_path, last_message_id, message_count, log_size):
+    """
+    Records how far a channel's history has been archived (replacing the previous checkpoint).
+    An archive is continued by one channel at a time: others checkpointed into it are released.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM archive_checkpoints WHERE archive_path = ? AND channel_id != ?', (archive_path, str(channel_id)))
+    cursor.execute('''
+        INSERT OR REPLACE INTO archive_checkpoints
+            (channel_id, ticket_id, archive_path, last_message_id, message_count, log_size, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (str(channel_id), ticket_id, archive_path, None if last_message_id is None else str(last_message_id),
+          message_count, log_size, time.time()))
+    conn.commit()
     conn.close()
-    
-    # If we need to implement limit efficiently on DB side:
-    # SELECT * FROM (SELECT * FROM messages WHERE ... ORDER BY created_at DESC LIMIT 20) ORDER BY created_at ASC
-    
-    return [dict(row) for row in rows]
 
 if __name__ == "__main__":
-    init_db()
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to bad.db.")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+    steps = init_db(dry_run=args.dry_run)
+    verb = "Pending" if args.dry_run else "Applied"
+    print(f"{verb}: {', '.join(f'{v} {name}' for v, name in steps) or 'none'} (schema version {SCHEMA_VERSION})")
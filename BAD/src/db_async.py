@@ -0,0 +1,127 @@
+"""
+Async facade over src.db for code running on the Discord event loop.
+
+The helpers in src.db are plain blocking sqlite calls. Calling them straight from
+an `async` handler stalls the whole gateway loop while SQLite waits on a lock or
+fsyncs a commit. Every function here has the same name and arguments as its
+src.db counterpart but runs off the loop:
+
+- writes are queued onto ONE dedicated writer thread, so this process never
+  competes with itself for the SQLite write lock;
+- reads run on a small pool of reader threads (WAL lets them proceed while a
+  write is in flight).
+
+Usage:
+    from src import db_async
+    ticket = await db_async.get_ticket(channel.id)
+    await db_async.update_ticket_status(channel.id, 'closed')
+
+Composite operations (e.g. ConversationManager methods) can be pushed through the
+same threads with `await db_async.run_write(func, *args)` / `run_read(...)`.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src import db
+
+DB_READER_THREADS = int(os.getenv('DB_READER_THREADS', '4'))
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=DB_READER_THREADS, thread_name_prefix="db-reader")
+
+async def run_read(func, *args, **kwargs):
+    """Runs a blocking read-only callable on a reader thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(func, *args, **kwargs))
+
+async def run_write(func, *args, **kwargs):
+    """Runs a blocking callable that writes on the dedicated writer thread (FIFO)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, functools.partial(func, *args, **kwargs))
+
+def _reader(name):
+    # Resolve db.<name> at call time so tests can patch/swap src.db freely
+    async def wrapper(*args, **kwargs):
+        return await run_read(getattr(db, name), *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = getattr(db, name).__doc__
+    return wrapper
+
+def _writer_fn(name):
+    async def wrapper(*args, **kwargs):
+        return await run_write(getattr(db, name), *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = getattr(db, name).__doc__
+    return wrapper
+
+def shutdown(wait=True):
+    """Stops the worker threads. Pending writes are completed first when wait=True."""
+    _writer.shutdown(wait=wait)
+    _readers.shutdown(wait=wait)
+
+# --- Tickets ---
+get_ticket = _reader("get_ticket")
+get_ticket_by_id = _reader("get_ticket_by_id")
+get_ticket_status = _reader("get_ticket_status")
+get_closed_tickets = _reader("get_closed_tickets")
+get_archive_path = _reader("get_archive_path")
+get_user_tickets = _reader("get_user_tickets")
+get_ticket_stats = _reader("get_ticket_stats")
+get_unassigned_tickets = _reader("get_unassigned_tickets")
+get_assigned_tickets = _reader("get_assigned_tickets")
+get_all_active_tickets = _reader("get_all_active_tickets")
+get_tickets_with_filter = _reader("get_tickets_with_filter")
+search_tickets = _reader("search_tickets")
+get_tickets_page = _reader("get_tickets_page")
+count_tickets = _reader("count_tickets")
+
+create_ticket_record = _writer_fn("create_ticket_record")
+update_ticket_details = _writer_fn("update_ticket_details")
+update_ticket_status = _writer_fn("update_ticket_status")
+update_ticket_assignment = _writer_fn("update_ticket_assignment")
+update_ticket_channel = _writer_fn("update_ticket_channel")
+mark_ticket_archived = _writer_fn("mark_ticket_archived")
+update_archive_path = _writer_fn("update_archive_path")
+index_archive_transcript = _writer_fn("index_archive_transcript")
+
+# --- Archive checkpoints ---
+get_archive_checkpoint = _reader("get_archive_checkpoint")
+save_archive_checkpoint = _writer_fn("save_archive_checkpoint")
+
+# --- Results ---
+get_latest_result = _reader("get_latest_result")
+add_result = _writer_fn("add_result")
+
+# --- Conversations ---
+get_active_conversation = _reader("get_active_conversation")
+get_conversation_history = _reader("get_conversation_history")
+get_user_message_texts = _reader("get_user_message_texts")
+
+create_conversation = _writer_fn("create_conversation")
+close_conversation = _writer_fn("close_conversation")
+delete_conversation = _writer_fn("delete_conversation")
+add_message = _writer_fn("add_message")
+add_messages = _writer_fn("add_messages")
+save_conversation_summary = _writer_fn("save_conversation_summary")
+
+# --- LLM response cache ---
+get_cached_response = _reader("get_cached_response")
+put_cached_response = _writer_fn("put_cached_response")
+prune_response_cache = _writer_fn("prune_response_cache")
+
+# --- LLM usage ledger ---
+get_llm_usage_summary = _reader("get_llm_usage_summary")
+get_llm_usage_by_mode = _reader("get_llm_usage_by_mode")
+get_llm_usage_daily = _reader("get_llm_usage_daily")
+get_llm_usage_by_ticket = _reader("get_llm_usage_by_ticket")
+add_llm_usage = _writer_fn("add_llm_usage")
+
+# --- Long-term memory ---
+get_keyed_memories = _reader("get_keyed_memories")
+get_memory_version = _reader("get_memory_version")
+count_memories = _reader("count_memories")
+search_memories = _reader("search_memories")
+save_memories = _writer_fn("save_memories")
+delete_memory = _writer_fn("delete_memory")
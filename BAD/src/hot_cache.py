@@ -0,0 +1,315 @@
+"""
+In-process hot cache for the ticket chat path, keyed by channel_id.
+
+Each entry holds what a chat turn needs: the ticket row, the active conversation
+and a bounded deque of recent formatted history lines ("User: ...", "Bot: ...").
+src.db reads through it and invalidates it on every ticket/conversation mutation,
+and ConversationManager appends new lines write-through, so a steady-state turn
+needs no database reads at all.
+
+Entries are evicted least-recently-used once their estimated size passes
+HOT_CACHE_MAX_MB. The cache is per process: changes made to bad.db by another
+process (the other bots, scripts/manage_conversations.py) are not seen until
+eviction, except for ticket rows and active conversations, which expire after
+HOT_CACHE_TICKET_TTL_S and HOT_CACHE_CONVERSATION_TTL_S.
+
+Rows loaded from the database are only cached if nothing invalidated them while
+they were being read (see the generation tokens below).
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+HOT_CACHE_MAX_MB = float(os.getenv('HOT_CACHE_MAX_MB', '32'))
+HOT_CACHE_HISTORY_LINES = int(os.getenv('HOT_CACHE_HISTORY_LINES', '50'))
+HOT_CACHE_TICKET_TTL_S = float(os.getenv('HOT_CACHE_TICKET_TTL_S', '10'))
+HOT_CACHE_CONVERSATION_TTL_S = float(os.getenv('HOT_CACHE_CONVERSATION_TTL_S', '10'))
+
+MISSING = object()
+
+class _Entry:
+    __slots__ = ("ticket", "ticket_expires", "ticket_generation", "conversation", "conversation_expires",
+                 "conversation_generation", "history", "history_complete", "generation", "size")
+
+    def __init__(self):
+        self.ticket = MISSING
+        self.ticket_expires = 0
+        self.ticket_generation = 0 # Bumped on every ticket invalidation, see set_ticket()
+        self.conversation = MISSING
+        self.conversation_expires = 0
+        self.conversation_generation = 0 # Bumped on every conversation invalidation, see set_conversation()
+        self.history = None
+        self.history_complete = False
+        self.generation = 0 # Bumped on every history change, see set_history()
+        self.size = 0
+
+    def recompute_size(self):
+        size = 200 # Rough per-entry overhead
+        if isinstance(self.ticket, dict):
+            size += sum(len(str(v)) for v in self.ticket.values()) + 50 * len(self.ticket)
+        if isinstance(self.conversation, dict):
+            size += sum(len(str(v)) for v in self.conversation.values()) + 50 * len(self.conversation)
+        if self.history:
+            size += sum(sys.getsizeof(line) for line in self.history)
+        self.size = size
+
+class HotCache:
+    def __init__(self, max_bytes=int(HOT_CACHE_MAX_MB * 1024 * 1024), history_lines=HOT_CACHE_HISTORY_LINES,
+                 ticket_ttl=HOT_CACHE_TICKET_TTL_S, conversation_ttl=HOT_CACHE_CONVERSATION_TTL_S):
+        self.max_bytes = max_bytes
+        self.history_lines = history_lines
+        self.ticket_ttl = ticket_ttl
+        self.conversation_ttl = conversation_ttl
+        self.db_path = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # channel_id -> _Entry, least recently used first
+        self._conversation_channels = {} # conversation_id -> channel_id
+        self._ticket_channels = {} # ticket id -> channel_id
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    # --- Internal helpers (lock must be held) ---
+
+    def _lookup(self, channel_id):
+        entry = self._entries.get(str(channel_id))
+        if entry is not None:
+            self._entries.move_to_end(str(channel_id))
+        return entry
+
+    def _entry(self, channel_id):
+        entry = self._lookup(channel_id)
+        if entry is None:
+            entry = self._entries[str(channel_id)] = _Entry()
+        return entry
+
+    def _resize(self, entry):
+        self._bytes -= entry.size
+        entry.recompute_size()
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            channel_id, evicted = self._entries.popitem(last=False)
+            self._drop(channel_id, evicted)
+
+    def _drop(self, channel_id, entry):
+        self._bytes -= entry.size
+        self._unmap_ticket(channel_id, entry)
+        if isinstance(entry.conversation, dict):
+            self._conversation_channels.pop(entry.conversation.get('id'), None)
+
+    def _unmap_ticket(self, channel_id, entry):
+        if isinstance(entry.ticket, dict) and self._ticket_channels.get(str(entry.ticket.get('id'))) == str(channel_id):
+            del self._ticket_channels[str(entry.ticket.get('id'))]
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    # --- Tickets ---
+
+    def get_ticket(self, channel_id):
+        """Returns the cached ticket row (None = known not to exist), or MISSING."""
+        with self._lock:
+            entry = self._lookup(channel_id)
+            hit = entry is not None and entry.ticket is not MISSING and time.monotonic() < entry.ticket_expires
+            self._record(hit)
+            if not hit:
+                return MISSING
+            return dict(entry.ticket) if entry.ticket else None
+
+    def ticket_generation(self, channel_id):
+        """Token to pass to set_ticket() when loading a ticket from the database."""
+        with self._lock:
+            return self._entry(channel_id).ticket_generation
+
+    def set_ticket(self, channel_id, ticket, generation=None):
+        """
+        Caches a ticket row for HOT_CACHE_TICKET_TTL_S. If `generation` is given and the
+        ticket was invalidated since it was taken, the row is stale and dropped.
+        """
+        with self._lock:
+            entry = self._entry(channel_id)
+            if generation is not None and generation != entry.ticket_generation:
+                return
+            self._unmap_ticket(channel_id, entry)
+            entry.ticket = dict(ticket) if ticket else None
+            entry.ticket_expires = time.monotonic() + self.ticket_ttl
+            if ticket:
+                self._ticket_channels[str(ticket['id'])] = str(channel_id)
+            self._resize(entry)
+
+    def _invalidate_ticket(self, channel_id, entry):
+        entry.ticket_generation += 1
+        if entry.ticket is not MISSING:
+            self._unmap_ticket(channel_id, entry)
+            entry.ticket = MISSING
+            self._resize(entry)
+
+    def invalidate_ticket(self, channel_id):
+        with self._lock:
+            entry = self._entries.get(str(channel_id))
+            if entry is not None:
+                self._invalidate_ticket(channel_id, entry)
+
+    def invalidate_ticket_id(self, ticket_id):
+        """Drops the cached row for a ticket id (used when its channel changes)."""
+        with self._lock:
+            channel_id = self._ticket_channels.get(str(ticket_id))
+            if channel_id is not None and channel_id in self._entries:
+                self._invalidate_ticket(channel_id, self._entries[channel_id])
+            for entry in self._entries.values():
+                if entry.ticket is MISSING:
+                    # May be mid-read of this ticket: its row would be stale
+                    entry.ticket_generation += 1
+
+    # --- Conversations ---
+
+    def get_conversation(self, channel_id):
+        """Returns the cached active conversation (None = no active one), or MISSING."""
+        with self._lock:
+            entry = self._lookup(channel_id)
+            hit = entry is not None and entry.conversation is not MISSING and time.monotonic() < entry.conversation_expires
+            self._record(hit)
+            if not hit:
+                return MISSING
+            return dict(entry.conversation) if entry.conversation else None
+
+    def conversation_generation(self, channel_id):
+        """Token to pass to set_conversation() when loading the active conversation from the database."""
+        with self._lock:
+            return self._entry(channel_id).conversation_generation
+
+    def set_conversation(self, channel_id, conversation, generation=None):
+        """
+        Caches the channel's active conversation for HOT_CACHE_CONVERSATION_TTL_S. If
+        `generation` is given and it was invalidated since it was taken, the row is
+        stale and dropped.
+        """
+        with self._lock:
+            entry = self._entry(channel_id)
+            if generation is not None and generation != entry.conversation_generation:
+                return
+            previous = entry.conversation
+            if isinstance(previous, dict):
+                self._conversation_channels.pop(previous.get('id'), None)
+            if not (isinstance(previous, dict) and conversation and previous.get('id') == conversation.get('id')):
+                # Different conversation: the cached history belongs to the old one
+                entry.history = None
+                entry.history_complete = False
+                entry.generation += 1
+            entry.conversation = dict(conversation) if conversation else None
+            entry.conversation_expires = time.monotonic() + self.conversation_ttl
+            if conversation:
+                self._conversation_channels[conversation['id']] = str(channel_id)
+            self._resize(entry)
+
+    def invalidate_conversation(self, conversation_id):
+        """Forgets the active conversation (and its history) that has this id."""
+        with self._lock:
+            channel_id = self._conversation_channels.pop(conversation_id, None)
+            if channel_id is None:
+                for entry in self._entries.values():
+                    if entry.conversation is MISSING:
+                        # May be mid-read of this conversation: its row would be stale
+                        entry.conversation_generation += 1
+                return
+            entry = self._entries.get(channel_id)
+            if entry is not None:
+                entry.conversation_generation += 1
+                entry.conversation = MISSING
+                entry.history = None
+                entry.history_complete = False
+                entry.generation += 1
+                self._resize(entry)
+
+    def invalidate_channel_conversation(self, channel_id):
+        """Forgets whatever conversation state is cached for a channel."""
+        with self._lock:
+            entry = self._entries.get(str(channel_id))
+            if entry is None:
+                return
+            if isinstance(entry.conversation, dict):
+                self._conversation_channels.pop(entry.conversation.get('id'), None)
+            entry.conversation_generation += 1
+            entry.conversation = MISSING
+            entry.history = None
+            entry.history_complete = False
+            entry.generation += 1
+            self._resize(entry)
+
+    def get_history(self, channel_id):
+        """
+        Returns (lines, complete) for the channel's cached history, or None.
+        `complete` is False when older lines fell off the bounded deque.
+        """
+        with self._lock:
+            entry = self._lookup(channel_id)
+            hit = entry is not None and entry.history is not None
+            self._record(hit)
+            if not hit:
+                return None
+            return list(entry.history), entry.history_complete
+
+    def history_generation(self, channel_id):
+        """Token to pass to set_history() when loading history from the database."""
+        with self._lock:
+            return self._entry(channel_id).generation
+
+    def set_history(self, channel_id, lines, complete, generation=None):
+        """
+        Caches a channel's history. If `generation` is given and a message was added
+        (or the conversation changed) since it was taken, the lines are stale and dropped.
+        """
+        with self._lock:
+            entry = self._entry(channel_id)
+            if generation is not None and generation != entry.generation:
+                return
+            entry.history = deque(lines, maxlen=self.history_lines)
+            entry.history_complete = complete and len(lines) <= self.history_lines
+            self._resize(entry)
+
+    def append_history(self, channel_id, line):
+        """Write-through: adds a line to the cached history, if any is cached."""
+        with self._lock:
+            entry = self._entries.get(str(channel_id))
+            if entry is None:
+                return
+            entry.generation += 1
+            if entry.history is None:
+                return
+            if len(entry.history) == entry.history.maxlen:
+                entry.history_complete = False
+            entry.history.append(line)
+            self._resize(entry)
+
+    # --- Maintenance ---
+
+    def bind(self, db_path):
+        """Clears the cache if it was filled from a different database file."""
+        if db_path != self.db_path:
+            with self._lock:
+                if db_path != self.db_path:
+                    self.clear()
+                    self.db_path = db_path
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._conversation_channels.clear()
+            self._ticket_channels.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+cache = HotCache()
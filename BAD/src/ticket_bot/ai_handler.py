@@ -1,8 +1,18 @@
 import google.generativeai as genai
 import os
+import sys
 from dotenv import load_dotenv
 import json
 
+# BAD's async LLM client (concurrency limit, timeouts, cancellation). This process gets
+# its own instance without the usage ledger, which lives in BAD's database.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+from src.agent.llm_client import LLMClient
+
+llm = LLMClient(usage_recorder=None)
+
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -45,10 +55,11 @@ Gather the following fields:
 ```
 """
 
-async def get_ai_response(history, user_input):
+async def get_ai_response(history, user_input, channel_id=None):
     """
     history: List of dicts [{"role": "user"|"model", "parts": ["..."]}]
     user_input: String
+    channel_id: Ticket channel, so the request can be cancelled if it is deleted
     """
     if not model:
         return "⚠️ Error: GEMINI_API_KEY is missing. Please configure the bot."
@@ -77,11 +88,15 @@ async def get_ai_response(history, user_input):
     messages = [{"role": "user", "parts": [SYSTEM_PROMPT]}] + history + [{"role": "user", "parts": [user_input]}]
     
     try:
-        response = model.generate_content(messages)
+        response = await llm.generate(model, messages, key=channel_id, mode="ticket_bot")
         return response.text
     except Exception as e:
         return f"⚠️ AI Error: {str(e)}"
 
+def cancel_ai_response(channel_id):
+    """Cancels any AI request still running for a (deleted) ticket channel."""
+    return llm.cancel(channel_id)
+
 def parse_ticket_data(ai_response_text):
     """
     Attempts to extract the JSON ticket data from the AI's response.
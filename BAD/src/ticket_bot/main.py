@@ -7,7 +7,7 @@ import datetime
 from dotenv import load_dotenv
 import asyncio
 from database import DatabaseManager
-from ai_handler import get_ai_response, parse_ticket_data
+from ai_handler import get_ai_response, parse_ticket_data, cancel_ai_response
 
 class TicketView(discord.ui.View):
     def __init__(self):
@@ -217,6 +217,10 @@ class TicketBot(commands.Bot):
         await channel.send(f"Hello {user.mention}! I'm the **Ticket Assistant**. Please describe your issue briefly.")
         return channel
 
+    async def on_guild_channel_delete(self, channel):
+        # Ticket deleted while the AI was still thinking about it
+        cancel_ai_response(channel.id)
+
     async def on_message(self, message):
         # Ignore self
         if message.author == self.user:
@@ -259,7 +263,7 @@ class TicketBot(commands.Bot):
                         continue
                     history.append({"role": role, "parts": [msg.content]})
             
-            response_text = await get_ai_response(history, message.content)
+            response_text = await get_ai_response(history, message.content, channel_id=message.channel.id)
             
             # Parse
             is_ready, data, clean_text = parse_ticket_data(response_text)
@@ -0,0 +1,275 @@
+"""
+Archived ticket transcripts: transcript.jsonl[.gz|.zst] with a transcript.idx sidecar.
+
+The first line is a header record ({"type": "header", "version": 1, "meta": {...}}),
+followed by one message per line, oldest first. The body is written in blocks of
+TRANSCRIPT_BLOCK_SIZE messages, each compressed on its own (a gzip member or zstd
+frame; the concatenation is still an ordinary .gz/.zst file), and the index records
+where every block starts: [file offset, index of its first message, its message id].
+Reading a page of messages or seeking to a message id decodes one block instead of
+the whole file. Without a usable index (missing, or from before the file was last
+written) readers fall back to streaming from the start.
+
+ARCHIVE_TRANSCRIPT_COMPRESSION picks gzip (default), zstd (needs the optional
+`zstandard` package, else gzip is used) or none. Archives written before this format
+(transcript.json) are read through the same API.
+
+Usage:
+    with TranscriptWriter(archive_dir, meta) as writer:
+        for msg in messages:
+            writer.write(msg)
+
+    with open_transcript(archive_dir) as transcript:
+        transcript.meta, len(transcript)
+        for msg in transcript: ...                  # streamed
+        transcript.messages(start=200, limit=50)    # one page
+        transcript.index_of(message_id)
+"""
+import bisect
+import glob
+import gzip
+import io
+import itertools
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_TRANSCRIPT_COMPRESSION = os.getenv('ARCHIVE_TRANSCRIPT_COMPRESSION', 'gzip')
+TRANSCRIPT_BLOCK_SIZE = int(os.getenv('TRANSCRIPT_BLOCK_SIZE', '200'))
+
+FORMAT_VERSION = 1
+BASE_NAME = "transcript.jsonl"
+INDEX_NAME = "transcript.idx"
+LEGACY_NAME = "transcript.json"
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+def _compression_of(path):
+    for compression, suffix in SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return "none"
+
+def _compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+def _decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+def find_transcript(archive_dir):
+    """Path of the transcript in an archive directory (any format), or None."""
+    for suffix in SUFFIXES.values():
+        path = os.path.join(archive_dir, BASE_NAME + suffix)
+        if os.path.exists(path):
+            return path
+    path = os.path.join(archive_dir, LEGACY_NAME)
+    return path if os.path.exists(path) else None
+
+def find_archives(root):
+    """Archive directories under `root` that hold a transcript."""
+    dirs = set()
+    for name in [BASE_NAME + suffix for suffix in SUFFIXES.values()] + [LEGACY_NAME]:
+        dirs.update(os.path.dirname(p) for p in glob.glob(os.path.join(root, "**", name), recursive=True))
+    return sorted(dirs)
+
+def open_transcript(path):
+    """Opens a transcript, given its archive directory or its file. Raises FileNotFoundError."""
+    if os.path.isdir(path):
+        path = find_transcript(path) or os.path.join(path, LEGACY_NAME)
+    if path.endswith(".json"):
+        return LegacyTranscript(path)
+    return Transcript(path)
+
+class TranscriptWriter:
+    def __init__(self, archive_dir, meta, compression=ARCHIVE_TRANSCRIPT_COMPRESSION, block_size=TRANSCRIPT_BLOCK_SIZE):
+        if compression == "zstd" and zstandard is None:
+            print("⚠️ zstandard is not installed, writing a gzip transcript instead")
+            compression = "gzip"
+        self.archive_dir = archive_dir
+        self.compression = compression
+        self.block_size = block_size
+        self.path = os.path.join(archive_dir, BASE_NAME + SUFFIXES[compression])
+        self.count = 0
+        self._blocks = []
+        self._pending = []
+        self._f = open(self.path + ".tmp", 'wb')
+        self._f.write(_compress(_encode({"type": "header", "version": FORMAT_VERSION, "meta": meta}), compression))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, msg):
+        if not self._pending:
+            self._blocks.append([self._f.tell(), self.count, msg.get("id")])
+        self._pending.append(_encode(msg))
+        self.count += 1
+        if len(self._pending) >= self.block_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._f.write(_compress(b"".join(self._pending), self.compression))
+            self._pending = []
+
+    def close(self):
+        """Finishes the file and its index, then swaps them in for the archive's previous transcript."""
+        self._flush()
+        size = self._f.tell()
+        self._f.close()
+        index = {"version": FORMAT_VERSION, "compression": self.compression, "count": self.count,
+                 "size": size, "blocks": self._blocks}
+        index_path = os.path.join(self.archive_dir, INDEX_NAME)
+        with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(index_path + ".tmp", index_path)
+        for name in [BASE_NAME + suffix for suffix in SUFFIXES.values()] + [LEGACY_NAME]:
+            other = os.path.join(self.archive_dir, name)
+            if other != self.path and os.path.exists(other):
+                os.remove(other)
+        return self.path
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.path + ".tmp")
+
+class Transcript:
+    """A JSONL transcript, read lazily."""
+    def __init__(self, path):
+        self.path = path
+        self.compression = _compression_of(path)
+        if self.compression == "zstd" and zstandard is None:
+            raise RuntimeError("Reading a .zst transcript needs the zstandard package")
+        self._f = open(path, 'rb')
+        self._index = self._load_index()
+        header = json.loads(next(self._lines()))
+        self.meta = header.get("meta", {})
+        self._count = self._index["count"] if self._index else None
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(os.path.dirname(self.path), INDEX_NAME), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("size") != os.path.getsize(self.path) or index.get("compression") != self.compression:
+            return None # Stale: the transcript was rewritten since
+        return index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def _lines(self):
+        """Every line of the file (header first), streamed."""
+        self._f.seek(0)
+        if self.compression == "gzip":
+            stream = gzip.GzipFile(fileobj=self._f)
+        elif self.compression == "zstd":
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(self._f, read_across_frames=True, closefd=False))
+        else:
+            stream = self._f
+        for line in stream:
+            if line.strip():
+                yield line
+
+    def _block(self, i):
+        """The messages of block `i` of the index."""
+        blocks = self._index["blocks"]
+        end = blocks[i + 1][0] if i + 1 < len(blocks) else self._index["size"]
+        self._f.seek(blocks[i][0])
+        data = _decompress(self._f.read(end - blocks[i][0]), self.compression)
+        return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+    def _from_block(self, i, skip=0):
+        for j in range(i, len(self._index["blocks"])):
+            messages = self._block(j)
+            yield from (messages[skip:] if j == i else messages)
+
+    def __iter__(self):
+        if self._index:
+            return self._from_block(0)
+        return (json.loads(line) for line in itertools.islice(self._lines(), 1, None))
+
+    def __len__(self):
+        if self._count is None:
+            self._count = sum(1 for _ in itertools.islice(self._lines(), 1, None))
+        return self._count
+
+    def messages(self, start=0, limit=None):
+        """Messages [start, start + limit), decoding only the blocks that hold them."""
+        if self._index and self._index["blocks"]:
+            firsts = [block[1] for block in self._index["blocks"]]
+            i = max(bisect.bisect_right(firsts, start) - 1, 0)
+            it = self._from_block(i, start - firsts[i])
+        else:
+            it = itertools.islice(iter(self), start, None)
+        return list(itertools.islice(it, limit))
+
+    def index_of(self, message_id):
+        """Position of a message by id (ids grow oldest to newest), or None."""
+        if self._index and self._index["blocks"]:
+            blocks = self._index["blocks"]
+            i = bisect.bisect_right([block[2] for block in blocks], message_id) - 1
+            if i < 0:
+                return None
+            for offset, msg in enumerate(self._block(i)):
+                if msg.get("id") == message_id:
+                    return blocks[i][1] + offset
+            return None
+        return next((i for i, msg in enumerate(self) if msg.get("id") == message_id), None)
+
+class LegacyTranscript:
+    """A transcript.json (written before the JSONL format), loaded whole."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.meta = data.get("meta", {})
+        self._messages = data.get("messages", [])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self):
+        return len(self._messages)
+
+    def messages(self, start=0, limit=None):
+        return self._messages[start:None if limit is None else start + limit]
+
+    def index_of(self, message_id):
+        return next((i for i, msg in enumerate(self._messages) if msg.get("id") == message_id), None)
@@ -0,0 +1,175 @@
+"""
+Streaming HTML viewer of an archived transcript (transcript.html in its archive directory).
+
+Messages are written one at a time into a buffered file through templates compiled
+once at import, so rendering is linear in the number of messages and memory is
+bounded by one message however long the ticket. Every value taken from the transcript
+is HTML-escaped.
+
+Transcripts longer than TRANSCRIPT_HTML_PAGE_SIZE messages are split into pages
+(transcript.html, transcript-2.html, ...) linked by a page bar. Within a page messages
+are grouped in blocks styled `content-visibility: auto`, so the browser only lays out
+the blocks on screen. Image attachments are shown inline as lazily loaded thumbnails
+(scaled by CSS) linking to the full file.
+"""
+import html
+import io
+import os
+import zipfile
+from string import Template
+from urllib.parse import quote
+
+TRANSCRIPT_HTML_PAGE_SIZE = int(os.getenv('TRANSCRIPT_HTML_PAGE_SIZE', '1000'))
+BLOCK_SIZE = 50
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+_STYLE = """
+    body { font-family: sans-serif; background: #36393f; color: #dcddde; padding: 20px; }
+    .header { border-bottom: 1px solid #72767d; padding-bottom: 10px; margin-bottom: 20px; }
+    .pages { margin: 10px 0; }
+    .pages a, .pages span { margin-right: 8px; }
+    .block { content-visibility: auto; contain-intrinsic-size: auto 4000px; }
+    .message { margin-bottom: 15px; padding: 10px; border-radius: 5px; background: #2f3136; }
+    .author { font-weight: bold; color: #fff; }
+    .time { font-size: 0.8em; color: #72767d; margin-left: 10px; }
+    .content { margin-top: 5px; white-space: pre-wrap; }
+    .attachment { margin-top: 10px; }
+    .thumb { max-width: 320px; max-height: 240px; border-radius: 3px; }
+    a { color: #00b0f4; }
+"""
+
+_PAGE_HEAD = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Ticket #$ticket_id - Archive$page_title</title>
+<style>$style</style>
+</head>
+<body>
+<div class="header">
+<h1>Ticket #$ticket_id: $title</h1>
+<p><strong>Channel:</strong> $channel_name</p>
+<p><strong>Archived:</strong> $archived_at</p>
+<p><strong>Description:</strong> $description</p>
+</div>
+$pages<div class="messages">
+""")
+_PAGE_FOOT = Template("""</div>
+$pages</body>
+</html>
+""")
+_MESSAGE = Template("""<div class="message" id="m$id"><span class="author">$author</span><span class="time">$timestamp</span><div class="content">$content</div>$attachments</div>
+""")
+_ATTACHMENT = Template('<div class="attachment">📎 <a href="$href" download="$name" target="_blank">$name</a></div>')
+_THUMBNAIL = Template('<div class="attachment"><a href="$href" download="$name" target="_blank">'
+                      '<img class="thumb" src="$href" alt="$name" title="$name" loading="lazy" decoding="async"></a></div>')
+_FAILED = Template('<div class="attachment">⚠️ Failed to load: $url</div>')
+
+_esc = html.escape
+
+def page_name(page):
+    return "transcript.html" if page == 1 else f"transcript-{page}.html"
+
+def page_paths(archive_dir):
+    """Paths of the rendered pages of a transcript, in order (empty if none)."""
+    paths = []
+    while os.path.exists(os.path.join(archive_dir, page_name(len(paths) + 1))):
+        paths.append(os.path.join(archive_dir, page_name(len(paths) + 1)))
+    return paths
+
+def zip_pages(archive_dir):
+    """Every page of a transcript in one zip (in memory), keeping the names the page links use."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path in page_paths(archive_dir):
+            zf.write(path, os.path.basename(path))
+    buffer.seek(0)
+    return buffer
+
+def _page_bar(page, pages, has_next):
+    """Links to the neighbouring pages (and every page when the total is known)."""
+    if page == 1 and not has_next:
+        return ""
+    parts = []
+    if page > 1:
+        parts.append(f'<a href="{page_name(page - 1)}">« Previous</a>')
+    if pages:
+        parts.extend(f'<span>{n}</span>' if n == page else f'<a href="{page_name(n)}">{n}</a>' for n in range(1, pages + 1))
+    else:
+        parts.append(f'<span>Page {page}</span>')
+    if has_next:
+        parts.append(f'<a href="{page_name(page + 1)}">Next »</a>')
+    return f'<div class="pages">{" ".join(parts)}</div>\n'
+
+def render_attachment(att):
+    if not att.get("local_path"):
+        return _FAILED.substitute(url=_esc(str(att.get("original_url", ""))))
+    name = att.get("filename") or ""
+    template = _THUMBNAIL if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS else _ATTACHMENT
+    # Blobs are stored under their hash: `download` keeps the original name
+    return template.substitute(href=_esc(quote(att["local_path"])), name=_esc(name))
+
+def render_message(msg):
+    return _MESSAGE.substitute(
+        id=_esc(str(msg.get("id", ""))),
+        author=_esc(str(msg.get("author_name", ""))),
+        timestamp=_esc(str(msg.get("timestamp", ""))),
+        content=_esc(msg.get("content") or ""),
+        attachments="".join(render_attachment(att) for att in msg.get("attachments") or []),
+    )
+
+def render_transcript_html(archive_dir, meta, messages, total=None, page_size=TRANSCRIPT_HTML_PAGE_SIZE):
+    """
+    Writes the HTML page(s) of a transcript, streaming `messages` (any iterable, oldest
+    first). `total`, if known, lists every page in the page bar. Returns the page paths.
+    """
+    pages = -(-total // page_size) if total else None
+    head = {key: _esc(str(meta.get(key, ""))) for key in ("ticket_id", "title", "channel_name", "archived_at", "description")}
+    paths = []
+    f = None
+    page = count = 0
+
+    def finish(has_next):
+        f.write("</div>\n") # Last block
+        f.write(_PAGE_FOOT.substitute(pages=_page_bar(page, pages, has_next)))
+        f.close()
+
+    def start(has_next):
+        nonlocal f
+        path = os.path.join(archive_dir, page_name(page))
+        paths.append(path)
+        f = open(path + ".tmp", 'w', encoding='utf-8', buffering=64 * 1024)
+        f.write(_PAGE_HEAD.substitute(head, style=_STYLE, page_title=f" (page {page})" if page > 1 else "",
+                                      pages=_page_bar(page, pages, has_next)))
+        f.write('<div class="block">\n')
+
+    try:
+        for msg in messages:
+            if count % page_size == 0:
+                if f:
+                    finish(has_next=True)
+                page += 1
+                start(has_next=bool(pages and page < pages))
+            elif count % BLOCK_SIZE == 0:
+                f.write('</div>\n<div class="block">\n')
+            f.write(render_message(msg))
+            count += 1
+        if not f: # No messages
+            page = 1
+            start(has_next=False)
+        finish(has_next=False)
+    except BaseException:
+        if f:
+            f.close()
+        for path in paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+
+    for path in paths:
+        os.replace(path + ".tmp", path)
+    stale = len(paths) + 1 # Pages left from an earlier, longer render
+    while os.path.exists(os.path.join(archive_dir, page_name(stale))):
+        os.remove(os.path.join(archive_dir, page_name(stale)))
+        stale += 1
+    return paths
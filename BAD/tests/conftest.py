@@ -0,0 +1,40 @@
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+def _remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+@pytest.fixture
+def test_db_path(request):
+    """
+    Points src.db at an empty database file named after the test module
+    (data/test_x.db for tests/test_x.py), removed again with its WAL files afterwards.
+    """
+    path = os.path.join(TEST_DATA_DIR, request.module.__name__.rsplit('.', 1)[-1] + '.db')
+    original_db_path = db.DB_PATH
+    db.DB_PATH = path
+    db.close_all_connections()
+    _remove_database(path)
+
+    yield path
+
+    db.close_all_connections()
+    db.DB_PATH = original_db_path
+    _remove_database(path)
+
+@pytest.fixture
+def test_db(test_db_path):
+    """test_db_path with the schema created and the in-process caches empty."""
+    db.init_db()
+    db.hot_cache().clear()
+    db._ticket_counts.clear()
+    yield test_db_path
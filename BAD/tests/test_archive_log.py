@@ -0,0 +1,89 @@
+import pytest
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.archive_log import ArchiveLog
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+@pytest.fixture
+def archive_dir():
+    path = tempfile.mkdtemp()
+    yield os.path.join(path, "2026", "10", "5")
+    shutil.rmtree(path)
+
+def messages(first, last):
+    return [{"id": i, "author_name": "u", "content": f"message {i}", "attachments": []} for i in range(first, last + 1)]
+
+def test_archiving_again_resumes_after_the_checkpoint(archive_dir):
+    log = ArchiveLog.open(111, 5, archive_dir)
+    assert log.last_message_id is None
+    log.append(messages(1, 3))
+    log.append(messages(4, 5))
+    log.append([])
+
+    resumed = ArchiveLog.open(111, 5, "/elsewhere/today") # Keeps the directory it started in
+    assert resumed.archive_dir == archive_dir
+    assert (resumed.last_message_id, resumed.message_count) == (5, 5)
+    resumed.append(messages(6, 6))
+    assert [m["id"] for m in resumed.messages()] == [1, 2, 3, 4, 5, 6]
+    assert db.get_archive_checkpoint(111)['last_message_id'] == "6"
+
+def test_uncommitted_lines_are_dropped_on_resume(archive_dir):
+    log = ArchiveLog.open(111, 5, archive_dir)
+    log.append(messages(1, 2))
+    with open(log.path, 'a', encoding='utf-8') as f: # A run that died before checkpointing
+        f.write(json.dumps(messages(3, 3)[0]) + "\n" + '{"id": 4, "cont')
+
+    resumed = ArchiveLog.open(111, 5, archive_dir)
+    assert [m["id"] for m in resumed.messages()] == [1, 2]
+    resumed.append(messages(3, 4))
+    assert [m["id"] for m in resumed.messages()] == [1, 2, 3, 4]
+
+def test_messages_stop_at_the_checkpoint(archive_dir):
+    log = ArchiveLog.open(111, 5, archive_dir)
+    log.append(messages(1, 2))
+    with open(log.path, 'a', encoding='utf-8') as f: # Another writer mid-batch
+        f.write('{"id": 3, "cont')
+    assert [m["id"] for m in log.messages()] == [1, 2]
+
+def test_missing_log_starts_over(archive_dir):
+    log = ArchiveLog.open(111, 5, archive_dir)
+    log.append(messages(1, 2))
+    os.remove(log.path)
+
+    fresh = ArchiveLog.open(111, 5, archive_dir)
+    assert (fresh.last_message_id, fresh.message_count) == (None, 0)
+    assert list(fresh.messages()) == []
+
+def test_restored_channel_continues_the_archive(archive_dir):
+    os.makedirs(archive_dir)
+    with open(os.path.join(archive_dir, "transcript.json"), 'w', encoding='utf-8') as f: # Archived before the log
+        json.dump({"meta": {"ticket_id": 5}, "messages": messages(1, 3)}, f)
+    db.save_archive_checkpoint(111, 5, archive_dir, 3, 3, 0) # The original channel
+
+    ArchiveLog.adopt(222, 5, archive_dir, after_message_id=900)
+    assert db.get_archive_checkpoint(111) is None # One channel continues an archive
+
+    log = ArchiveLog.open(222, 5, "/elsewhere/today")
+    assert (log.archive_dir, log.last_message_id, log.message_count) == (archive_dir, 900, 3)
+    log.append(messages(901, 902))
+    assert [m["id"] for m in log.messages()] == [1, 2, 3, 901, 902]
+
+def test_split_steps_commit_only_at_the_checkpoint(archive_dir):
+    log = ArchiveLog.load(111, 5, archive_dir, db.get_archive_checkpoint(111))
+    log.checkpoint()
+    log.add_refs(messages(1, 2))
+    log.write(messages(1, 2))
+    log.checkpoint()
+    log.write(messages(3, 4)) # The run dies before checkpointing this batch
+
+    resumed = ArchiveLog.load(111, 5, archive_dir, db.get_archive_checkpoint(111))
+    assert (resumed.last_message_id, resumed.message_count) == (2, 2)
+    assert [m["id"] for m in resumed.messages()] == [1, 2]
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+web = pytest.importorskip("aiohttp.web")
+from src.bridge.attachment_downloader import AttachmentDownloader, DownloadError
+
+BODY = os.urandom(300 * 1024)
+
+class TestAttachmentDownloader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.requests = []
+        self.flaky_failures = 1
+
+        async def big(request):
+            self.requests.append(request.headers.get("Range"))
+            start = int(request.headers["Range"][6:-1]) if "Range" in request.headers else 0
+            resp = web.StreamResponse(status=206 if start else 200)
+            resp.content_length = len(BODY) - start
+            await resp.prepare(request)
+            await resp.write(BODY[start:start + 100 * 1024])
+            if not start and self.flaky_failures: # Drop the connection mid-body once
+                self.flaky_failures -= 1
+                await asyncio.sleep(0.05) # Let the first part reach the client
+                request.transport.close()
+                return resp
+            await resp.write(BODY[start + 100 * 1024:])
+            return resp
+
+        async def slow(request):
+            await asyncio.sleep(0.3)
+            return web.Response(body=b"x" * 10)
+
+        async def gone(request):
+            return web.Response(status=404)
+
+        async def unavailable(request):
+            self.requests.append("503")
+            return web.Response(status=503)
+
+        app = web.Application()
+        app.router.add_get("/big", big)
+        app.router.add_get("/slow/{n}", slow)
+        app.router.add_get("/gone", gone)
+        app.router.add_get("/unavailable", unavailable)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base = f"http://127.0.0.1:{port}"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    async def test_interrupted_download_resumes(self):
+        async with AttachmentDownloader(chunk_size=16 * 1024, backoff=0) as downloader:
+            future = await downloader.submit(f"{self.base}/big", self.path("log.txt"))
+            self.assertEqual(await future, {"size": len(BODY)})
+        with open(self.path("log.txt"), 'rb') as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertEqual(self.requests, [None, f"bytes={100 * 1024}-"])
+        self.assertFalse(os.path.exists(self.path("log.txt.part")))
+
+    async def test_downloads_run_concurrently(self):
+        started = time.monotonic()
+        async with AttachmentDownloader(workers=4) as downloader:
+            futures = [await downloader.submit(f"{self.base}/slow/{i}", self.path(f"{i}.bin")) for i in range(8)]
+            results = await asyncio.gather(*futures)
+        self.assertEqual(results, [{"size": 10}] * 8)
+        self.assertLess(time.monotonic() - started, 1.5) # 8 x 0.3s, four at a time
+
+    async def test_failures_are_reported_per_file(self):
+        async with AttachmentDownloader(retries=2, backoff=0) as downloader:
+            gone = await downloader.submit(f"{self.base}/gone", self.path("gone.png"))
+            unavailable = await downloader.submit(f"{self.base}/unavailable", self.path("u.png"))
+            ok = await downloader.submit(f"{self.base}/slow/1", self.path("ok.png"))
+            with self.assertRaisesRegex(DownloadError, "404"):
+                await gone
+            with self.assertRaisesRegex(DownloadError, "503"):
+                await unavailable
+            self.assertEqual(await ok, {"size": 10})
+        self.assertEqual(self.requests.count("503"), 3) # Retried: first try + 2
+        self.assertFalse(os.path.exists(self.path("gone.png")))
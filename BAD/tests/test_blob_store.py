@@ -0,0 +1,122 @@
+import pytest
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.archive_log import ArchiveLog
+from src.blob_store import BlobStore
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+@pytest.fixture
+def root():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+def write_transcript(archive_dir, attachments):
+    os.makedirs(archive_dir, exist_ok=True)
+    transcript = {"meta": {"ticket_id": 1}, "messages": [{"author_name": "u", "content": "", "attachments": attachments}]}
+    with open(os.path.join(archive_dir, "transcript.json"), 'w', encoding='utf-8') as f:
+        json.dump(transcript, f)
+    return transcript
+
+def test_identical_files_are_stored_once(root):
+    store = BlobStore(os.path.join(root, "blobs"))
+    first = store.put_file(write(store.incoming_path(), b"screenshot"))
+    second = store.put_file(write(store.incoming_path(), b"screenshot"))
+    other = store.put_file(write(store.incoming_path(), b"logs"))
+
+    assert first == second and first != other
+    assert first[1] == len(b"screenshot")
+    with open(store.path(first[0]), 'rb') as f:
+        assert f.read() == b"screenshot"
+    assert os.listdir(os.path.join(root, "blobs", "tmp")) == []
+
+    archive_dir = os.path.join(root, "2026", "02", "7")
+    entry = store.attachment_entry(archive_dir, *first, "shot.png", "https://cdn/shot.png")
+    assert entry["local_path"] == f"../../../blobs/{first[0][:2]}/{first[0]}"
+    assert store.resolve(archive_dir, entry) == store.path(first[0])
+    assert store.resolve(archive_dir, {"local_path": "attachments/old.png"}) == os.path.join(archive_dir, "attachments/old.png")
+
+def test_gc_deletes_only_unreferenced_blobs(root):
+    store = BlobStore(os.path.join(root, "blobs"))
+    shared, _ = store.put_file(write(store.incoming_path(), b"shared"))
+    single, _ = store.put_file(write(store.incoming_path(), b"single"))
+    orphan, _ = store.put_file(write(store.incoming_path(), b"orphan"))
+
+    a, b = os.path.join(root, "a"), os.path.join(root, "b")
+    store.set_refs(a, write_transcript(a, [{"sha256": shared}, {"sha256": single}])["messages"])
+    store.set_refs(b, write_transcript(b, [{"sha256": shared}, {"original_url": "x", "error": "HTTP 404"}])["messages"])
+    assert db.get_archive_blob(shared)['refs'] == 2
+
+    assert store.gc(grace=3600) == (0, 0) # Too recent: may belong to an archive being written
+    assert store.gc(grace=0, dry_run=True) == (1, len(b"orphan"))
+    assert os.path.exists(store.path(orphan))
+
+    assert store.gc(grace=0) == (1, len(b"orphan"))
+    assert not os.path.exists(store.path(orphan)) and db.get_archive_blob(orphan) is None
+
+    shutil.rmtree(a) # Archive deleted: its references go with it
+    assert store.gc(grace=0) == (1, len(b"single"))
+    assert os.path.exists(store.path(shared)) and db.get_archive_blob(shared)['refs'] == 1
+
+def test_reused_blob_survives_gc(root):
+    store = BlobStore(os.path.join(root, "blobs"))
+    sha256, size = store.put_file(write(store.incoming_path(), b"data"))
+    db.add_archive_blob(sha256, size, now=time.time() - 7200) # Unreferenced for two hours
+    cutoff = time.time() - 3600
+    assert [row['sha256'] for row in db.get_unreferenced_blobs(cutoff)] == [sha256]
+
+    store.put_file(write(store.incoming_path(), b"data")) # Archived again before it is referenced
+    assert not db.delete_archive_blob(sha256, cutoff)
+    assert store.gc(grace=3600) == (0, 0)
+    assert os.path.exists(store.path(sha256))
+
+def test_blobs_of_an_archive_in_progress_survive_gc(root):
+    store = BlobStore(os.path.join(root, "blobs"))
+    archive_dir = os.path.join(root, "2026", "10", "5")
+    sha256, size = store.put_file(write(store.incoming_path(), b"screenshot"))
+    db.add_archive_blob(sha256, size, now=time.time() - 7200) # Batch committed, then the run stalled
+
+    log = ArchiveLog.open(111, 5, archive_dir)
+    log.append([{"id": 1, "author_name": "u", "content": "", "attachments": [store.attachment_entry(archive_dir, sha256, size, "a.png", "https://cdn/a.png")]}])
+    assert store.gc(grace=3600) == (0, 0) # Resumed after the grace period: no transcript yet
+    assert os.path.exists(store.path(sha256)) and db.get_archive_blob(sha256)['refs'] == 1
+
+    assert store.set_refs(archive_dir, log.messages()) == {sha256} # Transcript written
+    assert db.get_archive_blob(sha256)['refs'] == 1
+
+def test_legacy_archive_is_migrated(root):
+    store = BlobStore(os.path.join(root, "blobs"))
+    a, b = os.path.join(root, "2026", "01", "1"), os.path.join(root, "2026", "01", "2")
+    for archive_dir in (a, b):
+        write(os.path.join(archive_dir, "attachments", "9_log.txt"), b"same log")
+        write_transcript(archive_dir, [{"original_url": "https://cdn/log.txt", "filename": "log.txt",
+                                        "local_path": "attachments/9_log.txt", "size": 8}])
+
+    assert store.migrate_archives(root) == (2, 0)
+    with open(os.path.join(a, "transcript.json"), encoding='utf-8') as f:
+        att = json.load(f)["messages"][0]["attachments"][0]
+    assert att["filename"] == "log.txt" and att["size"] == 8
+    assert not os.path.exists(os.path.join(a, "attachments"))
+    with open(store.resolve(a, att), 'rb') as f:
+        assert f.read() == b"same log"
+    with open(os.path.join(a, att["local_path"]), 'rb') as f: # Still valid relative to the transcript
+        assert f.read() == b"same log"
+    assert db.get_archive_blob(att["sha256"])['refs'] == 2
+
+    assert store.migrate_archives(root) == (0, 0) # Idempotent
+    assert db.get_archive_blob(att["sha256"])['refs'] == 2
@@ -1,30 +1,9 @@
 import pytest
-import os
 import sqlite3
 from src import db
 from src.agent.conversation_manager import ConversationManager
 
-# Use a test database
-TEST_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'test_bad.db')
-
-@pytest.fixture(autouse=True)
-def setup_teardown():
-    # Setup
-    original_db_path = db.DB_PATH
-    db.DB_PATH = TEST_DB_PATH
-    if os.path.exists(TEST_DB_PATH):
-        os.remove(TEST_DB_PATH)
-    db.init_db()
-    
-    yield
-    
-    # Teardown
-    db.DB_PATH = original_db_path
-    if os.path.exists(TEST_DB_PATH):
-        try:
-            os.remove(TEST_DB_PATH)
-        except PermissionError:
-            pass # Windows file locking sometimes
+pytestmark = pytest.mark.usefixtures("test_db")
 
 def test_conversation_creation():
     cm = ConversationManager()
@@ -77,3 +56,46 @@ def test_reset_conversation():
     history = cm.get_history(channel_id)
     assert len(history) == 1
     assert history[0] == "User: Msg 2"
+
+def test_history_window_and_cursors():
+    cid = db.create_conversation("test_channel_4")
+    db.add_messages([(cid, 'user', f"msg {i}") for i in range(30)])
+
+    latest = db.get_conversation_history(cid, limit=5)
+    assert [m['content'] for m in latest] == [f"msg {i}" for i in range(25, 30)]
+
+    older = db.get_conversation_history(cid, limit=5, before_id=latest[0]['id'])
+    assert [m['content'] for m in older] == [f"msg {i}" for i in range(20, 25)]
+
+    newer = db.get_conversation_history(cid, limit=3, after_id=older[-1]['id'])
+    assert [m['content'] for m in newer] == ["msg 25", "msg 26", "msg 27"]
+
+    assert len(db.get_conversation_history(cid, limit=None)) == 30
+
+def test_history_budget_keeps_most_recent():
+    cid = db.create_conversation("test_channel_5")
+    db.add_messages([(cid, 'user', "x" * 100) for _ in range(10)])
+
+    assert len(db.get_conversation_history(cid, limit=None, max_chars=350)) == 3
+    assert len(db.get_conversation_history(cid, limit=None, max_tokens=50)) == 2
+
+def test_history_query_uses_index():
+    conn = db.get_connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT 20", (1,)
+    ).fetchall()
+    conn.close()
+    assert any("idx_messages_conversation_id" in row[-1] for row in plan)
+
+def test_manager_history_is_windowed():
+    cm = ConversationManager()
+    channel_id = "test_channel_6"
+    for i in range(10):
+        cm.add_user_message(channel_id, f"Msg {i}")
+
+    assert cm.get_history(channel_id, limit=3) == ["User: Msg 7", "User: Msg 8", "User: Msg 9"]
+    assert cm.get_history(channel_id, max_chars=22) == ["User: Msg 8", "User: Msg 9"]
+
+    db.hot_cache().clear() # Same answers when loaded from the database
+    assert cm.get_history(channel_id, limit=3) == ["User: Msg 7", "User: Msg 8", "User: Msg 9"]
+    assert len(cm.get_history(channel_id)) == 10
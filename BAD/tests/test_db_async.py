@@ -0,0 +1,66 @@
+import unittest
+import asyncio
+import os
+import sys
+import threading
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src import db_async
+
+class TestDBAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = self.db_path
+        db.init_db()
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self.original_db_path
+        os.close(self.db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    async def test_mirrors_sync_api(self):
+        tid = await db_async.create_ticket_record("chan-a1", "guild-1", "user-1", "user-name")
+        self.assertIsNotNone(tid)
+
+        await db_async.update_ticket_status("chan-a1", "active")
+        self.assertEqual(await db_async.get_ticket_status("chan-a1"), "active")
+
+        stats = await db_async.get_ticket_stats()
+        self.assertEqual(stats['total_open'], 1)
+
+        tickets, total = await db_async.get_tickets_with_filter(status='active')
+        self.assertEqual(total, 1)
+        self.assertEqual(tickets[0]['channel_id'], "chan-a1")
+
+    async def test_update_ticket_channel(self):
+        tid = await db_async.create_ticket_record("pending", "guild-1", "user-1", "user-name")
+        await db_async.update_ticket_channel(tid, "chan-real", status='active')
+        ticket = await db_async.get_ticket("chan-real")
+        self.assertEqual(ticket['id'], tid)
+        self.assertEqual(ticket['status'], 'active')
+
+    async def test_runs_off_the_event_loop(self):
+        loop_thread = threading.current_thread().name
+        write_thread = await db_async.run_write(lambda: threading.current_thread().name)
+        read_thread = await db_async.run_read(lambda: threading.current_thread().name)
+
+        self.assertNotEqual(write_thread, loop_thread)
+        self.assertTrue(write_thread.startswith("db-writer"))
+        self.assertTrue(read_thread.startswith("db-reader"))
+
+    async def test_writes_are_serialized_in_order(self):
+        cid = await db_async.create_conversation("chan-order")
+        # Fired concurrently, but the single writer thread keeps them in submission order
+        await asyncio.gather(*[db_async.add_message(cid, 'user', f"msg {i}") for i in range(20)])
+        history = await db_async.get_conversation_history(cid)
+        self.assertEqual([m['content'] for m in history], [f"msg {i}" for i in range(20)])
+
+if __name__ == '__main__':
+    unittest.main()
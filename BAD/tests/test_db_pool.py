@@ -0,0 +1,50 @@
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def test_connection_is_reused():
+    conn1 = db.get_connection()
+    conn1.close()
+    conn2 = db.get_connection()
+    assert conn2 is conn1
+    conn2.close()
+
+def test_concurrent_checkouts_get_distinct_connections():
+    conn1 = db.get_connection()
+    conn2 = db.get_connection()
+    assert conn1 is not conn2
+    conn1.close()
+    conn2.close()
+
+def test_pragmas_applied():
+    conn = db.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1 # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db.DB_BUSY_TIMEOUT_MS
+    conn.close()
+
+def test_uncommitted_work_rolled_back_on_release():
+    conn = db.get_connection()
+    conn.execute("INSERT INTO tickets (channel_id, status) VALUES ('chan-rollback', 'draft')")
+    conn.close()
+    assert db.get_ticket("chan-rollback") is None
+
+def test_replaced_database_file_not_reused(test_db):
+    db.create_ticket_record("chan-old", "guild", "user", "name")
+    stale = db.get_connection()
+    stale.close()
+
+    # Simulate a restore: the file is swapped out underneath the pool
+    os.remove(test_db)
+    db.init_db()
+
+    assert db.get_ticket("chan-old") is None
+    fresh = db.get_connection()
+    assert fresh is not stale
+    fresh.close()
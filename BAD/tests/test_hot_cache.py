@@ -0,0 +1,135 @@
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.hot_cache import HotCache, MISSING
+from src.agent.conversation_manager import ConversationManager
+from src.agent.message_writer import MessageWriter
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def test_chat_turn_needs_no_database_reads():
+    writer = MessageWriter(flush_interval=10)
+    cm = ConversationManager(message_writer=writer)
+    channel_id = "chan-hot"
+    db.create_ticket_record(channel_id, "guild", "user", "name")
+
+    # Warm up (first turn of the ticket)
+    db.get_ticket_status(channel_id)
+    cm.add_user_message(channel_id, "hello")
+    cm.get_history(channel_id)
+
+    with patch.object(db, "get_connection", side_effect=AssertionError("DB hit on hot path")):
+        assert db.get_ticket_status(channel_id) == 'draft'
+        cm.add_user_message(channel_id, "second message")
+        history = cm.get_history(channel_id)
+        cm.add_bot_message(channel_id, "reply")
+
+    assert history == ["User: hello", "User: second message"]
+    writer.close()
+    assert cm.get_history(channel_id) == ["User: hello", "User: second message", "Bot: reply"]
+
+def test_ticket_updates_invalidate_cache():
+    db.create_ticket_record("chan-inv", "guild", "user", "name")
+    assert db.get_ticket_status("chan-inv") == 'draft'
+
+    db.update_ticket_status("chan-inv", 'active')
+    assert db.get_ticket_status("chan-inv") == 'active'
+
+    db.update_ticket_assignment("chan-inv", "helper-1")
+    assert db.get_ticket("chan-inv")['assigned_to'] == "helper-1"
+
+    db.update_ticket_details("chan-inv", "Title", "Desc", "High")
+    assert db.get_ticket("chan-inv")['title'] == "Title"
+
+def test_closed_and_deleted_conversations_are_forgotten():
+    cm = ConversationManager()
+    cm.add_user_message("chan-conv", "Msg 1")
+    assert cm.get_history("chan-conv") == ["User: Msg 1"]
+
+    cm.start_new_conversation("chan-conv")
+    assert db.get_active_conversation("chan-conv") is None
+    assert cm.get_history("chan-conv") == []
+
+    cm.add_user_message("chan-conv", "Msg 2")
+    cm.delete_conversation("chan-conv")
+    assert cm.get_history("chan-conv") == []
+
+def test_lru_eviction_respects_memory_cap():
+    cache = HotCache(max_bytes=5000, history_lines=10)
+    for i in range(50):
+        cache.set_history(f"chan-{i}", ["x" * 100] * 5, complete=True)
+
+    assert cache.stats()['bytes'] <= 5000
+    assert cache.get_history("chan-0") is None # Oldest evicted
+    assert cache.get_history("chan-49") is not None
+
+def test_stale_history_load_is_discarded():
+    cache = HotCache()
+    cache.set_ticket("chan-x", {"id": 1, "status": "draft"})
+    generation = cache.history_generation("chan-x")
+    cache.append_history("chan-x", "User: raced in")
+    cache.set_history("chan-x", ["User: old"], complete=True, generation=generation)
+    assert cache.get_history("chan-x") is None
+    assert cache.get_ticket("chan-missing") is MISSING
+
+def test_stale_ticket_load_is_discarded():
+    cache = HotCache()
+    generation = cache.ticket_generation("chan-t")
+    cache.invalidate_ticket("chan-t") # A write lands between the SELECT and the set
+    cache.set_ticket("chan-t", {"id": 1, "status": "draft"}, generation)
+    assert cache.get_ticket("chan-t") is MISSING
+
+    generation = cache.ticket_generation("chan-t")
+    cache.invalidate_ticket_id(1) # Moved to another channel meanwhile
+    cache.set_ticket("chan-t", {"id": 1, "status": "draft"}, generation)
+    assert cache.get_ticket("chan-t") is MISSING
+
+    cache.set_ticket("chan-t", {"id": 1, "status": "active"}, cache.ticket_generation("chan-t"))
+    assert cache.get_ticket("chan-t")['status'] == "active"
+
+def test_cached_ticket_expires():
+    cache = HotCache(ticket_ttl=10)
+    with patch("src.hot_cache.time.monotonic", return_value=1000):
+        cache.set_ticket("chan-ttl", {"id": 1, "status": "draft"})
+    with patch("src.hot_cache.time.monotonic", return_value=1009):
+        assert cache.get_ticket("chan-ttl")['status'] == "draft"
+    with patch("src.hot_cache.time.monotonic", return_value=1010):
+        assert cache.get_ticket("chan-ttl") is MISSING # Another process may have changed it
+
+def test_ticket_id_invalidation_is_targeted():
+    cache = HotCache()
+    cache.set_ticket("chan-a", {"id": 1, "status": "closed"})
+    cache.set_ticket("chan-b", {"id": 2, "status": "active"})
+    cache.invalidate_ticket_id(1)
+    assert cache.get_ticket("chan-a") is MISSING
+    assert cache.get_ticket("chan-b")['status'] == "active"
+
+def test_stale_conversation_load_is_discarded():
+    cache = HotCache()
+    generation = cache.conversation_generation("chan-c")
+    cache.invalidate_channel_conversation("chan-c") # create_conversation lands between the SELECT and the set
+    cache.set_conversation("chan-c", None, generation)
+    assert cache.get_conversation("chan-c") is MISSING
+
+    generation = cache.conversation_generation("chan-c")
+    cache.invalidate_conversation(7) # Closed while being read
+    cache.set_conversation("chan-c", {"id": 7}, generation)
+    assert cache.get_conversation("chan-c") is MISSING
+
+    cache.set_conversation("chan-c", {"id": 8}, cache.conversation_generation("chan-c"))
+    assert cache.get_conversation("chan-c")['id'] == 8
+
+def test_cached_conversation_expires():
+    cache = HotCache(conversation_ttl=10)
+    with patch("src.hot_cache.time.monotonic", return_value=1000):
+        cache.set_conversation("chan-ttl", {"id": 3})
+        cache.set_history("chan-ttl", ["User: hi"], complete=True)
+    with patch("src.hot_cache.time.monotonic", return_value=1010):
+        assert cache.get_conversation("chan-ttl") is MISSING # Closed by another process?
+        cache.set_conversation("chan-ttl", {"id": 3}, cache.conversation_generation("chan-ttl"))
+        assert cache.get_history("chan-ttl") == (["User: hi"], True) # Same conversation: history kept
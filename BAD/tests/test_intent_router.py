@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from src.agent.intent_router import (
+    ACK, ATTACHMENT, CANCEL, SUBMIT, SUBSTANTIVE, THANKS,
+    IntentRouter, NaiveBayesIntentModel, rule_intent
+)
+import eval_intent_router
+
+def test_trivial_messages():
+    assert rule_intent("Thanks!") == THANKS
+    assert rule_intent("thank you so much 🙏") == THANKS
+    assert rule_intent("ok") == ACK
+    assert rule_intent("👍") == ACK
+    assert rule_intent("Yes, submit it please") == SUBMIT
+    assert rule_intent("looks good, go ahead") == SUBMIT
+    assert rule_intent("never mind") == CANCEL
+    assert rule_intent("ok cancel the ticket") == CANCEL
+
+def test_substantive_messages_go_to_the_model():
+    for text in ["don't submit", "no thanks", "ok but the export is broken",
+                 "The login page shows a 500 error since this morning", "it", ""]:
+        assert rule_intent(text) == SUBSTANTIVE, text
+    assert rule_intent("thanks " * 10) == SUBSTANTIVE # Too long to be sure
+
+def test_route_gating():
+    router = IntentRouter(enabled=True)
+    assert router.route("thanks").reply
+    assert router.route("cancel").reply
+    assert router.route("", attachments=2).reply.startswith("📎")
+    assert router.route("", attachments=2).intent == ATTACHMENT
+
+    # Before a draft exists, "ok"/"submit" may answer the assistant's question
+    assert router.route("ok").reply is None
+    assert router.route("yes submit").reply is None
+    assert router.route("yes submit", draft_pending=True).reply
+    assert router.route("The VPN drops every hour", draft_pending=True).reply is None
+
+    stats = router.stats()
+    assert stats["messages"] == 8 and stats["handled_locally"] == 5
+
+def test_disabled_router_routes_everything():
+    assert IntentRouter(enabled=False).route("thanks").reply is None
+
+def test_rules_are_fast():
+    assert timeit.timeit(lambda: rule_intent("yes submit it please"), number=1000) < 0.5
+
+def test_model_catches_variants():
+    texts = ["thanks"] * 15 + ["ok"] * 10 + ["the export button is broken"] * 10 + ["please fix the vpn"] * 10
+    model = NaiveBayesIntentModel.from_messages(texts)
+    assert model is not None
+    assert model.predict("thanks heaps")[0] == THANKS
+    assert model.predict("vpn is broken again")[0] == SUBSTANTIVE
+
+    router = IntentRouter(model=model, threshold=0.8, enabled=True)
+    assert router.classify("thanks heaps")[:2] == (THANKS, "model")
+    assert NaiveBayesIntentModel.from_messages(["please fix the vpn"] * 50) is None
+
+def test_eval_harness_on_transcript():
+    transcript = {"meta": {}, "messages": [
+        {"author_id": 1, "content": "Hi! How can I help?", "attachments": []},
+        {"author_id": 2, "content": "The printer is jammed", "attachments": []},
+        {"author_id": 1, "content": "Did we capture it all correctly? Anything you would like to add?", "attachments": []},
+        {"author_id": 2, "content": "", "attachments": [{"filename": "jam.png"}]},
+        {"author_id": 2, "content": "looks good", "attachments": []},
+        {"author_id": 2, "content": "thanks!", "attachments": []},
+    ]}
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(transcript, f)
+    try:
+        turns = list(eval_intent_router.transcript_turns(path))
+        assert turns[0] == ("The printer is jammed", 0, False)
+        total, intents, handled = eval_intent_router.evaluate(IntentRouter(enabled=True), turns)
+        assert total == 4
+        assert sum(handled.values()) == 3
+        assert intents[SUBSTANTIVE] == 1
+    finally:
+        os.remove(path)
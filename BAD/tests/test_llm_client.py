@@ -0,0 +1,152 @@
+import unittest
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agent.llm_client import LLMClient, RateLimiter
+
+class FakeModel:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+
+    async def generate_content_async(self, contents, **kwargs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            return f"reply to {contents}"
+        finally:
+            self.running -= 1
+
+class TestLLMClient(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_is_limited(self):
+        client = LLMClient(max_concurrency=2, timeout=5)
+        model = FakeModel()
+        results = await asyncio.gather(*[client.generate(model, f"msg {i}") for i in range(6)])
+
+        self.assertEqual(results, [f"reply to msg {i}" for i in range(6)])
+        self.assertEqual(model.peak, 2)
+
+    async def test_timeout(self):
+        client = LLMClient(max_concurrency=2, timeout=0.01)
+        with self.assertRaises(asyncio.TimeoutError):
+            await client.generate(FakeModel(delay=1), "slow")
+        self.assertEqual(client.in_flight(), 0)
+
+    async def test_cancel_by_key(self):
+        client = LLMClient(max_concurrency=1, timeout=5)
+        model = FakeModel(delay=1)
+        doomed = asyncio.create_task(client.generate(model, "a", key=123))
+        queued = asyncio.create_task(client.generate(model, "b", key=123))
+        other = asyncio.create_task(client.generate(FakeModel(delay=0.01), "c", key=456))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(client.cancel("123"), 2)
+        for task in (doomed, queued):
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        self.assertEqual(await other, "reply to c")
+        self.assertEqual(client.in_flight(), 0)
+
+class RateLimitedError(Exception):
+    pass
+
+class FlakyModel(FakeModel):
+    def __init__(self, errors):
+        super().__init__(delay=0)
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def generate_content_async(self, contents, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return await super().generate_content_async(contents, **kwargs)
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_channels_served_round_robin(self):
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=0) # 100 requests/s
+        limiter._requests = 0 # Quota spent: everyone queues
+        granted = []
+
+        async def request(key):
+            await limiter.acquire(key)
+            granted.append(key)
+
+        tasks = [asyncio.create_task(request(key)) for key in ["busy", "busy", "busy", "quiet"]]
+        await asyncio.gather(*tasks)
+        self.assertEqual(granted, ["busy", "quiet", "busy", "busy"])
+
+    async def test_token_budget_queues_until_refilled(self):
+        limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=60000) # 1000 tokens/s
+        await limiter.acquire("a", tokens=60000)
+        limiter.record_usage(60000, 60050) # Real usage was higher
+
+        start = time.monotonic()
+        await limiter.acquire("a", tokens=50)
+        self.assertGreaterEqual(time.monotonic() - start, 0.08)
+
+    async def test_retry_after_hint_is_honoured(self):
+        limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+        client = LLMClient(rate_limiter=limiter, max_retries=2)
+        model = FlakyModel([RateLimitedError("429 Resource exhausted. Please retry in 0.05s.")])
+
+        with patch("src.agent.llm_client.random.uniform", return_value=0):
+            start = time.monotonic()
+            self.assertEqual(await client.generate(model, "hi"), "reply to hi")
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(model.calls, 2)
+
+    async def test_gives_up_after_max_retries(self):
+        client = LLMClient(rate_limiter=RateLimiter(0, 0), max_retries=2, backoff_base=0.001)
+        model = FlakyModel([RateLimitedError("429")] * 5)
+        with self.assertRaises(RateLimitedError):
+            await client.generate(model, "hi")
+        self.assertEqual(model.calls, 3)
+
+        # Other errors are not retried
+        model = FlakyModel([ValueError("bad request")])
+        with self.assertRaises(ValueError):
+            await client.generate(model, "hi")
+        self.assertEqual(model.calls, 1)
+
+class FakeRecorder:
+    def __init__(self):
+        self.rows = []
+
+    def record(self, **row):
+        self.rows.append(row)
+
+class UsageModel(FakeModel):
+    model_name = "models/fake"
+
+    async def generate_content_async(self, contents, **kwargs):
+        if contents == "boom":
+            raise ValueError("bad request")
+        usage = SimpleNamespace(prompt_token_count=12, candidates_token_count=3, cached_content_token_count=0, total_token_count=15)
+        return SimpleNamespace(text="ok", usage_metadata=usage)
+
+class TestUsageReporting(unittest.IsolatedAsyncioTestCase):
+    async def test_every_call_is_reported(self):
+        recorder = FakeRecorder()
+        client = LLMClient(rate_limiter=RateLimiter(0, 0), usage_recorder=recorder)
+        await client.generate(UsageModel(), "hello", key=7, mode="manager")
+        with self.assertRaises(ValueError):
+            await client.generate(UsageModel(), "boom", key=7)
+
+        ok, failed = recorder.rows
+        self.assertEqual((ok["channel_id"], ok["mode"], ok["model"], ok["status"]), (7, "manager", "models/fake", "ok"))
+        self.assertEqual((ok["prompt_tokens"], ok["output_tokens"], ok["retries"]), (12, 3, 0))
+        self.assertGreaterEqual(ok["latency_ms"], 0)
+        self.assertEqual(failed["status"], "ValueError")
+        self.assertEqual(failed["output_tokens"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import pytest
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.agent.memory_store import MemoryStore, memory_entries
+from src.agent.prompts import PromptBuilder
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def make_store(**kwargs):
+    return MemoryStore(legacy_path=None, **kwargs)
+
+def test_memory_entries_mapping():
+    assert memory_entries("  likes tea ") == [("notes", None, "likes tea")]
+    assert memory_entries({"preferences": {"issues_display": "no_embeds"}, "timezone": "CET", "notes": ["a", ""]}) == [
+        ("preferences", "issues_display", "no_embeds"), ("general", "timezone", "CET"), ("notes", None, "a")
+    ]
+
+def test_keyed_facts_are_replaced_and_pinned():
+    store = make_store()
+    assert store.save({"preferences": {"issues_display": "embeds"}})
+    assert store.save({"preferences": {"issues_display": "no_embeds"}})
+    store.save("The staging server is called bear-stage-01")
+
+    store.refresh()
+    text, digest = store.pinned()
+    assert json.loads(text) == {"preferences": {"issues_display": "no_embeds"}}
+    assert db.count_memories() == 2
+
+    # Unchanged facts: same bytes, so the cached prompt prefix stays valid
+    store.refresh()
+    assert store.pinned() == (text, digest)
+
+def test_pinned_block_is_capped():
+    store = make_store(pinned_max_chars=200)
+    for i in range(50):
+        store.save({"facts": {f"fact_{i}": "x" * 20}})
+    store.refresh()
+    assert 0 < len(store.pinned()[0]) <= 220
+    assert "fact_49" in store.pinned()[0] # Newest kept
+
+def test_only_top_k_relevant_notes():
+    store = make_store(top_k=2)
+    for i in range(200):
+        store.save(f"Routine note number {i} about lunch orders")
+    store.save("The staging server is called bear-stage-01")
+    store.save("Deploys to the staging server happen on Fridays")
+
+    notes = store._prepare("Which server is staging?")
+    assert sorted(notes) == ["Deploys to the staging server happen on Fridays", "The staging server is called bear-stage-01"]
+    assert store._prepare("") == []
+    assert store._prepare('"; DROP TABLE memories; --') == [] # Query text is never FTS syntax
+
+def test_legacy_file_imported_once():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write('{"preferences": {"issues_display": "no_embeds"}, "notes": ["Prefers short answers"]}')
+    try:
+        store = MemoryStore(legacy_path=path)
+        notes = asyncio.run(store.prepare("short answers please"))
+        assert notes == ["Prefers short answers"]
+        assert "no_embeds" in store.pinned()[0]
+        assert not os.path.exists(path) and os.path.exists(path + ".migrated")
+        assert MemoryStore(legacy_path=path).import_legacy() is False
+    finally:
+        for p in (path, path + ".migrated"):
+            if os.path.exists(p):
+                os.remove(p)
+
+def test_plain_text_legacy_file():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write("set preferences issues_display no_embeds")
+    try:
+        assert MemoryStore(legacy_path=path).import_legacy()
+        assert [m['content'] for m in db.search_memories("issues_display")] == ["set preferences issues_display no_embeds"]
+    finally:
+        os.remove(path + ".migrated")
+
+def test_failed_legacy_import_is_retried():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        f.write('{"notes": ["Prefers short answers"]}')
+    try:
+        store = MemoryStore(legacy_path=path)
+        with patch.object(db, "save_memories", side_effect=sqlite3.OperationalError("database is locked")):
+            assert asyncio.run(store.prepare("short answers")) == []
+        assert os.path.exists(path) and not os.path.exists(f"{path}.importing.{os.getpid()}")
+        assert not store._legacy_checked
+
+        assert asyncio.run(store.prepare("short answers")) == ["Prefers short answers"]
+        assert store._legacy_checked and os.path.exists(path + ".migrated")
+    finally:
+        for p in (path, path + ".migrated"):
+            if os.path.exists(p):
+                os.remove(p)
+
+def test_prompt_uses_pinned_facts_and_relevant_notes():
+    store = make_store()
+    store.save({"preferences": {"tone": "formal"}})
+    store.save("The VPN gateway is vpn.example.com")
+    builder = PromptBuilder(memory_provider=store.pinned)
+
+    notes = store._prepare("how do I reach the vpn")
+    text, _ = builder.system_instruction("ticket_assistant")
+    assert '"tone": "formal"' in text and "vpn.example.com" not in text
+
+    suffix = builder.dynamic_suffix("how do I reach the vpn", memories=notes)
+    assert "RELEVANT MEMORY:\n- The VPN gateway is vpn.example.com" in suffix
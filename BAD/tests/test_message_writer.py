@@ -0,0 +1,101 @@
+import pytest
+import os
+import sqlite3
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.agent.conversation_manager import ConversationManager
+from src.agent.message_writer import MessageWriter
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def count_messages(conversation_id):
+    conn = db.get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+def test_messages_grouped_into_one_commit():
+    writer = MessageWriter(flush_interval=10, max_batch=1000) # Window never closes on its own
+    cid = db.create_conversation("chan-batch")
+
+    with patch.object(db, "add_messages", wraps=db.add_messages) as add_messages:
+        for i in range(25):
+            writer.add(cid, 'user', f"line {i}")
+        assert count_messages(cid) == 0
+
+        writer.flush()
+        assert add_messages.call_count == 1
+    assert count_messages(cid) == 25
+    writer.close()
+
+def test_full_batch_commits_without_waiting_for_window():
+    writer = MessageWriter(flush_interval=10, max_batch=5)
+    cid = db.create_conversation("chan-full")
+    for i in range(5):
+        writer.add(cid, 'user', f"line {i}")
+
+    deadline = time.monotonic() + 2
+    while count_messages(cid) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert count_messages(cid) == 5
+    writer.close()
+
+def test_history_reads_its_own_writes():
+    writer = MessageWriter(flush_interval=10)
+    cm = ConversationManager(message_writer=writer)
+    channel_id = "chan-ryw"
+
+    cm.add_user_message(channel_id, "User Message 1")
+    cm.add_bot_message(channel_id, "Bot Reply 1")
+
+    assert cm.get_history(channel_id) == ["User: User Message 1", "Bot: Bot Reply 1"] # Write-through cache
+
+    db.hot_cache().clear()
+    with patch.object(db, "add_messages", side_effect=AssertionError("commit on a reader")):
+        assert cm.get_history(channel_id) == [] # A pure read: buffered rows aren't committed
+    db.hot_cache().clear()
+    cm.flush() # What the bots do on the writer thread first
+    assert cm.get_history(channel_id) == ["User: User Message 1", "Bot: Bot Reply 1"]
+    writer.close()
+
+def test_close_flushes_and_falls_back_to_direct_writes():
+    writer = MessageWriter(flush_interval=10)
+    cid = db.create_conversation("chan-close")
+    writer.add(cid, 'user', "before close")
+    writer.close()
+    assert count_messages(cid) == 1
+
+    writer.add(cid, 'user', "after close")
+    assert count_messages(cid) == 2
+
+def test_bad_row_is_dropped_after_retries():
+    writer = MessageWriter(flush_interval=10, max_retries=2)
+    cid = db.create_conversation("chan-bad")
+    original = db.add_messages
+
+    def add_messages(rows):
+        if any(content == "poison" for _, _, content in rows):
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        original(rows)
+
+    with patch.object(db, "add_messages", side_effect=add_messages):
+        writer.add(cid, 'user', "before")
+        writer.add(cid, 'user', "poison")
+        writer.add(cid, 'user', "after")
+        with pytest.raises(sqlite3.IntegrityError):
+            writer.flush()
+        assert writer.has_pending() and count_messages(cid) == 0 # Retried with the next window
+
+        with pytest.raises(sqlite3.IntegrityError):
+            writer.flush()
+        assert not writer.has_pending() and count_messages(cid) == 2 # Only the bad row is gone
+
+        writer.add(cid, 'user', "later")
+        writer.flush()
+    assert count_messages(cid) == 3
+    writer.close()
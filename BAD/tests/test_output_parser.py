@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.output_parser import (
+    CloseTicket, OutputStreamParser, ProposeTicket, Remember, RunScript,
+    parse_action, parse_actions, parse_model_output, repair_json, validate_output
+)
+
+def test_plain_json():
+    assert parse_model_output('{"reply": "hi", "actions": []}') == {"reply": "hi", "actions": []}
+
+def test_fenced_json_with_nested_code_block():
+    text = 'Sure!\n```json\n{"reply": "use ```x```", "actions": ["close_ticket"]}\n```\nDone.'
+    assert parse_model_output(text) == {"reply": "use ```x```", "actions": ["close_ticket"]}
+
+def test_skips_stray_braces_before_the_object():
+    text = 'Note {not json} and {"a": 1} then {"reply": "ok", "actions": [{"type": "close_ticket"}]}'
+    assert parse_model_output(text)["reply"] == "ok"
+
+def test_repairs_trailing_commas_and_python_literals():
+    text = '{"reply": "ok", "actions": ["a", "b",], "execute_now": True,}'
+    assert parse_model_output(text) == {"reply": "ok", "actions": ["a", "b"], "execute_now": True}
+
+def test_repairs_raw_newline_in_string():
+    assert parse_model_output('{"reply": "line1\nline2"}')["reply"] == "line1\nline2"
+
+def test_repairs_truncated_output():
+    assert parse_model_output('{"reply": "Hello wor') == {"reply": "Hello wor"}
+    assert parse_model_output('{"reply": "Hi", "actions": ["close_ticket"], "execute_n') == {"reply": "Hi", "actions": ["close_ticket"]}
+
+def test_repair_leaves_literal_words_in_strings_alone():
+    assert json.loads(repair_json('{"reply": "True story, None left", "x": None,}')) == {"reply": "True story, None left", "x": None}
+
+def test_unparseable_returns_none():
+    assert parse_model_output("no json here") is None
+    assert parse_model_output("") is None
+
+def test_validate_output_coerces_fields():
+    result = validate_output({"reply": None, "actions": "close_ticket", "execute_now": "false"})
+    assert result["reply"] == ""
+    assert result["actions"] == ["close_ticket"]
+    assert result["execute_now"] is False
+
+    result = validate_output({"actions": [{"type": "propose_ticket", "title": "Login", "urgency": "High", "description": "500s"}]})
+    assert result["actions"] == ["propose_ticket | Login | High | 500s"]
+
+def test_parse_propose_ticket_keeps_pipes_in_description():
+    action = parse_action("propose_ticket | Login broken | High | Fails on a | b input")
+    assert action == ProposeTicket("Login broken", "High", "Fails on a | b input", raw="propose_ticket | Login broken | High | Fails on a | b input")
+
+def test_parse_propose_ticket_defaults():
+    action = parse_action("propose_ticket")
+    assert (action.title, action.urgency, action.description) == ("Untitled", "Normal", "No description")
+
+def test_parse_other_actions():
+    assert isinstance(parse_action("close_ticket"), CloseTicket)
+    assert parse_action('remember {"team": "core"}').content == {"team": "core"}
+    assert parse_action("remember the deploy day is Friday") == Remember("the deploy day is Friday", raw="remember the deploy day is Friday")
+    script = parse_action("git_status repo-a --short")
+    assert isinstance(script, RunScript) and script.name == "git_status" and script.args == ["repo-a", "--short"]
+    assert parse_actions(["", "close_ticket"]) == [CloseTicket()]
+
+def test_stream_parser_reply_then_result():
+    parser = OutputStreamParser()
+    text = '{"thought_process": "t", "reply": "Hello there", "actions": ["close_ticket"], "execute_now": true}'
+    replies = [parser.reply for chunk in (text[i:i + 7] for i in range(0, len(text), 7)) if parser.feed(chunk)]
+    assert replies[-1] == "Hello there"
+    assert parser.result()["actions"] == ["close_ticket"]
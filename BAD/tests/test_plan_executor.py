@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agent.plan_executor import execute_plan
+
+def test_mixed_plan_runs_every_script():
+    sent, scripts, memories = [], [], []
+
+    async def send(text):
+        sent.append(text)
+
+    async def run_script(name, args):
+        scripts.append((name, args))
+        return f"done {name}"
+
+    async def save_memory(content):
+        memories.append(content)
+        return True
+
+    plan = [
+        'propose_ticket "VPN down" High "Cannot connect"',
+        "deploy staging",
+        {"type": "close_ticket"},
+        "remember The VPN gateway moved",
+        "",
+        "restart_bot",
+    ]
+    results = asyncio.run(execute_plan(plan, save_memory, run_script, send))
+
+    assert scripts == [("deploy", ["staging"]), ("restart_bot", [])]
+    assert results == ["done deploy", "done restart_bot"]
+    assert memories == ["The VPN gateway moved"]
+    assert "✅ I have updated my long-term memory." in sent
+
+def test_failed_memory_is_reported():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    async def run_script(name, args):
+        raise AssertionError("no scripts in this plan")
+
+    async def save_memory(content):
+        return False
+
+    asyncio.run(execute_plan(["remember x"], save_memory, run_script, send))
+    assert sent == ["❌ Failed to save memory."]
@@ -0,0 +1,53 @@
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agent.prompts import PromptBuilder
+
+class Memory:
+    """Stands in for MemoryStore.pinned: (text, digest) of the current facts."""
+    def __init__(self, text):
+        self.text = text
+
+    def __call__(self):
+        return self.text, str(hash(self.text))
+
+def make_builder(memory='{"notes": ["likes tea"]}'):
+    provider = Memory(memory)
+    return PromptBuilder(memory_provider=provider), provider
+
+def test_prefix_follows_memory_changes():
+    builder, memory = make_builder()
+    first = builder.system_instruction("default", [])
+    assert "likes tea" in first[0]
+    memory.text = '{"notes": ["likes coffee"]}'
+    second = builder.system_instruction("default", [])
+    assert "likes coffee" in second[0] and second[1] != first[1]
+
+    assert "{}" in PromptBuilder().system_instruction("default", [])[0] # No provider: empty memory
+
+def test_prefix_compiled_once_and_stable():
+    builder, _ = make_builder()
+    actions = ["list_issues", "get_issue <n>"]
+    text, digest = builder.system_instruction("default", actions)
+    assert "likes tea" in text and '"list_issues"' in text
+    assert "{memory}" not in text and "{actions}" not in text
+
+    with patch("src.agent.prompts.json.dumps", side_effect=AssertionError("re-serialised")):
+        assert builder.system_instruction("default", list(actions)) == (text, digest)
+
+    # Modes without an actions block don't depend on the actions
+    assert builder.system_instruction("ticket_assistant", ["x"]) == builder.system_instruction("ticket_assistant", ["y"])
+
+def test_dynamic_parts_stay_out_of_prefix():
+    builder, _ = make_builder('{"notes": ["literal {actions} text"]}')
+    text, _ = builder.system_instruction("manager", [])
+    assert "literal {actions} text" in text
+    assert "CURRENT STATUS:\n" not in text
+
+    suffix = builder.dynamic_suffix("hello", ["User: hi"], {"sync_status": "Environment Synced"})
+    assert suffix.startswith("CURRENT STATUS:\nSync Status: Environment Synced")
+    assert "CONVERSATION HISTORY:\nUser: hi\n" in suffix
+    assert suffix.endswith("USER MESSAGE: hello")
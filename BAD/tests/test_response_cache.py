@@ -0,0 +1,98 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.agent.response_cache import ResponseCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = self.db_path
+        db.init_db()
+        self.calls = 0
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self.original_db_path
+        os.close(self.db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    async def compute(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"reply": f"answer {self.calls}", "actions": []}
+
+    async def test_normalised_prompts_share_an_entry(self):
+        cache = ResponseCache()
+        key = cache.make_key("manager", "prefix1", "USER MESSAGE:  What's the   status?")
+        self.assertEqual(key, cache.make_key("manager", "prefix1", "user message: what's the status?\n"))
+        self.assertNotEqual(key, cache.make_key("default", "prefix1", "user message: what's the status?"))
+        self.assertNotEqual(key, cache.make_key("manager", "prefix2", "user message: what's the status?"))
+
+        first = await cache.get_or_compute(key, self.compute)
+        first["reply"] = "mutated by caller"
+        self.assertEqual(await cache.get_or_compute(key, self.compute), {"reply": "answer 1", "actions": []})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    async def test_ttl_and_lru(self):
+        clock = Clock()
+        cache = ResponseCache(ttl=60, max_entries=2, clock=clock)
+        await cache.get_or_compute("a", self.compute)
+        await cache.get_or_compute("b", self.compute)
+        await cache.get_or_compute("a", self.compute) # a is now most recent
+        await cache.get_or_compute("c", self.compute) # evicts b
+        self.assertEqual(self.calls, 3)
+        await cache.get_or_compute("b", self.compute)
+        self.assertEqual(self.calls, 4)
+
+        clock.now += 61
+        await cache.get_or_compute("c", self.compute)
+        self.assertEqual(self.calls, 5)
+
+    async def test_concurrent_identical_calls_coalesced(self):
+        cache = ResponseCache()
+        results = await asyncio.gather(*[cache.get_or_compute("k", self.compute) for _ in range(5)])
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(r == {"reply": "answer 1", "actions": []} for r in results))
+        self.assertEqual(cache.stats()["coalesced"], 4)
+
+    async def test_failures_are_not_cached(self):
+        cache = ResponseCache()
+
+        async def boom():
+            raise ValueError("upstream down")
+
+        with self.assertRaises(ValueError):
+            await cache.get_or_compute("k", boom)
+        self.assertEqual(await cache.get_or_compute("k", self.compute), {"reply": "answer 1", "actions": []})
+
+    async def test_persistent_backend_survives_restart(self):
+        clock = Clock()
+        await ResponseCache(persist=True, clock=clock).get_or_compute("k", self.compute)
+
+        restarted = ResponseCache(persist=True, clock=clock)
+        self.assertEqual(await restarted.get_or_compute("k", self.compute), {"reply": "answer 1", "actions": []})
+        self.assertEqual(self.calls, 1)
+
+        clock.now += 10_000 # Expired on disk too
+        await ResponseCache(persist=True, clock=clock).get_or_compute("k", self.compute)
+        self.assertEqual(self.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+pytestmark = pytest.mark.usefixtures("test_db_path")
+
+def tables():
+    conn = db.get_connection()
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    return names
+
+def test_fresh_database_gets_every_step_once():
+    applied = db.init_db()
+    assert [v for v, _ in applied] == [v for v, _, _ in db.MIGRATIONS]
+    assert db.get_schema_version() == db.SCHEMA_VERSION
+    assert {"tickets", "messages", "llm_usage", "memories", "ticket_stats", "schema_version"} <= tables()
+
+    assert db.init_db() == []
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(db.MIGRATIONS)
+    conn.close()
+
+def test_startup_fast_path_is_one_query():
+    db.init_db()
+    statements = []
+    conn = db.get_connection()
+    conn.set_trace_callback(statements.append)
+    conn.close() # Back to the pool: init_db gets this connection again
+    db.init_db()
+    conn = db.get_connection()
+    conn.set_trace_callback(None)
+    conn.close()
+    assert statements == ["SELECT MAX(version) FROM schema_version"]
+
+def test_dry_run_changes_nothing():
+    pending = db.init_db(dry_run=True)
+    assert pending == [(v, name) for v, name, _ in db.MIGRATIONS]
+    assert "tickets" not in tables()
+    assert db.get_schema_version() == 0
+
+    db.init_db()
+    assert db.init_db(dry_run=True) == []
+
+def test_pre_framework_database_is_adopted():
+    db.init_db()
+    ticket_id = db.create_ticket_record("c1", "g", "u", "user")
+    db.update_ticket_details("c1", "VPN", "Down", "High")
+    conn = db.get_connection() # As left by the old init_db: full schema, no version table
+    conn.execute("DROP TABLE schema_version")
+    conn.commit()
+    conn.close()
+
+    assert len(db.init_db()) == len(db.MIGRATIONS) # Replayed, all steps are idempotent
+    assert db.get_ticket_by_id(ticket_id)['urgency_score'] == 8
+    assert db.search_tickets("vpn")[1] == 1
+
+def test_failed_step_is_rolled_back(monkeypatch):
+    db.init_db()
+
+    def broken_step(cursor):
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(db, "MIGRATIONS", db.MIGRATIONS + [(db.SCHEMA_VERSION + 1, "broken", broken_step)])
+    monkeypatch.setattr(db, "SCHEMA_VERSION", db.SCHEMA_VERSION + 1)
+    with pytest.raises(RuntimeError):
+        db.init_db()
+    assert "half_done" not in tables()
+    assert db.get_schema_version() == db.SCHEMA_VERSION - 1
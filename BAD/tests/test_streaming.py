@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agent.streaming import ReplyStreamParser
+from src.agent.llm_client import LLMClient, RateLimiter
+from src.bridge.streaming_reply import StreamingReply
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class TestReplyStreamParser(unittest.TestCase):
+    def test_reply_extracted_incrementally(self):
+        payload = json.dumps({
+            "thought_process": 'The user said "reply": "fake" here',
+            "reply": 'Hi "Sam"!\nLine 2 é \\ done',
+            "actions": ["propose_ticket | A | 5 | {\"reply\": 1}"],
+        })
+        parser = ReplyStreamParser()
+        seen = []
+        for piece in chunked(payload, 3): # Splits escapes like \" and é across chunks
+            if parser.feed(piece):
+                seen.append(parser.reply)
+
+        self.assertEqual(parser.reply, 'Hi "Sam"!\nLine 2 é \\ done')
+        self.assertTrue(parser.done)
+        self.assertGreater(len(seen), 3)
+        self.assertTrue(all(parser.reply.startswith(s) for s in seen))
+
+    def test_nested_reply_keys_are_ignored(self):
+        parser = ReplyStreamParser()
+        parser.feed('{"meta": {"reply": "inner"}, "reply": "outer"}')
+        self.assertEqual(parser.reply, "outer")
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = []
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.edits.append((content, kwargs))
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+class TestStreamingReply(unittest.IsolatedAsyncioTestCase):
+    async def test_first_text_sent_then_edits_coalesced(self):
+        channel = FakeChannel()
+        streamed = StreamingReply(channel, edit_interval=0.05)
+        text = ""
+        for word in ["Hello", " there,", " how", " can", " I", " help?"]:
+            text += word
+            await streamed.update(text)
+        self.assertEqual(len(channel.sent), 1)
+        self.assertEqual(channel.sent[0].content, "Hello")
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(channel.sent[0].edits, [("Hello there, how can I help?", {})]) # One edit for 5 updates
+
+        await streamed.finish("Hello there, how can I help?", embed="EMBED")
+        self.assertEqual(channel.sent[0].edits[-1], ("Hello there, how can I help?", {"embed": "EMBED"}))
+        self.assertEqual(len(channel.sent), 1)
+
+    async def test_long_reply_continues_in_new_messages(self):
+        channel = FakeChannel()
+        streamed = StreamingReply(channel, edit_interval=10)
+        await streamed.update("x" * 10)
+        await streamed.finish("x" * 4500)
+        self.assertEqual([len(m.content) for m in channel.sent], [2000, 2000, 500])
+
+class FakeStreamResponse:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            await asyncio.sleep(0)
+            yield type("Chunk", (), {"text": piece})()
+
+class FakeStreamingModel:
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        assert stream
+        return FakeStreamResponse(chunked('{"reply": "streamed answer", "actions": []}', 5))
+
+class TestClientStream(unittest.IsolatedAsyncioTestCase):
+    async def test_stream_yields_chunks(self):
+        client = LLMClient(rate_limiter=RateLimiter(0, 0))
+        parser = ReplyStreamParser()
+        text = ""
+        async for chunk in client.stream(FakeStreamingModel(), "hi", key="chan"):
+            text += chunk.text
+            parser.feed(chunk.text)
+        self.assertEqual(json.loads(text)["reply"], "streamed answer")
+        self.assertEqual(parser.reply, "streamed answer")
+        self.assertEqual(client.in_flight(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
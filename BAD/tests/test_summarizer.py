@@ -0,0 +1,90 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.agent.conversation_manager import ConversationManager
+from src.agent.summarizer import ConversationSummarizer
+
+class FakeBrain:
+    def __init__(self, result="User wants a new laptop."):
+        self.result = result
+        self.calls = []
+
+    async def summarize(self, previous_summary, lines, max_chars=1500):
+        self.calls.append((previous_summary, list(lines)))
+        return self.result
+
+class TestSummarizer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        self.original_db_path = db.DB_PATH
+        db.DB_PATH = self.db_path
+        db.init_db()
+        self.cm = ConversationManager()
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self.original_db_path
+        os.close(self.db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    async def test_short_conversation_is_left_alone(self):
+        brain = FakeBrain()
+        summarizer = ConversationSummarizer(brain, self.cm, trigger=10, keep_recent=4)
+        for i in range(5):
+            self.cm.add_user_message("chan-s1", f"Msg {i}")
+
+        self.assertFalse(await summarizer.maybe_summarize("chan-s1"))
+        self.assertEqual(brain.calls, [])
+
+    async def test_older_turns_folded_into_summary(self):
+        brain = FakeBrain()
+        summarizer = ConversationSummarizer(brain, self.cm, trigger=10, keep_recent=4)
+        for i in range(12):
+            self.cm.add_user_message("chan-s2", f"Msg {i}")
+
+        self.assertTrue(await summarizer.maybe_summarize("chan-s2"))
+        self.assertEqual(brain.calls[0], (None, [f"User: Msg {i}" for i in range(8)]))
+
+        history = self.cm.get_history("chan-s2")
+        self.assertEqual(history[0], "Summary of earlier conversation: User wants a new laptop.")
+        self.assertEqual(history[1:], [f"User: Msg {i}" for i in range(8, 12)])
+
+        # New turns are appended after the summary, and the next pass builds on it
+        for i in range(12, 19):
+            self.cm.add_user_message("chan-s2", f"Msg {i}")
+        self.assertEqual(len(self.cm.get_history("chan-s2")), 1 + 11)
+        brain.result = "Updated summary."
+        self.assertTrue(await summarizer.maybe_summarize("chan-s2"))
+        self.assertEqual(brain.calls[1][0], "User wants a new laptop.")
+        self.assertEqual(brain.calls[1][1], [f"User: Msg {i}" for i in range(8, 15)])
+        self.assertEqual(self.cm.get_history("chan-s2")[0], "Summary of earlier conversation: Updated summary.")
+
+    async def test_failed_summary_keeps_raw_history(self):
+        summarizer = ConversationSummarizer(FakeBrain(result=None), self.cm, trigger=3, keep_recent=1)
+        for i in range(5):
+            self.cm.add_user_message("chan-s3", f"Msg {i}")
+
+        self.assertFalse(await summarizer.maybe_summarize("chan-s3"))
+        self.assertEqual(self.cm.get_history("chan-s3"), [f"User: Msg {i}" for i in range(5)])
+
+    async def test_deleting_conversation_removes_summary(self):
+        summarizer = ConversationSummarizer(FakeBrain(), self.cm, trigger=3, keep_recent=1)
+        for i in range(5):
+            self.cm.add_user_message("chan-s4", f"Msg {i}")
+        await summarizer.maybe_summarize("chan-s4")
+
+        self.cm.delete_conversation("chan-s4")
+        conn = db.get_connection()
+        count = conn.execute("SELECT COUNT(*) FROM conversation_summaries").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def seed(n=25):
+    """n tickets alternating closed/archived; several share a created_at second, so id breaks ties."""
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO tickets (channel_id, user_id, user_name, status, title, urgency, urgency_score, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(str(i), str(i % 3), "u", "closed" if i % 2 else "archived", f"Ticket {i}", "High" if i % 5 == 0 else "Low",
+          8 if i % 5 == 0 else 2, f"2025-01-01 10:00:{i // 3:02d}") for i in range(n)]
+    )
+    conn.commit()
+    conn.close()
+
+def walk(limit=10, **filters):
+    """All pages front to back via `after` cursors."""
+    pages, cursor = [], None
+    while True:
+        page = db.get_tickets_page(limit=limit, after=cursor, **filters)
+        if not page:
+            return pages
+        pages.append([t['id'] for t in page])
+        cursor = db.encode_ticket_cursor(page[-1])
+
+def test_keyset_pages_match_offset_order():
+    seed()
+    expected = [t['id'] for t in db.get_tickets_with_filter(status=['closed', 'archived'], limit=100)[0]]
+    pages = walk(status=['closed', 'archived'])
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == sorted(expected, reverse=True) # created_at DESC, id DESC
+
+    oldest = walk(status=['closed', 'archived'], sort_desc=False)
+    assert sum(oldest, []) == sorted(expected)
+
+def test_previous_and_last_pages():
+    seed()
+    pages = walk(status=['closed', 'archived'])
+    second = db.get_tickets_page(status=['closed', 'archived'], limit=10, after=db.encode_ticket_cursor({'created_at': "2025-01-01 10:00:05", 'id': 15}))
+    assert [t['id'] for t in second] == pages[1]
+
+    first = db.get_tickets_page(status=['closed', 'archived'], limit=10, before=db.encode_ticket_cursor(second[0]))
+    assert [t['id'] for t in first] == pages[0]
+
+    last = db.get_tickets_page(status=['closed', 'archived'], limit=5, last=True)
+    assert [t['id'] for t in last] == pages[2]
+
+def test_filters():
+    seed()
+    ids = sum(walk(limit=3, status='closed', user_id='1', urgency='Low'), [])
+    assert ids == [t['id'] for t in db.get_tickets_with_filter(status='closed', user_id='1', urgency='Low', limit=100)[0]]
+    assert ids == [20, 14, 8, 2] # Seeds 19, 13, 7, 1 (id = i + 1)
+
+def test_pages_seek_the_index():
+    plan = db.get_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM tickets WHERE status = ? AND user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 10",
+        ('closed', '1', '2025-01-01', 5)
+    ).fetchall()
+    details = " ".join(row[3] for row in plan)
+    assert "idx_tickets_user_status_created" in details and "TEMP B-TREE" not in details
+
+def test_counts_are_cached_until_a_ticket_changes():
+    seed()
+    assert db.count_tickets(status=['closed', 'archived']) == 25
+
+    conn = db.get_connection() # Another process writing: only the TTL notices
+    conn.execute("UPDATE tickets SET status = 'active' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    assert db.count_tickets(status=['closed', 'archived']) == 25
+    assert db.count_tickets(status=['closed', 'archived'], ttl=0) == 24
+
+    db.update_ticket_status("2", "active") # Writes in this process invalidate at once
+    assert db.count_tickets(status=['closed', 'archived']) == 23
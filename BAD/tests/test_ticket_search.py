@@ -0,0 +1,91 @@
+import pytest
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.archive_index import reindex_archives, transcript_text
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def make_ticket(channel_id, title, description, user_name="alice", status="closed", urgency="Low"):
+    ticket_id = db.create_ticket_record(channel_id, "guild", f"user_{user_name}", user_name)
+    db.update_ticket_details(channel_id, title, description, urgency)
+    db.update_ticket_status(channel_id, status)
+    return ticket_id
+
+def test_ranked_search_with_snippets():
+    vpn = make_ticket("1", "VPN drops every hour", "The VPN disconnects on the office wifi")
+    printer = make_ticket("2", "Printer jammed", "Paper jam on floor 2, not the vpn")
+    make_ticket("3", "Laptop is slow", "Takes minutes to boot")
+
+    tickets, total = db.search_tickets("vpn", status=["closed"])
+    assert total == 2
+    assert [t['id'] for t in tickets] == [vpn, printer] # Title match ranks first
+    assert "**VPN**" in tickets[0]['snippet']
+
+    # All words must match, the last as a prefix
+    assert [t['id'] for t in db.search_tickets("paper ja")[0]] == [printer]
+    assert db.search_tickets("printer vpn hour")[1] == 0
+    assert db.search_tickets('"; DROP TABLE tickets; --')[1] == 0
+
+def test_index_follows_ticket_changes():
+    make_ticket("1", "Old title", "Nothing here")
+    db.update_ticket_details("1", "Badge reader broken", "Door 4", "High")
+    assert db.search_tickets("old")[1] == 0
+    assert db.search_tickets("badge")[1] == 1
+    assert db.search_tickets("badge", urgency="Low")[1] == 0
+
+def test_filters_and_paging():
+    for i in range(12):
+        make_ticket(str(i), f"Email issue {i}", "Outlook", user_name="bob" if i % 2 else "carol")
+    tickets, total = db.search_tickets("email", user_id="user_bob", limit=5)
+    assert total == 6 and len(tickets) == 5
+    assert all(t['user_name'] == "bob" for t in tickets)
+    tickets, total = db.search_tickets("email", user_id="user_bob", limit=5, offset=10)
+    assert tickets == [] and total == 6
+
+    newest = db.search_tickets("email", order='newest', limit=12)[0]
+    assert [t['id'] for t in newest] == sorted((t['id'] for t in newest), reverse=True)
+
+def test_legacy_filter_uses_index():
+    make_ticket("1", "Printer jammed", "Floor 2")
+    make_ticket("2", "VPN", "Home office")
+    tickets, total = db.get_tickets_with_filter(status=["closed"], search_query="print")
+    assert total == 1 and tickets[0]['title'] == "Printer jammed"
+    assert db.get_tickets_with_filter(search_query="!!!")[1] == 2 # No words: no search filter
+
+def test_query_without_words_lists_filtered_tickets():
+    make_ticket("1", "Printer jammed", "Floor 2", user_name="bob")
+    make_ticket("2", "VPN", "Home office", user_name="carol")
+    tickets, total = db.search_tickets("!!! ?", user_id="user_bob")
+    assert total == 1 and tickets[0]['title'] == "Printer jammed"
+    assert db.search_tickets("", limit=1, offset=1)[1] == 2
+
+def test_archived_transcripts_are_searchable():
+    ticket_id = make_ticket("1", "Access request", "Needs a folder", status="archived")
+    transcript = {"meta": {"ticket_id": ticket_id}, "messages": [
+        {"author_name": "alice", "content": "I need the Q3 budget spreadsheet", "attachments": []},
+        {"author_name": "alice", "content": "", "attachments": [{"filename": "screenshot.png"}]},
+    ]}
+    assert transcript_text(transcript) == "alice: I need the Q3 budget spreadsheet\nalice: screenshot.png"
+
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, "2025", "01", str(ticket_id)))
+        with open(os.path.join(root, "2025", "01", str(ticket_id), "transcript.json"), 'w') as f:
+            json.dump(transcript, f)
+        os.makedirs(os.path.join(root, "2025", "01", "unknown"))
+        with open(os.path.join(root, "2025", "01", "unknown", "transcript.json"), 'w') as f:
+            json.dump({"meta": {"ticket_id": "unknown"}, "messages": []}, f)
+
+        assert reindex_archives(root) == (1, 1)
+        assert reindex_archives(root) == (1, 1) # Idempotent
+    finally:
+        shutil.rmtree(root)
+    tickets, total = db.search_tickets("budget spreadsheet", status=["archived"])
+    assert total == 1 and "**budget**" in tickets[0]['snippet']
@@ -0,0 +1,83 @@
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def counters():
+    stats = db.get_ticket_stats(active_limit=0, urgent_limit=0)
+    return stats['total_open'], stats['unassigned'], stats['urgent']
+
+def recount():
+    conn = db.get_connection()
+    row = conn.execute(f'''
+        SELECT COUNT(*) FILTER (WHERE status = 'active'),
+               COUNT(*) FILTER (WHERE status = 'active' AND (assigned_to IS NULL OR assigned_to = '')),
+               COUNT(*) FILTER (WHERE status = 'active' AND urgency_score >= {db.URGENT_SCORE})
+        FROM tickets
+    ''').fetchone()
+    conn.close()
+    return tuple(row)
+
+def test_counters_follow_every_mutation():
+    assert counters() == (0, 0, 0)
+    db.create_ticket_record("c1", "g", "u1", "alice")
+    db.update_ticket_details("c1", "VPN down", "Since 9am", "High")
+    assert counters() == (0, 0, 0) # Drafts don't count
+
+    db.update_ticket_status("c1", "active")
+    assert counters() == (1, 1, 1)
+
+    tid = db.create_ticket_record("pending", "g", "u2", "bob")
+    db.update_ticket_channel(tid, "c2", status="active")
+    db.update_ticket_details("c2", "Printer", "Jammed", None)
+    assert counters() == (2, 2, 1)
+
+    db.update_ticket_assignment("c1", "helper-1")
+    db.update_ticket_details("c2", "Printer", "Jammed", "10 - Critical")
+    assert counters() == (2, 1, 2)
+
+    db.update_ticket_assignment("c1", None)
+    db.update_ticket_status("c2", "closed")
+    db.mark_ticket_archived("c2")
+    assert counters() == (1, 1, 1) == recount()
+
+    conn = db.get_connection() # Raw SQL (another process, a script) is counted too
+    conn.execute("DELETE FROM tickets WHERE channel_id = 'c1'")
+    conn.commit()
+    conn.close()
+    assert counters() == (0, 0, 0)
+
+def test_lists_are_bounded():
+    for i in range(30):
+        db.create_ticket_record(f"c{i}", "g", "u", "user")
+        db.update_ticket_details(f"c{i}", f"Ticket {i}", "", "High" if i % 3 == 0 else "Low")
+        db.update_ticket_status(f"c{i}", "active")
+
+    stats = db.get_ticket_stats(active_limit=10, urgent_limit=5)
+    assert (stats['total_open'], stats['urgent']) == (30, 10)
+    assert [t['title'] for t in stats['active_list']] == [f"Ticket {i}" for i in range(29, 19, -1)]
+    assert [t['title'] for t in stats['urgent_list']] == [f"Ticket {i}" for i in (0, 3, 6, 9, 12)] # Same score: oldest first
+    assert len(db.get_all_active_tickets()) == 30
+
+def test_existing_database_is_backfilled():
+    db.create_ticket_record("c1", "g", "u", "user")
+    db.update_ticket_status("c1", "active")
+    conn = db.get_connection()
+    conn.executescript("DROP TABLE ticket_stats; DROP TRIGGER ticket_stats_ai; DROP TRIGGER ticket_stats_ad; DROP TRIGGER ticket_stats_au; "
+                       "DELETE FROM schema_version WHERE version >= (SELECT version FROM schema_version WHERE name = 'ticket stats');")
+    conn.close()
+
+    db.init_db()
+    assert counters() == (1, 1, 0)
+
+    conn = db.get_connection() # Drifted counters (e.g. a restored backup) can be recounted
+    conn.execute("UPDATE ticket_stats SET total_open = 42")
+    conn.commit()
+    conn.close()
+    db.rebuild_ticket_stats()
+    assert counters() == recount() == (1, 1, 0)
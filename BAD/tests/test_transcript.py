@@ -0,0 +1,111 @@
+import pytest
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import transcript as transcript_module
+from src.transcript import Transcript, TranscriptWriter, find_archives, find_transcript, open_transcript
+
+META = {"ticket_id": 5, "title": "VPN down"}
+
+@pytest.fixture
+def archive_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+def messages(n):
+    return [{"id": 1000 + i * 10, "author_name": "u", "content": f"message {i} ✓", "attachments": []} for i in range(n)]
+
+def write(archive_dir, n, compression="gzip", block_size=3):
+    with TranscriptWriter(archive_dir, META, compression=compression, block_size=block_size) as writer:
+        for msg in messages(n):
+            writer.write(msg)
+    return writer.path
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_round_trip(archive_dir, compression):
+    path = write(archive_dir, 10, compression)
+    assert find_transcript(archive_dir) == path
+    with open_transcript(archive_dir) as transcript:
+        assert transcript.meta == META
+        assert len(transcript) == 10
+        assert list(transcript) == messages(10)
+        assert transcript.messages(start=4, limit=3) == messages(10)[4:7]
+        assert transcript.messages(start=8) == messages(10)[8:]
+        assert transcript.messages(start=12) == []
+        assert transcript.index_of(1070) == 7
+        assert transcript.index_of(1075) is None and transcript.index_of(5) is None
+
+def test_gzip_transcript_is_a_plain_gzip_file(archive_dir):
+    path = write(archive_dir, 7)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0] == {"type": "header", "version": 1, "meta": META}
+    assert lines[1:] == messages(7)
+
+def test_pages_decode_only_their_blocks(archive_dir, monkeypatch):
+    write(archive_dir, 30, block_size=5)
+    decoded = []
+    original = Transcript._block
+    monkeypatch.setattr(Transcript, "_block", lambda self, i: decoded.append(i) or original(self, i))
+    with open_transcript(archive_dir) as transcript:
+        assert transcript.messages(start=12, limit=3) == messages(30)[12:15]
+        assert decoded == [2]
+        assert transcript.index_of(1000 + 27 * 10) == 27
+        assert decoded == [2, 5]
+
+def test_missing_or_stale_index_falls_back_to_streaming(archive_dir):
+    write(archive_dir, 10)
+    os.remove(os.path.join(archive_dir, "transcript.idx"))
+    with open_transcript(archive_dir) as transcript:
+        assert len(transcript) == 10
+        assert transcript.messages(start=8, limit=5) == messages(10)[8:]
+        assert transcript.index_of(1030) == 3
+
+    write(archive_dir, 4, compression="none")
+    with open(os.path.join(archive_dir, "transcript.idx"), 'w') as f: # Left over from an older write
+        json.dump({"version": 1, "compression": "none", "count": 99, "size": 1, "blocks": [[0, 0, 1000]]}, f)
+    with open_transcript(archive_dir) as transcript:
+        assert len(transcript) == 4 and list(transcript) == messages(4)
+
+def test_legacy_transcript_is_readable_and_replaced(archive_dir):
+    root, archive_dir = archive_dir, os.path.join(archive_dir, "2026", "02", "5")
+    os.makedirs(archive_dir)
+    with open(os.path.join(archive_dir, "transcript.json"), 'w', encoding='utf-8') as f:
+        json.dump({"meta": META, "messages": messages(4)}, f, indent=2)
+    assert find_archives(root) == [archive_dir]
+    with open_transcript(archive_dir) as transcript:
+        assert transcript.meta == META and len(transcript) == 4
+        assert transcript.messages(start=1, limit=2) == messages(4)[1:3]
+        assert transcript.index_of(1020) == 2
+
+    path = write(archive_dir, 6)
+    assert sorted(os.listdir(archive_dir)) == ["transcript.idx", os.path.basename(path)]
+
+def test_failed_write_keeps_the_previous_transcript(archive_dir):
+    path = write(archive_dir, 3)
+    with pytest.raises(RuntimeError):
+        with TranscriptWriter(archive_dir, META) as writer:
+            writer.write(messages(1)[0])
+            raise RuntimeError("interrupted")
+    assert sorted(os.listdir(archive_dir)) == ["transcript.idx", os.path.basename(path)]
+    with open_transcript(archive_dir) as transcript:
+        assert len(transcript) == 3
+
+def test_zstd_transcript(archive_dir):
+    pytest.importorskip("zstandard")
+    path = write(archive_dir, 10, compression="zstd")
+    assert path.endswith(".jsonl.zst")
+    with open_transcript(archive_dir) as transcript:
+        assert list(transcript) == messages(10)
+        assert transcript.messages(start=5, limit=2) == messages(10)[5:7]
+
+def test_zstd_falls_back_to_gzip_without_the_package(archive_dir, monkeypatch):
+    monkeypatch.setattr(transcript_module, "zstandard", None)
+    assert write(archive_dir, 2, compression="zstd").endswith(".jsonl.gz")
@@ -0,0 +1,91 @@
+import pytest
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.transcript_html import page_paths, render_transcript_html, zip_pages
+
+META = {"ticket_id": 5, "title": "<b>VPN</b> & more", "channel_name": "ticket-5", "archived_at": "2026-10-18 09:00:00", "description": ""}
+
+@pytest.fixture
+def archive_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+def messages(n):
+    return ({"id": 1000 + i, "timestamp": "2026-10-18 08:00:00", "author_name": "alice", "content": f"message {i}", "attachments": []}
+            for i in range(n))
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def test_content_is_escaped(archive_dir):
+    msg = {"id": 1, "timestamp": "t", "author_name": "<img src=x onerror=alert(1)>", "content": "</div><script>x()</script>", "attachments": [
+        {"filename": 'a"b.txt', "local_path": "../../../blobs/ab/abc", "sha256": "abc"},
+        {"original_url": "https://cdn/<x>", "error": "HTTP 404"},
+    ]}
+    [path] = render_transcript_html(archive_dir, META, [msg])
+    page = read(path)
+    assert "<script>" not in page and "<img src=x" not in page and "<b>VPN" not in page
+    assert "&lt;/div&gt;&lt;script&gt;x()&lt;/script&gt;" in page
+    assert "Ticket #5: &lt;b&gt;VPN&lt;/b&gt; &amp; more" in page
+    assert 'href="../../../blobs/ab/abc" download="a&quot;b.txt"' in page
+    assert "Failed to load: https://cdn/&lt;x&gt;" in page
+
+def test_images_get_inline_thumbnails(archive_dir):
+    msg = {"id": 1, "author_name": "u", "content": "", "attachments": [
+        {"filename": "Screen Shot.PNG", "local_path": "../../../blobs/cd/cdef"},
+        {"filename": "log.txt", "local_path": "../../../blobs/ef/ef01"},
+    ]}
+    page = read(render_transcript_html(archive_dir, META, [msg])[0])
+    assert page.count("<img") == 1
+    assert '<img class="thumb" src="../../../blobs/cd/cdef" alt="Screen Shot.PNG"' in page and 'loading="lazy"' in page
+    assert '📎 <a href="../../../blobs/ef/ef01" download="log.txt"' in page
+
+def test_long_transcripts_are_paginated(archive_dir):
+    paths = render_transcript_html(archive_dir, META, messages(250), total=250, page_size=100)
+    assert [os.path.basename(p) for p in paths] == ["transcript.html", "transcript-2.html", "transcript-3.html"]
+    pages = [read(p) for p in paths]
+    assert [page.count('class="message"') for page in pages] == [100, 100, 50]
+    assert 'id="m1100"' in pages[1] and 'id="m1099"' not in pages[1]
+    assert '<a href="transcript-2.html">Next »</a>' in pages[0] and "Previous" not in pages[0]
+    assert '<a href="transcript.html">« Previous</a>' in pages[1] and '<a href="transcript-3.html">3</a>' in pages[1]
+    assert "Next »" not in pages[2]
+    assert pages[0].count('<div class="block">') == 2 # Laid out by the browser block by block
+
+    # Re-rendered shorter: the extra pages go, no temporary files stay
+    render_transcript_html(archive_dir, META, messages(150), page_size=100)
+    assert sorted(os.listdir(archive_dir)) == ["transcript-2.html", "transcript.html"]
+    assert "Page 1" in read(os.path.join(archive_dir, "transcript.html")) # No total: prev/next only
+
+def test_empty_transcript(archive_dir):
+    [path] = render_transcript_html(archive_dir, META, [])
+    page = read(path)
+    assert page.startswith("<!DOCTYPE html>") and page.rstrip().endswith("</html>")
+    assert 'class="pages"' not in page
+
+def test_failed_render_keeps_the_previous_page(archive_dir):
+    render_transcript_html(archive_dir, META, messages(3))
+
+    def broken():
+        yield from messages(2)
+        raise OSError("log unreadable")
+
+    with pytest.raises(OSError):
+        render_transcript_html(archive_dir, META, broken())
+    assert os.listdir(archive_dir) == ["transcript.html"]
+    assert read(os.path.join(archive_dir, "transcript.html")).count('class="message"') == 3
+
+def test_pages_are_zipped_together(archive_dir):
+    assert page_paths(archive_dir) == []
+    render_transcript_html(archive_dir, META, messages(25), total=25, page_size=10)
+    assert [os.path.basename(p) for p in page_paths(archive_dir)] == ["transcript.html", "transcript-2.html", "transcript-3.html"]
+    with zipfile.ZipFile(zip_pages(archive_dir)) as zf:
+        assert zf.namelist() == ["transcript.html", "transcript-2.html", "transcript-3.html"]
+        assert '<a href="transcript-2.html">Next »</a>' in zf.read("transcript.html").decode('utf-8')
@@ -0,0 +1,78 @@
+import pytest
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+
+pytestmark = pytest.mark.usefixtures("test_db_path")
+
+def make_ticket(channel_id, urgency, status="active"):
+    ticket_id = db.create_ticket_record(channel_id, "g", "u", "user")
+    db.update_ticket_details(channel_id, f"Ticket {channel_id}", "", urgency)
+    db.update_ticket_status(channel_id, status)
+    return ticket_id
+
+def test_parse_urgency_score():
+    cases = {
+        "10 - Critical": 10, "9": 9, "7/10": 7, "Urgency: 4 (Medium)": 4, "High": 8, "HIGH urgency": 8,
+        "Critical": 10, "Urgent!": 9, "Medium": 5, "Normal": 5, "Low": 2, "": None, None: None, "asap?": None,
+    }
+    for text, score in cases.items():
+        assert db.parse_urgency_score(text) == score, text
+
+def test_existing_rows_are_backfilled(test_db_path):
+    os.makedirs(os.path.dirname(test_db_path), exist_ok=True)
+    conn = sqlite3.connect(test_db_path) # A database from before urgency_score
+    conn.execute("CREATE TABLE tickets (id INTEGER PRIMARY KEY AUTOINCREMENT, channel_id TEXT, guild_id TEXT, user_id TEXT, user_name TEXT, "
+                 "status TEXT DEFAULT 'draft', title TEXT, description TEXT, urgency TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, closed_at TIMESTAMP)")
+    conn.executemany("INSERT INTO tickets (channel_id, status, urgency) VALUES (?, 'active', ?)",
+                     [("c1", "10 - Critical"), ("c2", "Medium"), ("c3", None), ("c4", "whenever")])
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    conn = db.get_connection()
+    scores = [row[0] for row in conn.execute("SELECT urgency_score FROM tickets ORDER BY id")]
+    conn.close()
+    assert scores == [10, 5, None, None]
+    assert db.get_ticket_stats()['urgent'] == 1
+    assert db.backfill_urgency_scores() == 0
+
+def test_queues_are_ordered_by_priority():
+    db.init_db()
+    for channel_id, urgency in [("c1", "Low"), ("c2", "10 - Critical"), ("c3", None), ("c4", "High"), ("c5", "9")]:
+        make_ticket(channel_id, urgency)
+    db.update_ticket_assignment("c5", "helper")
+
+    assert [t['channel_id'] for t in db.get_unassigned_tickets(limit=10)] == ["c2", "c4", "c1", "c3"]
+    stats = db.get_ticket_stats()
+    assert stats['urgent'] == 3
+    assert [t['channel_id'] for t in stats['urgent_list']] == ["c2", "c5", "c4"]
+
+    db.update_ticket_details("c2", "Ticket c2", "", "Low") # Re-scored on every edit
+    assert db.get_ticket_stats()['urgent'] == 2
+
+def test_urgency_bands_filter_archive():
+    db.init_db()
+    for channel_id, urgency in [("c1", "Low"), ("c2", "10 - Critical"), ("c3", "High"), ("c4", "5"), ("c5", "Medium")]:
+        make_ticket(channel_id, urgency, status="closed")
+
+    high = db.get_tickets_page(status=['closed'], urgency="High")
+    assert sorted(t['channel_id'] for t in high) == ["c2", "c3"]
+    assert db.count_tickets(status=['closed'], urgency="Medium", ttl=0) == 2
+    assert db.get_tickets_with_filter(status='closed', urgency="Critical")[1] == 1
+    assert db.get_tickets_with_filter(status='closed', urgency="Crit")[1] == 1 # Free text: substring match
+
+def test_urgent_list_is_an_index_range_scan():
+    db.init_db()
+    conn = db.get_connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM tickets WHERE status = 'active' AND urgency_score >= ? ORDER BY urgency_score DESC, created_at ASC LIMIT 5",
+        (db.URGENT_SCORE,)
+    ).fetchall()
+    conn.close()
+    details = " ".join(row[3] for row in plan)
+    assert "idx_tickets_status_urgency" in details and "TEMP B-TREE" not in details
@@ -0,0 +1,79 @@
+import pytest
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db
+from src.agent.usage_recorder import UsageRecorder, estimate_cost
+
+pytestmark = pytest.mark.usefixtures("test_db")
+
+def usage_row(channel_id="chan-1", mode="ticket_assistant", latency_ms=100.0, prompt=1000, output=100, status="ok", created_at=None):
+    return {
+        "created_at": created_at or time.time(), "channel_id": channel_id, "mode": mode, "model": "models/gemini-2.0-flash",
+        "status": status, "prompt_tokens": prompt, "output_tokens": output, "cached_tokens": 0,
+        "latency_ms": latency_ms, "queued_ms": 0.0, "retries": 0, "cost": estimate_cost(prompt, output)
+    }
+
+def test_rows_attributed_to_active_conversation():
+    cid = db.create_conversation("chan-1")
+    db.add_llm_usage([usage_row(), usage_row(channel_id="chan-other")])
+
+    conn = db.get_connection()
+    rows = conn.execute("SELECT channel_id, conversation_id FROM llm_usage ORDER BY id").fetchall()
+    conn.close()
+    assert [(r["channel_id"], r["conversation_id"]) for r in rows] == [("chan-1", cid), ("chan-other", None)]
+
+def test_summary_percentiles_and_tokens_per_turn():
+    db.add_llm_usage([usage_row(latency_ms=float(ms)) for ms in range(10, 1010, 10)] + [usage_row(status="TimeoutError", latency_ms=None, output=0)])
+
+    summary = db.get_llm_usage_summary(since=time.time() - 60)
+    assert summary["calls"] == 101
+    assert summary["errors"] == 1
+    assert summary["p50_latency_ms"] == 500.0
+    assert summary["p95_latency_ms"] == 950.0
+    assert summary["tokens_per_turn"] == 1100
+    assert summary["cost"] == pytest.approx(100 * estimate_cost(1000, 100) + estimate_cost(1000, 0))
+
+    assert db.get_llm_usage_summary(since=time.time() + 60)["calls"] == 0
+
+def test_daily_mode_and_ticket_views():
+    db.create_ticket_record("chan-1", "guild", "user", "name")
+    yesterday = time.time() - 86400
+    db.add_llm_usage([
+        usage_row(), usage_row(), usage_row(mode="summary", prompt=3000),
+        usage_row(channel_id="chan-2", created_at=yesterday)
+    ])
+
+    days = db.get_llm_usage_daily(days=7)
+    assert [d["calls"] for d in days] == [3, 1]
+
+    modes = {m["mode"]: m for m in db.get_llm_usage_by_mode(since=time.time() - 60)}
+    assert modes["ticket_assistant"]["calls"] == 2
+    assert modes["summary"]["avg_prompt_tokens"] == 3000
+
+    tickets = db.get_llm_usage_by_ticket(limit=5)
+    assert tickets[0]["channel_id"] == "chan-1"
+    assert tickets[0]["ticket_id"] == db.get_ticket("chan-1")["id"]
+    assert tickets[0]["calls"] == 3
+    assert tickets[1]["ticket_id"] is None
+
+def test_recorder_batches_and_recent_stats():
+    recorder = UsageRecorder(flush_interval=10)
+    for ms in (100, 200, 300):
+        recorder.record(channel_id=42, mode="manager", status="ok", prompt_tokens=900, output_tokens=100, latency_ms=ms)
+    recorder.record(channel_id=42, mode="manager", status="cancelled")
+
+    assert db.get_llm_usage_summary()["calls"] == 0 # Still buffered
+    recorder.flush()
+    assert db.get_llm_usage_summary()["calls"] == 4
+
+    stats = recorder.recent_stats(window=3600)
+    assert stats["calls"] == 4
+    assert stats["errors"] == 1
+    assert stats["p50_latency_ms"] == 200
+    assert stats["tokens_per_turn"] == 1000
+    assert stats["daily_run_rate"] == pytest.approx(stats["cost"] * 24)
+    recorder.close()